@@ -0,0 +1,194 @@
+"""
+Simulation benchmark suite: headless runs sweeping swarm size, map object count and feature flags,
+reporting ticks per second, mean time per tick of each phase and peak memory, compared with stored baselines.
+
+Usage:
+    python -m api.benchmark                      # Run every case and compare with the stored baseline
+    python -m api.benchmark --quick              # Fewer ticks per case
+    python -m api.benchmark --case agents_1000   # Only some cases
+    python -m api.benchmark --save-baseline      # Store this run as the new baseline
+    python -m api.benchmark --check              # Exit with status 1 on any regression (for CI), 2 without a baseline
+
+Each case runs in a fresh process, so its peak memory is its own. Ticks per second only compare on the
+same hardware, so the baseline file keeps one baseline per machine class (CPU model and count) and a run
+is only compared with the baseline of its own class. benchmarks/baseline.json holds the baseline of the
+reference machine class; add one for other hardware with --save-baseline.
+"""
+import argparse
+import json
+import multiprocessing
+import platform
+import random
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from .config import ENV_WIDTH, ENV_HEIGHT, BENCHMARK_BASELINE_PATH, BENCHMARK_REGRESSION_TOLERANCE
+from .headlessRunner import run_headless
+from .simulation.mapObject import mapObject
+from .simulation.maps import maps
+
+BENCHMARK_TICKS = 1000
+BENCHMARK_QUICK_TICKS = 200
+BENCHMARK_SEED = 0
+
+DEFAULT_AGENTS = 200
+DEFAULT_MAP_OBJECTS = 50
+
+# One dimension is swept at a time around DEFAULT_AGENTS agents, DEFAULT_MAP_OBJECTS map objects and the default flags
+BENCHMARK_CASES = (
+    [{"name": f"agents_{agents}", "agents": agents} for agents in (20, 200, 1000, 5000)]
+    + [{"name": f"map_objects_{count}", "map_objects": count} for count in (8, 500, 5000)]
+    + [
+        {"name": "flocking", "flags": {"ALIGNMENT_WEIGHT": 1.0, "COHESION_WEIGHT": 1.0, "SEPARATION_WEIGHT": 1.25}},
+        {"name": "no_navigation", "flags": {"NAVIGATION_ENABLED": False}},
+        {"name": "no_terrain", "flags": {"TERRAIN_WEIGHT": 0}},
+        {"name": "bbox_detection", "flags": {"DETECT_USE_BOUNDING_BOX": True}},
+        {"name": "snapshots", "snapshots": True},
+    ]
+)
+
+def benchmark_plan(num_agents: int, steps: int, seed: int = BENCHMARK_SEED):
+    """A plan of steps sending every agent to its own random coordinates."""
+    rng = np.random.default_rng(seed)
+    return {
+        step: {"objective": f"Benchmark step {step}", "coordinates": (rng.random((num_agents, 2)) * [ENV_WIDTH, ENV_HEIGHT]).round().tolist()}
+        for step in range(1, steps + 1)
+    }
+
+def benchmark_map(count: int, seed: int = BENCHMARK_SEED):
+    """count map objects at random places, with the types and sizes of the predefined maps' objects."""
+    templates = [map_object for map_objects in maps.values() for map_object in map_objects]
+    rng = random.Random(seed)
+    map_objects = []
+    for index in range(count):
+        template = templates[index % len(templates)]
+        (x1, y1), (x2, y2) = template.boundingBox
+        half_width, half_height = abs(x2 - x1) / 2, abs(y2 - y1) / 2
+        x, y = rng.uniform(0, ENV_WIDTH), rng.uniform(0, ENV_HEIGHT)
+        map_objects.append(mapObject(f"{template.name} {index}", [x, y], ((x - half_width, y - half_height), (x + half_width, y + half_height)),
+                                     template.object_type, template.condition, dict(template.properties)))
+    return map_objects
+
+def run_case(case: dict, ticks: int):
+    """Run one benchmark case (in the calling process) and return its measurements."""
+    agents = case.get("agents", DEFAULT_AGENTS)
+    result = run_headless(
+        benchmark_plan(agents, ticks // 50 + 1),  # Steps last at least one 50 tick evaluation interval, so every case runs all its ticks
+        benchmark_map(case.get("map_objects", DEFAULT_MAP_OBJECTS)),
+        num_agents=agents,
+        max_ticks=ticks,
+        seed=BENCHMARK_SEED,
+        flags=case.get("flags"),
+        snapshots=case.get("snapshots", False),
+    )
+    return {
+        "ticks": result["ticks"],
+        "ticks_per_second": result["ticks_per_second"],
+        "phase_ms": result["phase_ms"],
+        "peak_memory_mb": result["peak_memory_mb"],
+    }
+
+def run_cases(cases, ticks: int):
+    """Run cases one after another, each in a fresh process."""
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    for case in cases:
+        with ProcessPoolExecutor(1, mp_context=context) as executor:
+            results[case["name"]] = executor.submit(run_case, case, ticks).result()
+        print(f"{case['name']:>16}: {results[case['name']]['ticks_per_second']:>9.1f} ticks/s", file=sys.stderr)
+    return results
+
+def cpu_model():
+    """The CPU model name, from /proc/cpuinfo on Linux."""
+    try:
+        with open("/proc/cpuinfo") as file:
+            for line in file:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+def machine_info():
+    return {"cpu": cpu_model(), "cpus": multiprocessing.cpu_count(),
+            "python": platform.python_version(), "numpy": np.__version__, "machine": platform.machine()}
+
+def machine_key(info: dict):
+    """Key of the baseline of a machine class: results from other hardware aren't comparable (hostnames aren't part of it, CI runners change them)."""
+    return f"{info['cpu']} / {info['cpus']} cpus"
+
+def compare(results: dict, baseline: dict, tolerance: float = BENCHMARK_REGRESSION_TOLERANCE):
+    """
+    Compare results with baseline results case by case.
+
+    Returns:
+    - (rows, regressions): one printable row per case, and the names of the cases whose ticks per
+      second dropped by more than tolerance.
+    """
+    rows, regressions = [], []
+    header = f"{'case':>16} {'ticks/s':>10} {'baseline':>10} {'change':>8} {'peak MB':>8}  slowest phases (ms/tick)"
+    for name, result in results.items():
+        base = baseline.get(name)
+        phases = ", ".join(f"{phase} {ms:.3f}" for phase, ms in sorted(result["phase_ms"].items(), key=lambda item: -item[1])[:3])
+        if base:
+            change = result["ticks_per_second"] / base["ticks_per_second"] - 1
+            flag = " REGRESSION" if change < -tolerance else ""
+            if flag:
+                regressions.append(name)
+            rows.append(f"{name:>16} {result['ticks_per_second']:>10.1f} {base['ticks_per_second']:>10.1f} {change:>+8.1%} {result['peak_memory_mb'] or 0:>8.1f}  {phases}{flag}")
+        else:
+            rows.append(f"{name:>16} {result['ticks_per_second']:>10.1f} {'-':>10} {'-':>8} {result['peak_memory_mb'] or 0:>8.1f}  {phases}")
+    return [header] + rows, regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the simulation tick across swarm sizes, map sizes and feature flags.")
+    parser.add_argument("--quick", action="store_true", help=f"Run {BENCHMARK_QUICK_TICKS} instead of {BENCHMARK_TICKS} ticks per case")
+    parser.add_argument("--ticks", type=int, default=None, help="Ticks per case")
+    parser.add_argument("--case", action="append", choices=[case["name"] for case in BENCHMARK_CASES], help="Only run these cases")
+    parser.add_argument("--baseline", default=str(BENCHMARK_BASELINE_PATH), help="Baseline file to compare with or save to")
+    parser.add_argument("--save-baseline", action="store_true", help="Store the results as the new baseline")
+    parser.add_argument("--check", action="store_true", help="Exit with status 1 if any case regressed")
+    parser.add_argument("--tolerance", type=float, default=BENCHMARK_REGRESSION_TOLERANCE, help="Allowed fractional drop in ticks per second")
+    args = parser.parse_args(argv)
+
+    ticks = args.ticks or (BENCHMARK_QUICK_TICKS if args.quick else BENCHMARK_TICKS)
+    cases = [case for case in BENCHMARK_CASES if not args.case or case["name"] in args.case]
+    results = run_cases(cases, ticks)
+
+    try:
+        with open(args.baseline) as file:
+            baselines = json.load(file)
+    except FileNotFoundError:
+        baselines = {"machines": {}}
+    machine = machine_info()
+    key = machine_key(machine)
+    baseline = baselines["machines"].get(key)
+    if baseline is None:
+        print(f"Note: no baseline saved for this machine class ({key}); run with --save-baseline to record one.")
+    elif baseline["ticks"] != ticks:
+        print(f"Note: the baseline of this machine class ran {baseline['ticks']} ticks per case, this run {ticks}; not compared.")
+        baseline = None  # Short runs are dominated by startup costs, so only equal runs compare
+
+    rows, regressions = compare(results, baseline["cases"] if baseline else {}, args.tolerance)
+    print("\n".join(rows))
+
+    if args.save_baseline:
+        cases = baseline["cases"] if baseline else {}
+        baselines["machines"][key] = {"ticks": ticks, "machine": machine, "cases": {**cases, **results}}
+        Path(args.baseline).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.baseline, "w") as file:
+            json.dump(baselines, file, indent=2)
+        print(f"Saved baseline for {key} to {args.baseline}")
+    elif baseline is None and args.check:
+        sys.exit(2)
+
+    if regressions:
+        print(f"Regressions: {', '.join(regressions)}")
+        if args.check:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,22 @@ BASE_DIR = Path(__file__).resolve().parent
 # SIMULATION ENVIRONMENT PARAMETERS
 ENV_WIDTH, ENV_HEIGHT = 800, 600
 DETECT_FILTER_SIZE = 450
+DETECT_USE_BOUNDING_BOX = False  # Detect map objects by bounding box as well as centre point
+MAP_INDEX_NODE_CAPACITY = 16  # Entries per node in the map object R-tree
+
+# SIMULATION TIMING PARAMETERS
+SIMULATION_TICK_HZ = 100  # Fixed simulated ticks per second
+SIMULATION_SUBSTEPS_PER_YIELD = 1  # Ticks run back-to-back before yielding to the event loop
+SIMULATION_MAX_CATCHUP_STEPS = 10  # Max ticks run in one wake-up to catch up after a stall
+SIMULATION_EXECUTION_MODE = "asyncio"  # "asyncio" (on the event loop), "thread" or "process" (one worker process per session)
+
+# SESSION PARAMETERS
+MAX_SESSIONS = 32  # Maximum number of concurrent operator sessions per server
+
+# WEBSOCKET PARAMETERS
+WEBSOCKET_QUEUE_SIZE = 8  # Frames buffered per client before the oldest are dropped
+DELTA_KEYFRAME_INTERVAL = 100  # Frames between keyframes for protocol version 2 (delta) clients
+DELTA_POSITION_QUANTUM = 0.01  # Resolution of positions, velocities and accelerations in delta frames
 
 # Agent parameters
 NUM_AGENTS = 20
@@ -14,6 +30,11 @@ MAX_SPEED = 2.5
 MAX_FORCE = 0.1
 RADIUS = 100  # Perception radius for alignment, cohesion, separation
 
+# TARGET ASSIGNMENT PARAMETERS
+ASSIGNMENT_METHOD = "min_sum"  # "min_sum" (total distance), "min_max" (longest distance) or "index" (agent i to target i)
+ASSIGNMENT_EXACT_MAX_N = 300  # Largest swarm solved exactly; larger swarms use the greedy approximation
+ASSIGNMENT_GREEDY_CANDIDATES = 8  # Nearest agents considered per target by the greedy approximation
+
 # AGENT BEHAVIOR PARAMETERS
 ALIGNMENT_WEIGHT = 0
 COHESION_WEIGHT = 0
@@ -38,6 +59,26 @@ TERRAIN_HEIGHT_MAP = np.array([
 ])
 MAP_WIDTH, MAP_HEIGHT = TERRAIN_HEIGHT_MAP.shape
 
+# TERRAIN PARAMETERS
+TERRAIN_PATH = None  # Tile directory (see terrain.write_tiles) or height map file (.npy, or raw raster with TERRAIN_RAW_SHAPE); None uses TERRAIN_HEIGHT_MAP
+TERRAIN_RAW_SHAPE = None  # (rows, columns) of a raw height map file
+TERRAIN_RAW_DTYPE = "float32"  # Value type of a raw height map file
+TERRAIN_GRADIENT_BLOCK_ROWS = 1024  # Height map rows read at a time while precomputing the gradient field
+TERRAIN_TILE_SIZE = 512  # Grid nodes per side of a terrain tile written by write_tiles
+TERRAIN_TILE_CACHE_SIZE = 32  # Tiles kept in memory (about 3 MB each at the default tile size)
+TERRAIN_PREFETCH_TICKS = 100  # Tiles agents reach within this many ticks at their current velocity are loaded ahead
+TERRAIN_PREFETCH_WORKERS = 2  # Background tile loading threads; 0 disables prefetching
+
+# NAVIGATION PARAMETERS
+NAVIGATION_ENABLED = True  # Steer agents along flow fields around costly areas instead of straight at their targets
+NAV_CELL_SIZE = 10  # Side of a navigation grid cell
+NAV_OBJECT_COSTS = {"flood": 10.0, "water": 25.0}  # Cost of crossing a cell inside map objects of these types (open ground is 1)
+NAV_OBSTACLE_COST = 1000.0  # Cost of crossing a cell within OBSTACLE_RADIUS of an obstacle; finite so trapped agents still get out
+NAV_SLOPE_COST = 0.25  # Added cell cost per unit of terrain gradient magnitude
+NAV_STEEP_SLOPE = 6.0  # Terrain gradient magnitude above which a cell counts as an obstruction agents are routed around
+NAV_FIELD_CACHE_SIZE = 256  # Flow fields kept, one per target cell
+NAV_FIELD_DELAY_TICKS = 10  # Ticks after a step starts at which its flow fields, built in the background, take over steering (100 ms at 100 Hz)
+
 # EVALUATION PARAMETERS
 EVAL_TOLERANCE = 10
 MAX_EVALS = 5 # Number of evals before the system skips step and progresses
@@ -46,4 +87,49 @@ MAX_EVALS = 5 # Number of evals before the system skips step and progresses
 LLM_PROMPT_SYSTEM_RESPONSE = "Hello World."
 OPENAI_MODEL = "gpt-3.5-turbo-0125" # "o1-mini"
 MAX_TOKENS = 1200
-TEMPERATURE = 0.7
\ No newline at end of file
+TEMPERATURE = 0.7
+LLM_BASE_URL = "https://api.aimlapi.com/v1"  # Overridden by the LLM_BASE_URL environment variable (e.g. a local mock server)
+LLM_CONNECT_TIMEOUT = 10  # Seconds to establish a connection to the LLM API
+LLM_REQUEST_TIMEOUT = 60  # Seconds for a whole planning request, including generation
+LLM_MAX_RETRIES = 3  # Retries after a timeout, connection error, rate limit or server error
+LLM_RETRY_BASE_DELAY = 0.5  # Seconds, doubled per retry; the actual delay is jittered
+LLM_RETRY_MAX_DELAY = 8  # Upper bound of the retry delay in seconds
+LLM_MAX_CONCURRENT_CALLS = 4  # Planning calls in flight at once across all sessions
+LLM_MAX_CONNECTIONS = 10  # Pooled HTTP connections kept to the LLM API
+LLM_STREAM_PLANS = True  # Start simulating the first plan step while the LLM is still generating the rest
+
+# TRANSLATOR PARAMETERS
+TRANSLATION_CACHE_SIZE = 256  # Compiled plan functions kept, keyed by source hash
+SANDBOX_ENABLED = True  # Run plan functions in sandbox worker processes instead of the server process
+SANDBOX_WORKERS = 4  # Sandbox worker processes, i.e. plan steps translated in parallel
+SANDBOX_TIMEOUT = 5.0  # Wall-clock seconds a plan function may run
+SANDBOX_CPU_SECONDS = 2  # CPU seconds a plan function may use (rounded up to whole seconds)
+SANDBOX_MEMORY_BYTES = 1024 * 1024 * 1024  # Address space limit of a sandbox worker
+SANDBOX_MAX_TASKS_PER_WORKER = 100  # Calls before a worker is replaced by a fresh process
+
+# PLAN CACHE PARAMETERS
+PLAN_CACHE_SIZE = 128  # Translated plans kept in memory (least recently used are evicted)
+PLAN_CACHE_TTL = 24 * 60 * 60  # Seconds a cached plan stays valid
+PLAN_CACHE_DB_PATH = None  # SQLite file for the on-disk tier, e.g. BASE_DIR / "plan_cache.sqlite3"; None keeps plans in memory only
+PLAN_CACHE_DB_SIZE = 1024  # Plans kept in the on-disk tier
+
+# HEADLESS RUN AND BENCHMARK PARAMETERS
+HEADLESS_MAX_TICKS = 20000  # Tick limit of a headless run whose plan never finishes
+BENCHMARK_BASELINE_PATH = BASE_DIR.parent / "benchmarks" / "baseline.json"  # Stored benchmark results, one set per machine, new runs on that machine are compared against
+BENCHMARK_REGRESSION_TOLERANCE = 0.15  # Fraction of baseline ticks per second a case may lose before it counts as a regression
+
+# METRICS PARAMETERS
+METRICS_ENABLED = False  # Time the hot paths into the /api/py/metrics histograms; can also be switched at runtime
+METRICS_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)  # Histogram bucket bounds in seconds
+
+# RECORDING AND REPLAY PARAMETERS
+RECORDING_ENABLED = False  # Record every simulation run to RECORDING_DIR (missions can also ask for it with ?record=true)
+RECORDING_DIR = BASE_DIR.parent / "recordings"  # Where recordings are written and replays are loaded from
+RECORDING_CHUNK_TICKS = 100  # Ticks per compressed chunk; each chunk decodes on its own, so a seek decodes at most this many ticks
+RECORDING_COMPRESSION_LEVEL = 6  # zlib level of the chunks
+
+# MONTE-CARLO EVALUATION PARAMETERS
+MONTE_CARLO_RUNS = 32  # Seeded runs of a plan per evaluation
+MONTE_CARLO_MAX_RUNS = 256  # Most runs one API request may ask for
+MONTE_CARLO_MAX_TICKS = 10000  # Tick limit of each run; runs that hit it count as unfinished
+MONTE_CARLO_WORKERS = None  # Worker processes; None uses one per CPU
@@ -1,20 +1,91 @@
+import asyncio
 from fastapi import WebSocket
 
+from .config import WEBSOCKET_QUEUE_SIZE
+from .lib.protocol import Subscription
+from .lib.metrics import metrics
+
+class Subscriber:
+    """One websocket client: its bounded outgoing queue and the protocol, frame format and subscription it asked for."""
+    def __init__(self, websocket: WebSocket, queue_size: int, protocol: int = 1, frame_format: str = "json", subscription: Subscription = None):
+        self.websocket = websocket
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.protocol = protocol
+        self.frame_format = frame_format
+        self.subscription = subscription or Subscription()
+        self.next_send_time = 0.0    # Earliest time the next frame may be sent, for fps-capped clients
+        self.pending = False         # A frame was skipped by the fps cap and is still owed
+        self.state_sent = None       # Last state message sent alongside binary frames
+        self.dropped = 0             # Messages dropped for being too slow
+        self.needs_keyframe = True   # Delta clients must (re)start from a keyframe
+
 class ConnectionManager:
     """Class defining socket events"""
-    def __init__(self):
-        """init method, keeping track of connections"""
+    def __init__(self, queue_size: int = WEBSOCKET_QUEUE_SIZE):
+        """init method, keeping track of connections and their subscribers"""
         self.active_connections = []
-    
-    async def connect(self, websocket: WebSocket):
+        self.queue_size = queue_size
+        self.subscribers = {}  # websocket -> Subscriber
+
+    async def connect(self, websocket: WebSocket, protocol: int = 1, frame_format: str = "json", subscription: Subscription = None):
         """connect event"""
         await websocket.accept()
         self.active_connections.append(websocket)
+        self.subscribers[websocket] = Subscriber(websocket, self.queue_size, protocol, frame_format, subscription)
 
     async def send_data(self, message, websocket: WebSocket):
         """Direct Message"""
         await websocket.send_json(message)
-    
+
+    def enqueue(self, message, websocket: WebSocket):
+        """
+        Queue an encoded message for one client, dropping its oldest message if the queue is full.
+        Returns whether a message was dropped.
+        """
+        subscriber = self.subscribers.get(websocket)
+        if subscriber is None:
+            return False
+        dropped = subscriber.queue.full()
+        if dropped:
+            subscriber.queue.get_nowait()  # Drop-oldest backpressure: a slow client only loses its own stale frames
+            subscriber.dropped += 1
+        subscriber.queue.put_nowait(message)
+        return dropped
+
+    def broadcast(self, message):
+        """Fan the same encoded message out to every connected client."""
+        for websocket in self.active_connections:
+            self.enqueue(message, websocket)
+
+    async def pump(self, websocket: WebSocket):
+        """Send queued messages to one client until it disconnects."""
+        queue = self.subscribers[websocket].queue
+        while True:
+            message = await queue.get()
+            start = metrics.start()
+            if isinstance(message, bytes):
+                await websocket.send_bytes(message)
+            else:
+                await websocket.send_text(message)
+            metrics.observe(metrics.websocket_send, start)
+
+    async def serve(self, websocket: WebSocket):
+        """Pump queued messages to one client until either side closes the connection."""
+        sender = asyncio.create_task(self.pump(websocket))
+        receiver = asyncio.create_task(self.receive_until_closed(websocket))
+        done, pending = await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        for task in done:
+            task.result()  # Re-raise WebSocketDisconnect (or a send error)
+
+    async def receive_until_closed(self, websocket: WebSocket):
+        """Read (and ignore) client messages so a disconnect is noticed even when nothing is being sent."""
+        while True:
+            await websocket.receive_text()
+
     def disconnect(self, websocket: WebSocket):
         """disconnect event"""
-        self.active_connections.remove(websocket)
\ No newline at end of file
+        if websocket in self.active_connections:
+            self.active_connections.remove(websocket)
+        self.subscribers.pop(websocket, None)
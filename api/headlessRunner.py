@@ -0,0 +1,115 @@
+"""
+Headless simulation runs: step a simulation of a recorded plan back to back, as fast as possible,
+without the API, an LLM, a scheduler or any sleeps.
+
+Usage:
+    python -m api.headlessRunner plan.json [--map hurricane_map] [--agents 20] [--max-ticks 20000] [--seed 0] [--snapshots]
+
+plan.json holds an llm_plan as produced by LLM_Planning (see save_plan), e.g.
+    {"1": {"objective": "Spread out", "coordinates": [[100, 100], [200, 100], ...]}, "2": {...}}
+"""
+import argparse
+import contextlib
+import copy
+import io
+import json
+import sys
+import time
+
+import numpy as np
+
+from . import simulationManager
+from .config import NUM_AGENTS, HEADLESS_MAX_TICKS
+from .simulationManager import Simulation
+from .simulation.maps import maps
+from .simulation.mapIndex import MapIndex
+from .lib.profiling import PhaseTimer, peak_memory_mb
+
+def save_plan(llm_plan: dict, path):
+    """Record an llm_plan as JSON, for replaying it headless later."""
+    with open(path, "w") as file:
+        json.dump(llm_plan, file, indent=2, default=lambda value: value.tolist() if isinstance(value, np.ndarray) else str(value))
+
+def load_plan(path):
+    """Load an llm_plan recorded with save_plan (JSON object keys become integer step numbers again)."""
+    with open(path) as file:
+        return {int(step): step_data for step, step_data in json.load(file).items()}
+
+@contextlib.contextmanager
+def simulation_flags(flags):
+    """Temporarily override simulationManager's behaviour constants, e.g. {"NAVIGATION_ENABLED": False}."""
+    flags = flags or {}
+    for name in flags:
+        if not hasattr(simulationManager, name):
+            raise ValueError(f"Unknown simulation flag '{name}'.")
+    previous = {name: getattr(simulationManager, name) for name in flags}
+    try:
+        for name, value in flags.items():
+            setattr(simulationManager, name, value)
+        yield
+    finally:
+        for name, value in previous.items():
+            setattr(simulationManager, name, value)
+
+def run_headless(llm_plan: dict, map_objects="hurricane_map", num_agents: int = NUM_AGENTS, max_ticks: int = HEADLESS_MAX_TICKS,
+                 seed: int = None, flags: dict = None, snapshots: bool = False, quiet: bool = True):
+    """
+    Run a simulation of llm_plan until its plan is finished or max_ticks ticks have run.
+
+    Parameters:
+    - llm_plan: Plan steps keyed by step number, as produced by LLM_Planning.
+    - map_objects: A map name from simulation/maps.py, or a list of mapObjects (copied, never modified).
+    - num_agents: Swarm size.
+    - max_ticks: Tick limit for plans that never finish.
+    - seed: Seed for the agents' random start positions and velocities, for repeatable runs.
+    - flags: simulationManager constants to override for this run (see simulation_flags).
+    - snapshots: Also build the per-tick snapshot the API publishes, timed as its own phase.
+    - quiet: Swallow the simulation's progress prints.
+
+    Returns:
+    - A dict with the ticks run, whether the plan finished, the ticks per second, the mean time per tick
+      of each phase in ms, the peak memory of the process in MB and the final plan progress.
+    """
+    map_objects = copy.deepcopy(maps[map_objects] if isinstance(map_objects, str) else map_objects)
+    output = io.StringIO() if quiet else sys.stdout
+    with simulation_flags(flags), contextlib.redirect_stdout(output):
+        start = time.perf_counter()
+        simulation = Simulation(llm_plan, map_objects, map_index=MapIndex(map_objects), num_agents=num_agents, seed=seed)
+        setup_seconds = time.perf_counter() - start
+
+        timer = simulation.phase_timer = PhaseTimer()
+        start = time.perf_counter()
+        while simulation.loop_counter < max_ticks and not simulation.finished:
+            simulation.step()
+            if snapshots:
+                simulation.snapshot()
+                timer.lap("snapshot")
+        seconds = time.perf_counter() - start
+
+    return {
+        "ticks": simulation.loop_counter,
+        "finished": simulation.finished,
+        "setup_seconds": round(setup_seconds, 4),
+        "seconds": round(seconds, 4),
+        "ticks_per_second": round(simulation.loop_counter / seconds, 1) if seconds else 0.0,
+        "phase_ms": timer.per_tick_ms(),
+        "peak_memory_mb": peak_memory_mb(),
+        "plan_progress": simulation.plan_progress,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a recorded mission plan headless, as fast as possible.")
+    parser.add_argument("plan", help="JSON file with the llm_plan to run")
+    parser.add_argument("--map", default="hurricane_map", choices=sorted(maps), help="Map to run the plan on")
+    parser.add_argument("--agents", type=int, default=NUM_AGENTS, help="Swarm size")
+    parser.add_argument("--max-ticks", type=int, default=HEADLESS_MAX_TICKS, help="Stop after this many ticks")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for repeatable runs")
+    parser.add_argument("--snapshots", action="store_true", help="Also build the per-tick API snapshot")
+    parser.add_argument("--verbose", action="store_true", help="Show the simulation's progress prints")
+    args = parser.parse_args(argv)
+
+    result = run_headless(load_plan(args.plan), args.map, args.agents, args.max_ticks, args.seed, snapshots=args.snapshots, quiet=not args.verbose)
+    print(json.dumps(result, indent=2, default=str))
+
+if __name__ == "__main__":
+    main()
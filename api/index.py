@@ -1,15 +1,16 @@
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import PlainTextResponse
 import asyncio
 from pydantic import BaseModel
 from typing import List
 
-from .connectionManager import ConnectionManager
-from .simulationManager import run_simulation, agents_data, targets_data, obstacles_data, agent_detections_data, plan_progress, new_detections
-from .lib.dataProcessing import detected_objects_filter, update_map_detections
-from .simulation.maps import maps
-from .llm.llm import LLM_Planning
-from .config import ENV_WIDTH, ENV_HEIGHT, NUM_AGENTS, DETECT_FILTER_SIZE
+from .simulationSession import SessionRegistry, DEFAULT_SESSION_ID
+from .lib.protocol import PROTOCOL_VERSIONS, FRAME_FORMATS, Subscription
+from .llm.llm import LLM_Planning, LLM_Planning_stream, close_client, plan_cache, sandbox
+from .lib.metrics import metrics
+from .config import ENV_WIDTH, ENV_HEIGHT, NUM_AGENTS, LLM_STREAM_PLANS, RECORDING_ENABLED, RECORDING_DIR, MONTE_CARLO_RUNS, MONTE_CARLO_MAX_RUNS, MONTE_CARLO_MAX_TICKS
+from .missionEvaluation import evaluate_plan
 
 ### Create FastAPI instance with custom docs and openapi url
 app = FastAPI(docs_url="/api/py/docs", openapi_url="/api/py/openapi.json")
@@ -36,40 +37,58 @@ class MapResponse(BaseModel):
     detected: bool = False
 
 # Global variables
-simulation_running = False
-simulation_task = None
-map = None
-existing_agent_data = None
-
-manager = ConnectionManager()
+sessions = SessionRegistry()  # Isolated simulation state per operator session
+evaluation_slots = asyncio.Semaphore(1)  # One Monte-Carlo evaluation at a time; each already uses every CPU
 
 @app.on_event("startup")
 async def initialize_global_vars():
-    global simulation_running, simulation_task, map, existing_agent_data
+    global sessions
     # You can initialize or reset any global variables here, if needed.
-    simulation_running = False
-    simulation_task = None
-    map = None
-    existing_agent_data = None
+    sessions = SessionRegistry()
+
+@app.on_event("shutdown")
+async def stop_sessions():
+    await sessions.stop_all()
+    await close_client()
+
+def get_session(session_id: str):
+    """Look up (or create) a session, raising a 429 when the session limit is reached."""
+    try:
+        return sessions.get(session_id)
+    except ValueError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+@app.post("/api/py/sessions")
+async def create_session():
+    """Create a new session and return its id."""
+    try:
+        session = sessions.create()
+    except ValueError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return {"session_id": session.session_id}
+
+@app.delete("/api/py/sessions/{session_id}")
+async def delete_session(session_id: str):
+    """Stop a session's simulation and discard the session."""
+    if await sessions.remove(session_id):
+        return {"status": "Session removed"}
+    return {"status": "Session not found"}
 
 @app.get("/api/py/maps/{map_name}", response_model=List[MapResponse])
-async def get_map(map_name: str):
+async def get_map(map_name: str, session_id: str = DEFAULT_SESSION_ID):
     """Get the map data by name."""
-    global map
-    if map_name in maps:
-        detailed_map = maps[map_name]  # Detailed Exact Map
-        map = detected_objects_filter(detailed_map, min_size=DETECT_FILTER_SIZE)  # Detect large objects with satellite
-        
+    map = get_session(session_id).load_map(map_name)
+    if map is not None:
         return map
     else:
         return {"status": "Failed to get map data", "error": "Map not found"}
 
 @app.post("/api/py/mission-input")
-async def receive_mission_input(mission_input: MissionInput):
-    global simulation_running, simulation_task, map, existing_agent_data
+async def receive_mission_input(mission_input: MissionInput, session_id: str = DEFAULT_SESSION_ID, stream: bool = LLM_STREAM_PLANS, record: bool = RECORDING_ENABLED):
+    session = get_session(session_id)
     # Stop and reset the simulation if it's already running
-    if simulation_running:
-        await stop_simulation()  # Ensure the current simulation is stopped before proceeding
+    if session.running:
+        await session.stop()  # Ensure the current simulation is stopped before proceeding
 
     # Call the LLM Planning function
     mission_statement = mission_input.user_mission_statement
@@ -78,7 +97,13 @@ async def receive_mission_input(mission_input: MissionInput):
 
     try:
         # Create context based on detected objects
-        llm_map_context = [map_obj for map_obj in map if map_obj.detected == True]
+        llm_map_context = [map_obj for map_obj in session.map if map_obj.detected == True]
+
+        if stream:
+            # Start the simulation once the first step is generated; the rest follow as they arrive
+            if await session.start_stream(LLM_Planning_stream(mission_statement, N, llm_map_context, BBox), record):
+                return {"status": "Simulation started", "mission": mission_input.user_mission_statement, "recording": session.recording}
+            return {"status": "Failed to generate mission plan"}
 
         # Get the LLM plan asynchronously
         llm_plan = await LLM_Planning(mission_statement, N, llm_map_context, BBox)
@@ -87,10 +112,9 @@ async def receive_mission_input(mission_input: MissionInput):
         return {"status": "Error generating mission plan", "error": str(e)}
 
     if llm_plan:
-        simulation_running = True
-        # Pass the LLM plan to run_simulation and start the simulation asynchronously
-        simulation_task = asyncio.create_task(run_simulation(llm_plan, map, existing_agent_data)) 
-        return {"status": "Simulation started", "mission": mission_input.user_mission_statement}
+        # Pass the LLM plan to the session and start the simulation in the background
+        session.start(llm_plan, record)
+        return {"status": "Simulation started", "mission": mission_input.user_mission_statement, "recording": session.recording}
     else:
         # Return an error if the LLM plan could not be generated
         return {"status": "Failed to generate mission plan"}
@@ -98,57 +122,108 @@ async def receive_mission_input(mission_input: MissionInput):
 # Start the background task on application startup
 @app.on_event("startup")
 async def startup_event():
+    if sandbox is not None:
+        sandbox.start()  # Start the plan function workers before the first mission arrives
     print("FastAPI server has started. Waiting for simulation start.")
 
 # WebSocket endpoint for real-time updates
 @app.websocket("/ws/agents")
-async def websocket_endpoint(websocket: WebSocket):
-    global map, existing_agent_data
-    await manager.connect(websocket)
+async def websocket_endpoint(websocket: WebSocket, session_id: str = DEFAULT_SESSION_ID, protocol: int = 1, frame_format: str = Query("json", alias="format"),
+                             fps: float = None, fields: str = None, bbox: str = None):
+    if protocol not in PROTOCOL_VERSIONS or frame_format not in FRAME_FORMATS or (frame_format == "binary" and protocol != 1):
+        await websocket.close(code=1003)  # Unsupported protocol version or frame format
+        return
+    try:
+        # Frame rate, field mask and viewport of this client (version 1 only; binary frames have fixed fields)
+        subscription = Subscription.parse(fps, fields, bbox)
+        if (protocol != 1 and (fps or not subscription.full)) or (frame_format == "binary" and subscription.fields):
+            raise ValueError("Unsupported subscription for this protocol or format.")
+    except ValueError:
+        await websocket.close(code=1003)
+        return
+    try:
+        session = sessions.get(session_id)
+    except ValueError:
+        await websocket.close(code=1013)  # Session limit reached, try again later
+        return
+    await session.subscribe(websocket, protocol, frame_format, subscription)
     try:
         print("Connection Established")
-        while True:
-
-            # Logic to send data to the client
-            data = {
-                "targets": targets_data,
-                "obstacles": obstacles_data,
-                "agents": agents_data,
-                "agent_detections": agent_detections_data,
-                "plan_progress": plan_progress,
-                "new_detections": new_detections
-            }
-
-            # Update map for LLM recursive context and sequential user mission statements
-            if new_detections and map:
-                map = update_map_detections(map, new_detections)
-
-            # Save agent data for sequential user mission statements
-            if agents_data:
-                existing_agent_data = agents_data.copy()
-
-            await manager.send_data(data, websocket)
-            await asyncio.sleep(0.01)  # Control how often you send data
+        # Send the session's broadcast frames to this client
+        await session.manager.serve(websocket)
     except WebSocketDisconnect:
         print("Connection Closed")
-        manager.disconnect(websocket)
+    finally:
+        session.unsubscribe(websocket)
+
+# Measured tick rate, latency and drift of the simulation loop
+@app.get("/api/py/simulation-stats")
+async def get_simulation_stats(session_id: str = DEFAULT_SESSION_ID):
+    return get_session(session_id).stats()
+
+# Hit/miss metrics of the mission plan cache
+@app.get("/api/py/plan-cache-stats")
+async def get_plan_cache_stats():
+    return plan_cache.stats()
+
+# Latency histograms of the simulation tick phases, frame encoding, websocket sends, LLM calls and plan translation
+@app.get("/api/py/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+# Switch the timing hooks on or off at runtime
+@app.post("/api/py/metrics")
+async def set_metrics(enabled: bool):
+    metrics.set_enabled(enabled)
+    return {"enabled": metrics.enabled}
+
+# Recorded simulation runs available for replay
+@app.get("/api/py/recordings")
+async def list_recordings():
+    paths = sorted(RECORDING_DIR.glob("*.armrec")) if RECORDING_DIR.exists() else []
+    return [{"name": path.name, "bytes": path.stat().st_size} for path in paths]
+
+# Replay a recording through /ws/agents instead of running a simulation
+@app.post("/api/py/replay")
+async def start_replay(name: str, session_id: str = DEFAULT_SESSION_ID, speed: float = 1.0, tick: int = None):
+    path = RECORDING_DIR / name
+    if path.name != name or not path.is_file():
+        raise HTTPException(status_code=404, detail="Recording not found")
+    session = get_session(session_id)
+    if session.running:
+        await session.stop()
+    try:
+        return {"status": "Replay started", **session.start_replay(path, speed, tick)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Seek a running replay to a tick and/or change its speed (0 pauses)
+@app.post("/api/py/replay/seek")
+async def seek_replay(session_id: str = DEFAULT_SESSION_ID, tick: int = None, speed: float = None):
+    session = get_session(session_id)
+    if not session.replaying:
+        return {"status": "No replay running"}
+    session.runner.seek(tick, speed)
+    return {"status": "Replay moved", **session.runner.stats()}
+
+# Monte-Carlo evaluation of the session's latest mission plan: completion, step timeouts and detections over many seeded runs
+@app.post("/api/py/evaluate")
+async def evaluate_mission(session_id: str = DEFAULT_SESSION_ID, runs: int = Query(MONTE_CARLO_RUNS, ge=1, le=MONTE_CARLO_MAX_RUNS),
+                           max_ticks: int = Query(MONTE_CARLO_MAX_TICKS, ge=1), seed: int = None):
+    session = get_session(session_id)
+    if not session.llm_plan:
+        raise HTTPException(status_code=400, detail="No mission plan to evaluate")
+    if session.planning:
+        raise HTTPException(status_code=409, detail="The mission plan is still being generated")
+    async with evaluation_slots:
+        # Runs in worker processes; the event loop keeps serving the live simulation meanwhile
+        return await asyncio.to_thread(evaluate_plan, dict(session.llm_plan), session.mission_map, runs, NUM_AGENTS, max_ticks, seed)
 
 # Stop the simulation on a button click
 @app.post("/api/py/stop_simulation")
-async def stop_simulation():
-    global simulation_running, simulation_task
-    if simulation_running:
-        simulation_running = False
-        if simulation_task:
-            simulation_task.cancel()  # Cancel the running task if it's active
-
-        # Clear Global Variables to reset the environment
-        agents_data.clear()
-        targets_data.clear()
-        obstacles_data.clear()
-        agent_detections_data.clear()
-        plan_progress.clear()
-
+async def stop_simulation(session_id: str = DEFAULT_SESSION_ID):
+    # Stopping discards the session's simulation state, resetting the environment
+    if await get_session(session_id).stop():
         return {"status": "Simulation stopped and reset"}
     else:
         return {"status": "Simulation is not running"}
@@ -63,4 +63,13 @@ def update_map_detections(map, new_detections):
                 obj.detected = True
                 break
 
-    return map
\ No newline at end of file
+    return map
+
+def mark_detected_objects(map, detected_names):
+    """Set the detected flag on every map object whose name is in detected_names."""
+    detected_names = set(detected_names)
+    for obj in map:
+        if obj.name in detected_names:
+            obj.detected = True
+
+    return map
@@ -0,0 +1,99 @@
+import threading
+import time
+from bisect import bisect_left
+
+from ..config import METRICS_ENABLED, METRICS_BUCKETS
+
+class Histogram:
+    """Prometheus histogram, optionally split by the values of one label."""
+    def __init__(self, name: str, documentation: str, label: str = None, buckets=METRICS_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self.buckets = tuple(buckets)
+        self.series = {}  # Label value -> [observations per bucket (the last is +Inf), sum, count]
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, label_value: str = None):
+        with self.lock:
+            series = self.series.get(label_value)
+            if series is None:
+                series = self.series[label_value] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect_left(self.buckets, value)] += 1  # First bucket with value <= le
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        """Lines of the Prometheus text exposition format."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            series = {label_value: ([*counts], total, count) for label_value, (counts, total, count) in self.series.items()}
+        for label_value, (counts, total, count) in sorted(series.items(), key=lambda item: str(item[0])):
+            labels = f'{self.label}="{label_value}"' if self.label else ""
+            separator = "," if labels else ""
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                lines.append(f'{self.name}_bucket{{{labels}{separator}le="{le}"}} {cumulative}')
+            suffix = f"{{{labels}}}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {total}")
+            lines.append(f"{self.name}_count{suffix} {count}")
+        return lines
+
+class Metrics:
+    """
+    Latency histograms of the hot paths, exposed in the Prometheus text format.
+
+    Timing hooks call start() and observe(); while disabled start() returns None and observe()
+    returns straight away, so the hooks cost one attribute check. enabled can be switched at runtime.
+    """
+    def __init__(self, enabled: bool = METRICS_ENABLED):
+        self.enabled = enabled
+        self.switch = None  # multiprocessing Event mirroring enabled, for simulations in subprocesses
+
+        self.simulation_phase = Histogram("simulation_phase_seconds", "Time spent in each phase of a simulation tick.", "phase")
+        self.frame_encode = Histogram("websocket_frame_encode_seconds", "Time to serialize a snapshot into a websocket frame.", "format")
+        self.websocket_send = Histogram("websocket_send_seconds", "Time to send one websocket message.")
+        self.llm_request = Histogram("llm_request_seconds", "LLM planning request latency.", "kind")
+        self.translation = Histogram("plan_translation_seconds", "Time to translate (run) the function of one plan step.", "function_type")
+        self.histograms = [self.simulation_phase, self.frame_encode, self.websocket_send, self.llm_request, self.translation]
+
+    def set_enabled(self, enabled: bool):
+        self.enabled = enabled
+        if self.switch is not None:
+            self.switch.set() if enabled else self.switch.clear()
+
+    def process_switch(self, context):
+        """Event telling simulation subprocesses (of the given multiprocessing context) whether to time their ticks."""
+        if self.switch is None:
+            self.switch = context.Event()
+            if self.enabled:
+                self.switch.set()
+        return self.switch
+
+    def is_enabled(self):
+        return self.enabled
+
+    def start(self):
+        """Start time for observe(), or None while disabled."""
+        return time.perf_counter() if self.enabled else None
+
+    def observe(self, histogram: Histogram, start, label_value: str = None):
+        """Record the time since start (from start()) in histogram."""
+        if start is not None:
+            histogram.observe(time.perf_counter() - start, label_value)
+
+    def observe_snapshot(self, snapshot):
+        """Record the tick phase times a simulation attached to its snapshot."""
+        if self.enabled and snapshot is not None:
+            for phase, seconds in snapshot.stats.get("phase_seconds", {}).items():
+                self.simulation_phase.observe(seconds, phase)
+
+    def render(self):
+        lines = []
+        for histogram in self.histograms:
+            lines.extend(histogram.render())
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()  # Shared by the whole server process
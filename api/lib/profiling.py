@@ -0,0 +1,38 @@
+import time
+from collections import defaultdict
+
+try:
+    import resource  # Unix only; without it peak memory isn't reported
+except ImportError:
+    resource = None
+
+class PhaseTimer:
+    """Wall time spent in each phase of a simulation tick, accumulated over many ticks."""
+    def __init__(self):
+        self.totals = defaultdict(float)  # Phase name -> seconds
+        self.last_tick = {}  # Phase name -> seconds, of the latest tick only
+        self.ticks = 0
+        self.last = 0.0
+
+    def start(self):
+        """Start timing a tick."""
+        self.ticks += 1
+        self.last_tick = {}  # A new dict, so snapshots keep the one of their own tick
+        self.last = time.perf_counter()
+
+    def lap(self, phase):
+        """Charge the time since the previous lap (or start) to phase."""
+        now = time.perf_counter()
+        self.last_tick[phase] = now - self.last
+        self.totals[phase] += now - self.last
+        self.last = now
+
+    def per_tick_ms(self):
+        """Mean milliseconds per tick of each phase."""
+        return {phase: round(total / self.ticks * 1000, 4) for phase, total in self.totals.items()} if self.ticks else {}
+
+def peak_memory_mb():
+    """Peak resident memory of this process so far, in MB (None where unavailable)."""
+    if resource is None:
+        return None
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)  # ru_maxrss is in KB on Linux
@@ -0,0 +1,306 @@
+"""
+Websocket protocol versions for /ws/agents.
+
+Version 1 (default) sends the full payload as JSON on every frame.
+
+Version 2 sends a keyframe followed by deltas:
+
+- keyframe: {"type": "keyframe", "seq": n, <every field of the version 1 payload>}
+- delta:    {"type": "delta", "seq": n, "base": n - 1, "agents": {id: changes}, ...}
+
+Agent changes only carry the fields that changed:
+"dp" is the position change since the previous frame in integer multiples of "quantum",
+"v"/"a" are the velocity/acceleration rounded to "quantum", "t" is the target id and "z" the z position.
+"targets", "obstacles" and "plan_progress" are only present when they changed,
+"agent_detections" only carries changed entries and "new_detections" is only present when non-empty.
+A client that sees a delta whose "base" is not the last "seq" it applied has lost a frame and
+should ignore deltas until the next keyframe; keyframes are sent every keyframe_interval frames,
+and immediately to any client that connects or falls behind.
+
+With format=binary (version 1 only) agent state is sent as binary frames instead:
+a BINARY_FRAME_HEADER (magic b"AGNT", format version, field count, reserved, tick, agent count;
+little-endian) followed by agent count rows of float32 BINARY_AGENT_FIELDS.
+Everything else is sent as a JSON text message {"type": "state", ...} whenever it changes.
+
+Version 1 clients (JSON or binary) may also narrow their subscription:
+
+- fps: maximum frames per second; frames in between are skipped, the latest state is always sent.
+- fields: comma-separated agent fields to send (AGENT_FIELDS, JSON only), e.g. fields=position.
+- bbox: viewport "min_x,min_y,max_x,max_y"; only agents inside it are sent.
+
+A skipped frame's "new_detections" are not repeated; "agent_detections" always holds every detection.
+"""
+import struct
+import numpy as np
+
+from ..config import DELTA_KEYFRAME_INTERVAL, DELTA_POSITION_QUANTUM
+from ..simulation.snapshot import EMPTY_PAYLOAD, encode_payload
+
+PROTOCOL_VERSIONS = (1, 2)
+FRAME_FORMATS = ("json", "binary")
+
+BINARY_FRAME_MAGIC = b"AGNT"
+BINARY_FRAME_VERSION = 1
+BINARY_FRAME_HEADER = struct.Struct("<4sBBHII")
+BINARY_AGENT_FIELDS = ("id", "target_id", "x", "y", "z", "vx", "vy", "ax", "ay")
+
+AGENT_FIELDS = ("target_id", "position", "z_positon", "velocity", "acceleration")  # Keys of a JSON agent entry
+
+class Subscription:
+    """What one client asked to receive: a frame rate cap, a subset of agent fields and a viewport."""
+    def __init__(self, fps: float = None, fields: tuple = None, bbox: tuple = None):
+        self.fps = fps        # None: every frame
+        self.fields = fields  # None: every agent field
+        self.bbox = bbox      # None: every agent, otherwise (min_x, min_y, max_x, max_y)
+
+    @classmethod
+    def parse(cls, fps: float = None, fields: str = None, bbox: str = None):
+        """Build a subscription from websocket query parameters, raising ValueError if one is invalid."""
+        if fps is not None and not fps > 0:
+            raise ValueError("fps must be positive.")
+
+        if fields is not None:
+            fields = tuple(field.strip() for field in fields.split(",") if field.strip())
+            unknown = set(fields) - set(AGENT_FIELDS)
+            if unknown:
+                raise ValueError(f"Unknown agent fields {sorted(unknown)}. Expected any of {AGENT_FIELDS}.")
+            fields = tuple(field for field in AGENT_FIELDS if field in fields)  # Canonical order, so equal masks share frames
+
+        if bbox is not None:
+            bbox = tuple(float(value) for value in bbox.split(","))
+            if len(bbox) != 4 or bbox[0] > bbox[2] or bbox[1] > bbox[3]:
+                raise ValueError("bbox must be min_x,min_y,max_x,max_y.")
+
+        return cls(fps, fields, bbox)
+
+    @property
+    def full(self):
+        """Whether every agent and field is sent, so the shared full frame can be used."""
+        return self.fields is None and self.bbox is None
+
+    @property
+    def key(self):
+        """Subscriptions with the same key receive the same encoded frame."""
+        return (self.fields, self.bbox)
+
+    def select(self, snapshot):
+        """Row indices of the snapshot agents to send."""
+        if self.bbox is None:
+            return np.arange(len(snapshot.agent_ids))
+        min_x, min_y, max_x, max_y = self.bbox
+        position = snapshot.position
+        inside = (position[:, 0] >= min_x) & (position[:, 0] <= max_x) & (position[:, 1] >= min_y) & (position[:, 1] <= max_y)
+        return np.flatnonzero(inside)
+
+def encode_subscription_payload(snapshot, subscription):
+    """The version 1 JSON message for a subscription that only wants some agents or fields."""
+    if snapshot is None:
+        return encode_payload(EMPTY_PAYLOAD)
+
+    indices = subscription.select(snapshot)
+    columns = {
+        "target_id": snapshot.target_id,
+        "position": snapshot.position,
+        "z_positon": snapshot.z_position,
+        "velocity": snapshot.velocity,
+        "acceleration": snapshot.acceleration,
+    }
+    fields = subscription.fields or AGENT_FIELDS
+    values = {field: columns[field][indices].tolist() for field in fields}
+    agents = {
+        snapshot.agent_ids[index]: {field: values[field][row] for field in fields}
+        for row, index in enumerate(indices.tolist())
+    }
+    return encode_payload({**state_payload(snapshot), "agents": agents})
+
+def encode_binary_frame(snapshot, indices=None):
+    """Pack the agent arrays of a snapshot (or None) into one binary frame, without per-agent objects."""
+    if snapshot is None:
+        return BINARY_FRAME_HEADER.pack(BINARY_FRAME_MAGIC, BINARY_FRAME_VERSION, len(BINARY_AGENT_FIELDS), 0, 0, 0)
+
+    if indices is None:
+        indices = np.arange(len(snapshot.agent_ids))  # Every agent
+    rows = np.empty((len(indices), len(BINARY_AGENT_FIELDS)), dtype="<f4")
+    rows[:, 0] = np.asarray(snapshot.agent_ids)[indices]
+    rows[:, 1] = snapshot.target_id[indices]
+    rows[:, 2:4] = snapshot.position[indices]
+    rows[:, 4] = snapshot.z_position[indices]
+    rows[:, 5:7] = snapshot.velocity[indices]
+    rows[:, 7:9] = snapshot.acceleration[indices]
+    header = BINARY_FRAME_HEADER.pack(BINARY_FRAME_MAGIC, BINARY_FRAME_VERSION, len(BINARY_AGENT_FIELDS), 0, snapshot.tick, len(rows))
+    return header + rows.tobytes()
+
+def state_payload(snapshot):
+    """Every field of the version 1 payload except the agents, without building the agent entries."""
+    if snapshot is None:
+        return {key: value for key, value in EMPTY_PAYLOAD.items() if key != "agents"}
+    return {
+        "targets": snapshot.targets_data,
+        "obstacles": snapshot.obstacles_data,
+        "agent_detections": snapshot.agent_detections_data,
+        "plan_progress": snapshot.plan_progress,
+        "new_detections": snapshot.new_detections
+    }
+
+def encode_state_message(snapshot):
+    """Everything but the agents, as the JSON text message that accompanies binary frames."""
+    return encode_payload({"type": "state", **state_payload(snapshot)})
+
+class DeltaFrame:
+    """One encoded frame: the delta for subscribers in sync, and a keyframe built only if needed."""
+    def __init__(self, encoder, seq, delta):
+        self.encoder = encoder
+        self.seq = seq
+        self.delta = delta  # None when this frame is itself a keyframe for everyone
+        self._keyframe = None
+
+    def keyframe(self):
+        if self._keyframe is None:
+            self._keyframe = self.encoder.encode_keyframe(self.seq)
+        return self._keyframe
+
+class DeltaEncoder:
+    """
+    Shared delta encoder for every version 2 subscriber of a session.
+
+    The encoder tracks the state a client holds after applying each frame (positions are
+    reconstructed from the quantized deltas), so rounding never accumulates into drift.
+    """
+    def __init__(self, keyframe_interval=DELTA_KEYFRAME_INTERVAL, quantum=DELTA_POSITION_QUANTUM):
+        self.keyframe_interval = keyframe_interval
+        self.quantum = quantum
+        self.reset()
+
+    def reset(self):
+        """Forget the reference state; the next frame is a keyframe."""
+        self.seq = 0
+        self.frames_since_keyframe = 0
+        self.agent_ids = None
+        self.position = None      # Client-side reconstructed positions
+        self.velocity = None      # Quantized velocities (integer multiples of quantum)
+        self.acceleration = None  # Quantized accelerations
+        self.target_id = None
+        self.z_position = None
+        self.targets = EMPTY_PAYLOAD["targets"]
+        self.obstacles = EMPTY_PAYLOAD["obstacles"]
+        self.agent_detections = EMPTY_PAYLOAD["agent_detections"]
+        self.plan_progress = EMPTY_PAYLOAD["plan_progress"]
+        self.new_detections = EMPTY_PAYLOAD["new_detections"]
+
+    def quantize(self, values):
+        return np.rint(np.asarray(values) / self.quantum).astype(np.int64)
+
+    def encode(self, snapshot):
+        """Advance the reference state to snapshot (None when no simulation is running) and encode the frame."""
+        self.seq += 1
+        if snapshot is None:
+            self.reset()
+            self.seq = 1
+            return DeltaFrame(self, self.seq, None)
+
+        agent_ids = snapshot.agent_ids
+        keyframe = (self.agent_ids != agent_ids or self.frames_since_keyframe + 1 >= self.keyframe_interval)
+
+        if keyframe:
+            self.agent_ids = agent_ids
+            self.position = self.quantize(snapshot.position) * self.quantum
+            self.velocity = self.quantize(snapshot.velocity)
+            self.acceleration = self.quantize(snapshot.acceleration)
+            self.target_id = np.array(snapshot.target_id)
+            self.z_position = np.array(snapshot.z_position)
+            delta = None
+        else:
+            delta = {"type": "delta", "seq": self.seq, "base": self.seq - 1, "agents": self.encode_agents(snapshot)}
+
+        # Non-agent state: only send what changed
+        if delta is not None:
+            if snapshot.targets_data != self.targets:
+                delta["targets"] = snapshot.targets_data
+            if snapshot.obstacles_data != self.obstacles:
+                delta["obstacles"] = snapshot.obstacles_data
+            if snapshot.plan_progress != self.plan_progress:
+                delta["plan_progress"] = snapshot.plan_progress
+            detections = {agent_id: name for agent_id, name in snapshot.agent_detections_data.items() if self.agent_detections.get(agent_id) != name}
+            if detections:
+                delta["agent_detections"] = detections
+            if snapshot.new_detections:
+                delta["new_detections"] = snapshot.new_detections
+
+        self.targets = snapshot.targets_data
+        self.obstacles = snapshot.obstacles_data
+        self.plan_progress = snapshot.plan_progress
+        self.agent_detections = snapshot.agent_detections_data
+        self.new_detections = snapshot.new_detections
+
+        self.frames_since_keyframe = 0 if keyframe else self.frames_since_keyframe + 1
+        return DeltaFrame(self, self.seq, encode_payload(delta) if delta is not None else None)
+
+    def encode_agents(self, snapshot):
+        """Changed fields per agent, updating the reference state to what the client will hold."""
+        position_steps = self.quantize(snapshot.position - self.position)
+        velocity = self.quantize(snapshot.velocity)
+        acceleration = self.quantize(snapshot.acceleration)
+        target_id = np.asarray(snapshot.target_id)
+        z_position = np.asarray(snapshot.z_position)
+
+        moved = np.any(position_steps != 0, axis=1)
+        velocity_changed = np.any(velocity != self.velocity, axis=1)
+        acceleration_changed = np.any(acceleration != self.acceleration, axis=1)
+        target_changed = target_id != self.target_id
+        z_changed = z_position != self.z_position
+        changed = moved | velocity_changed | acceleration_changed | target_changed | z_changed
+
+        agents = {}
+        for index in np.flatnonzero(changed).tolist():
+            changes = {}
+            if moved[index]:
+                changes["dp"] = position_steps[index].tolist()
+            if velocity_changed[index]:
+                changes["v"] = (velocity[index] * self.quantum).tolist()
+            if acceleration_changed[index]:
+                changes["a"] = (acceleration[index] * self.quantum).tolist()
+            if target_changed[index]:
+                changes["t"] = int(target_id[index])
+            if z_changed[index]:
+                changes["z"] = float(z_position[index])
+            agents[self.agent_ids[index]] = changes
+
+        self.position = self.position + position_steps * self.quantum
+        self.velocity = velocity
+        self.acceleration = acceleration
+        self.target_id = target_id.copy()
+        self.z_position = z_position.copy()
+        return agents
+
+    def encode_keyframe(self, seq):
+        """The full reference state as it stands after frame seq."""
+        if self.agent_ids is None:
+            agents = {}
+        else:
+            positions = self.position.tolist()
+            velocities = (self.velocity * self.quantum).tolist()
+            accelerations = (self.acceleration * self.quantum).tolist()
+            target_ids = self.target_id.tolist()
+            z_positions = self.z_position.tolist()
+            agents = {
+                agent_id: {
+                    "target_id": target_ids[index],
+                    "position": positions[index],
+                    "z_positon": z_positions[index],
+                    "velocity": velocities[index],
+                    "acceleration": accelerations[index],
+                }
+                for index, agent_id in enumerate(self.agent_ids)
+            }
+
+        return encode_payload({
+            "type": "keyframe",
+            "seq": seq,
+            "quantum": self.quantum,
+            "targets": self.targets,
+            "obstacles": self.obstacles,
+            "agents": agents,
+            "agent_detections": self.agent_detections,
+            "plan_progress": self.plan_progress,
+            "new_detections": self.new_detections,
+        })
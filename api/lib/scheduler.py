@@ -0,0 +1,99 @@
+import asyncio
+import time
+
+from ..config import SIMULATION_TICK_HZ, SIMULATION_SUBSTEPS_PER_YIELD, SIMULATION_MAX_CATCHUP_STEPS
+
+class FixedTimestepScheduler:
+    """
+    Drive a step function at a fixed simulated tick rate.
+
+    Wall-clock time is collected in an accumulator and spent in whole ticks of 1 / target_hz,
+    so simulated time advances at the same rate however long each step takes or however busy
+    the event loop is. Late wake-ups are caught up with extra substeps (up to max_catchup_steps
+    per wake-up); anything beyond that is dropped and counted rather than replayed.
+    """
+    def __init__(self, target_hz=SIMULATION_TICK_HZ, substeps_per_yield=SIMULATION_SUBSTEPS_PER_YIELD, max_catchup_steps=SIMULATION_MAX_CATCHUP_STEPS):
+        self.target_hz = target_hz
+        self.dt = 1.0 / target_hz                   # Simulated seconds per tick
+        self.substeps_per_yield = substeps_per_yield  # Ticks to run before yielding to the event loop
+        self.max_catchup_steps = max(max_catchup_steps, substeps_per_yield)
+
+        self.running = False
+        self.ticks = 0              # Ticks run so far
+        self.dropped_time = 0.0     # Wall time skipped because catch-up was capped
+        self.start_time = None
+        self.last_tick_latency = 0.0
+        self.mean_tick_latency = 0.0  # Exponential moving average of step duration
+        self.max_tick_latency = 0.0
+
+    def _record_latency(self, latency):
+        self.last_tick_latency = latency
+        self.mean_tick_latency = latency if self.ticks == 1 else 0.95 * self.mean_tick_latency + 0.05 * latency
+        self.max_tick_latency = max(self.max_tick_latency, latency)
+
+    def run_due_steps(self, step, accumulator):
+        """Run every tick the accumulator holds (capped for catch-up) and return the leftover time."""
+        if accumulator > self.max_catchup_steps * self.dt:
+            self.dropped_time += accumulator - self.max_catchup_steps * self.dt
+            accumulator = self.max_catchup_steps * self.dt
+
+        while accumulator >= self.dt and self.running:
+            tick_start = time.perf_counter()
+            step()
+            self.ticks += 1
+            self._record_latency(time.perf_counter() - tick_start)
+            accumulator -= self.dt
+
+        return accumulator
+
+    async def run(self, step):
+        """Call step() at the target rate on the event loop until stop() is called (or the task is cancelled)."""
+        self.running = True
+        self.start_time = last_time = time.perf_counter()
+        accumulator = 0.0
+
+        while self.running:
+            now = time.perf_counter()
+            accumulator += now - last_time
+            last_time = now
+
+            accumulator = self.run_due_steps(step, accumulator)
+
+            # Sleep until the next batch of substeps is due
+            await asyncio.sleep(max(0.0, self.substeps_per_yield * self.dt - accumulator))
+
+    def run_blocking(self, step):
+        """Same as run(), for a dedicated worker thread or process: blocks and sleeps with time.sleep."""
+        self.running = True
+        self.start_time = last_time = time.perf_counter()
+        accumulator = 0.0
+
+        while self.running:
+            now = time.perf_counter()
+            accumulator += now - last_time
+            last_time = now
+
+            accumulator = self.run_due_steps(step, accumulator)
+
+            time.sleep(max(0.0, self.substeps_per_yield * self.dt - accumulator))
+
+    def stop(self):
+        self.running = False
+
+    def stats(self):
+        """Measured tick rate, latency and drift between simulated and wall-clock time."""
+        elapsed = time.perf_counter() - self.start_time if self.start_time else 0.0
+        simulated = self.ticks * self.dt
+        return {
+            "target_hz": self.target_hz,
+            "substeps_per_yield": self.substeps_per_yield,
+            "ticks": self.ticks,
+            "measured_hz": self.ticks / elapsed if elapsed > 0 else 0.0,
+            "simulated_time": simulated,
+            "wall_time": elapsed,
+            "drift": elapsed - simulated,  # Seconds the simulation is behind wall-clock time
+            "dropped_time": self.dropped_time,
+            "last_tick_latency": self.last_tick_latency,
+            "mean_tick_latency": self.mean_tick_latency,
+            "max_tick_latency": self.max_tick_latency,
+        }
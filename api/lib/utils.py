@@ -1,53 +1,21 @@
 import numpy as np
 import re
-import math
 import yaml
-from typing import Dict, Any
+from typing import Dict, Any, NamedTuple
 
-from ..config import TERRAIN_HEIGHT_MAP, ENV_WIDTH, ENV_HEIGHT, MAP_WIDTH, MAP_HEIGHT
+from ..simulation.terrain import get_terrain
 
 def get_height_at_position(x, y):
     """Fetch the height using bilinear interpolation at the given screen position (x, y)."""
-    # Normalize to the height map grid
-    # Scale X, Y to the height map size
-    map_x = (x / ENV_WIDTH) * (MAP_WIDTH - 1)
-    map_y = (y / ENV_HEIGHT) * (MAP_HEIGHT - 1)
-    
-    # Get the floor and ceil indices
-    x0 = int(np.floor(map_x))
-    x1 = min(x0 + 1, MAP_WIDTH - 1)
-    y0 = int(np.floor(map_y))
-    y1 = min(y0 + 1, MAP_HEIGHT - 1)
-
-    # Get the heights at the corners of the square
-    h00 = TERRAIN_HEIGHT_MAP[y0, x0]  # Bottom left
-    h01 = TERRAIN_HEIGHT_MAP[y0, x1]  # Bottom right
-    h10 = TERRAIN_HEIGHT_MAP[y1, x0]  # Top left
-    h11 = TERRAIN_HEIGHT_MAP[y1, x1]  # Top right
-
-    # Calculate the weights for interpolation
-    tx = map_x - x0  # Weight in x-direction
-    ty = map_y - y0  # Weight in y-direction
-
-    # Perform bilinear interpolation
-    height = (h00 * (1 - tx) * (1 - ty) +
-              h01 * tx * (1 - ty) +
-              h10 * (1 - tx) * ty +
-              h11 * tx * ty)
-
-    return height
+    return get_terrain().heights_at([x, y])[0]
 
 def get_gradient_at_position(x, y):
-        """Calculate the gradient (slope) at the given position from the height map."""
-        grid_x = int(min(max(x / ENV_WIDTH * MAP_WIDTH, 1), MAP_WIDTH - 2))
-        grid_y = int(min(max(y / ENV_HEIGHT * MAP_HEIGHT, 1), MAP_HEIGHT - 2))
-        
-        # Compute finite differences for gradient
-        dx = TERRAIN_HEIGHT_MAP[grid_y, grid_x + 1] - TERRAIN_HEIGHT_MAP[grid_y, grid_x - 1]
-        dy = TERRAIN_HEIGHT_MAP[grid_y + 1, grid_x] - TERRAIN_HEIGHT_MAP[grid_y - 1, grid_x]
-    
-        # Return gradient vector (influence on X and Y)
-        return np.array([dx, dy], dtype=float)
+    """Calculate the gradient (slope) at the given position from the precomputed terrain gradient field."""
+    return get_terrain().gradients_at([x, y])[0]
+
+def get_gradients_at_positions(positions):
+    """Batched get_gradient_at_position for an (N, 2) array of screen positions, returning (N, 2) gradients."""
+    return get_terrain().gradients_at(positions)
 
 def read_yaml_to_string(file_path: str) -> str:
     """
@@ -103,19 +71,9 @@ def parse_yaml_steps(yaml_string: str) -> Dict[str, Any]:
         parsed_steps = {}
         
         for step in steps:
-            # Extract step number, objective, and action function
-            step_number = step.get("step")
-            function_type = step.get("function_type")
-            objective = step.get("objective")
-            action_function = step.get("python_function").strip()  # Remove extra spaces
-            
             # Store the parsed step details
-            parsed_steps[step_number] = {
-                "step": step_number,
-                "function_type": function_type,
-                "objective": objective,
-                "python_function": action_function
-            }
+            step_details = parse_yaml_step(step)
+            parsed_steps[step_details["step"]] = step_details
         
         return parsed_steps
     
@@ -126,6 +84,118 @@ def parse_yaml_steps(yaml_string: str) -> Dict[str, Any]:
         print(f"An unexpected error occurred: {e}")
         return []
 
+def parse_yaml_step(step: dict) -> Dict[str, Any]:
+    """Extract step number, objective, and action function from one loaded YAML step."""
+    return {
+        "step": step.get("step"),
+        "function_type": step.get("function_type"),
+        "objective": step.get("objective"),
+        "python_function": step.get("python_function").strip()  # Remove extra spaces
+    }
+
+class YamlStepStream:
+    """
+    Incremental parse_yaml_steps for a plan that arrives in chunks (e.g. a streamed LLM completion).
+
+    A "- step:" block is complete once the next block starts, a line at or left of its "-" ends
+    the YAML, or the stream ends; feed() returns the steps completed by each chunk.
+    """
+    STEP_START = re.compile(r'^(\s*)-\s*step\s*:')
+
+    def __init__(self):
+        self.buffer = ""    # Text not yet split into complete lines
+        self.block = None   # Lines of the step block being received
+        self.indent = None  # Indentation of the "-" of the step blocks
+        self.done = False   # The YAML has ended
+
+    def feed(self, text: str) -> list:
+        """Add a chunk of text and return the steps it completed."""
+        self.buffer += text
+        *lines, self.buffer = self.buffer.split("\n")
+        steps = []
+        for line in lines:
+            steps.extend(self.feed_line(line))
+        return steps
+
+    def close(self) -> list:
+        """End of the stream: return the steps still pending."""
+        steps = self.feed_line(self.buffer) if self.buffer else []
+        self.buffer = ""
+        return steps + self.finish_block()
+
+    def feed_line(self, line: str) -> list:
+        if self.done:
+            return []
+
+        match = self.STEP_START.match(line)
+        if match and (self.indent is None or len(match.group(1)) == self.indent):
+            steps = self.finish_block()
+            self.indent = len(match.group(1))
+            self.block = [line]
+            return steps
+
+        if self.block is not None and line.strip():
+            indent = len(line) - len(line.lstrip())
+            if indent <= self.indent:
+                # Anything at or left of the "-" that isn't another step ends the YAML
+                self.done = True
+                return self.finish_block()
+
+        if self.block is not None:
+            self.block.append(line)
+        return []
+
+    def finish_block(self) -> list:
+        if self.block is None:
+            return []
+        block = "\n".join(line[self.indent:] for line in self.block)
+        self.block = None
+        try:
+            return [parse_yaml_step(step) for step in yaml.safe_load(block) or []]
+        except (yaml.YAMLError, AttributeError, TypeError) as e:
+            print(f"Error parsing YAML step: {e}")
+            return []
+
+class CoordinateEvaluation(NamedTuple):
+    arrived: np.ndarray   # (N,) bool, agent is within tolerance of its target
+    coverage: np.ndarray  # (T,) int, agents arrived at each target
+    assigned: int         # Agents with a target in this step
+    completion: float     # Percentage of assigned agents that arrived
+    complete: bool        # Every assigned agent arrived
+
+def evaluate_coordinates_batch(agent_positions, target_positions, tolerance: float, target_ids=None) -> CoordinateEvaluation:
+    """
+    Compares every agent's position to its target in one batched pass.
+
+    Parameters:
+    - agent_positions: (N, 2) array of agent positions.
+    - target_positions: (T, 2) array of target positions.
+    - tolerance: Allowed maximum distance between an agent and its target.
+    - target_ids: (N,) target index of each agent; defaults to pairing agent i with target i.
+      Agents whose target id is outside the targets have no target and are ignored.
+
+    Returns:
+    - A CoordinateEvaluation with per-agent arrivals, per-target coverage and the completion percentage.
+    """
+    agent_positions = np.asarray(agent_positions, dtype=float).reshape(-1, 2)
+    target_positions = np.asarray(target_positions, dtype=float).reshape(-1, 2)
+    if target_ids is None:
+        target_ids = np.arange(len(agent_positions))
+    target_ids = np.asarray(target_ids)
+
+    has_target = (target_ids >= 0) & (target_ids < len(target_positions))
+    arrived = np.zeros(len(agent_positions), dtype=bool)
+    # Euclidean distance between each agent and its target
+    distance = np.linalg.norm(agent_positions[has_target] - target_positions[target_ids[has_target]], axis=1)
+    arrived[has_target] = distance <= tolerance
+
+    coverage = np.bincount(target_ids[arrived], minlength=len(target_positions))
+    assigned = int(has_target.sum())
+    arrived_count = int(arrived.sum())
+    completion = 100.0 * arrived_count / assigned if assigned else 100.0
+
+    return CoordinateEvaluation(arrived, coverage, assigned, completion, arrived_count == assigned)
+
 def evaluate_coordinates(target_coordinates: list[tuple[int, int]], 
                          current_coordinates: list[tuple[int, int]], 
                          tolerance: float) -> bool:
@@ -143,15 +213,4 @@ def evaluate_coordinates(target_coordinates: list[tuple[int, int]],
     if len(target_coordinates) != len(current_coordinates):
         raise ValueError("The number of target and current coordinates must match.")
 
-    for i in range(len(target_coordinates)):
-        target_x, target_y = target_coordinates[i]
-        current_x, current_y = current_coordinates[i]
-
-        # Calculate the Euclidean distance between the target and current coordinates
-        distance = math.sqrt((target_x - current_x)**2 + (target_y - current_y)**2)
-        
-        # Check if the distance is within the allowed tolerance
-        if distance > tolerance:
-            return False
-
-    return True
+    return evaluate_coordinates_batch(current_coordinates, target_coordinates, tolerance).complete
@@ -1,11 +1,19 @@
 from dotenv import load_dotenv
+import asyncio
+import hashlib
 import os
-from openai import OpenAI
-
-from ..config import OPENAI_MODEL, MAX_TOKENS, TEMPERATURE
-from ..translator.translator import translate
+import random
+import httpx
+from openai import AsyncOpenAI, APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+
+from ..config import (OPENAI_MODEL, MAX_TOKENS, TEMPERATURE, LLM_BASE_URL, LLM_CONNECT_TIMEOUT, LLM_REQUEST_TIMEOUT,
+                      LLM_MAX_RETRIES, LLM_RETRY_BASE_DELAY, LLM_RETRY_MAX_DELAY, LLM_MAX_CONCURRENT_CALLS, LLM_MAX_CONNECTIONS, SANDBOX_ENABLED)
+from ..translator.translator import translate, coordinates_array
+from ..translator.sandbox import SandboxPool
 from ..lib.dataProcessing import map_to_string
-from ..lib.utils import parse_yaml_steps
+from ..lib.utils import parse_yaml_steps, YamlStepStream
+from ..lib.metrics import metrics
+from .planCache import PlanCache, plan_cache_key
 from .prompts.model_prompt import MODEL_PROMPT
 from ..llm.prompts.prompt_function_examples import PROMPT_FUNCTION_EXAMPLES
 
@@ -16,25 +24,72 @@ load_dotenv()
 OPEN_AI_API_KEY = os.getenv("OPEN_AI_API_KEY")
 AI_ML_API_KEY = os.getenv("AI_ML_API_KEY")
 
-async def OpenAI_API_CALL(user_mission_statement, prompt):
-    try:
-        print("Calling OpenAI API...")
+LLM_API_BASE_URL = os.getenv("LLM_BASE_URL", LLM_BASE_URL)
+
+# Errors worth retrying: the request may succeed a moment later
+RETRYABLE_ERRORS = (APITimeoutError, APIConnectionError, RateLimitError, InternalServerError)
+
+client = None  # Shared AsyncOpenAI client, created on first use
+plan_cache = PlanCache()  # Translated plans of previous missions
+PROMPT_HASH = hashlib.sha256(f"{MODEL_PROMPT}{PROMPT_FUNCTION_EXAMPLES}".encode()).hexdigest()  # Prompt changes invalidate cached plans
+planning_slots = asyncio.Semaphore(LLM_MAX_CONCURRENT_CALLS)  # Caps concurrent planning calls
+sandbox = SandboxPool() if SANDBOX_ENABLED else None  # Worker processes that run the generated plan functions
 
-        client = OpenAI(
-            base_url="https://api.aimlapi.com/v1",
-            api_key=AI_ML_API_KEY,
+def get_client():
+    """The shared async client; its HTTP connection pool is reused by every call."""
+    global client
+    if client is None:
+        client = AsyncOpenAI(
+            base_url=LLM_API_BASE_URL,
+            api_key=AI_ML_API_KEY or "unset",
             # api_key=OPEN_AI_API_KEY,
+            timeout=httpx.Timeout(LLM_REQUEST_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+            max_retries=0,  # Retried below, with jitter
+            http_client=httpx.AsyncClient(limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_CONNECTIONS)),
         )
+    return client
+
+async def close_client():
+    """Close the shared client and its connections, and the sandbox workers (on server shutdown)."""
+    global client
+    if client is not None:
+        await client.close()
+        client = None
+    if sandbox is not None:
+        await sandbox.close()
+
+def retry_delay(attempt):
+    """Exponential backoff with full jitter, so concurrent retries don't arrive together."""
+    return random.uniform(0, min(LLM_RETRY_MAX_DELAY, LLM_RETRY_BASE_DELAY * 2 ** attempt))
+
+async def create_completion(user_mission_statement, prompt, stream=False):
+    """Request a chat completion, retrying transient errors (for a stream, only until it opens)."""
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        try:
+            print("Calling OpenAI API...")
+            return await get_client().chat.completions.create(
+                messages=[
+                    {"role": "system", "content": prompt},
+                    {"role": "user", "content": user_mission_statement},
+                ],
+                model=OPENAI_MODEL,
+                max_tokens=MAX_TOKENS,  # Adjust this as necessary for your needs
+                temperature=TEMPERATURE,  # Adjusts randomness of responses; lower values make output more focused
+                stream=stream,
+            )
+        except RETRYABLE_ERRORS as e:
+            if attempt == LLM_MAX_RETRIES:
+                raise
+            delay = retry_delay(attempt)
+            print(f"LLM API call failed ({type(e).__name__}), retrying in {delay:.2f}s...")
+            await asyncio.sleep(delay)
 
-        response = client.chat.completions.create(
-            messages=[
-                {"role": "system", "content": prompt},
-                {"role": "user", "content": user_mission_statement},
-            ],
-            model=OPENAI_MODEL,
-            max_tokens=MAX_TOKENS,  # Adjust this as necessary for your needs
-            temperature=TEMPERATURE,  # Adjusts randomness of responses; lower values make output more focused
-        )
+async def OpenAI_API_CALL(user_mission_statement, prompt):
+    try:
+        async with planning_slots:
+            start = metrics.start()
+            response = await create_completion(user_mission_statement, prompt)
+            metrics.observe(metrics.llm_request, start, "plan")
 
         # Extract the response content
         ai_response = response.choices[0].message.content
@@ -42,9 +97,23 @@ async def OpenAI_API_CALL(user_mission_statement, prompt):
 
     except Exception as e:
         return f"An error occurred: {str(e)}"
-    
-async def LLM_Planning(user_mission_statement, N, map_objects, BBox):
 
+async def OpenAI_API_STREAM(user_mission_statement, prompt):
+    """Yield the response content of a streamed completion chunk by chunk."""
+    async with planning_slots:
+        start = metrics.start()
+        first_chunk = True
+        stream = await create_completion(user_mission_statement, prompt, stream=True)
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                if first_chunk:
+                    metrics.observe(metrics.llm_request, start, "stream_first_chunk")
+                    first_chunk = False
+                yield chunk.choices[0].delta.content
+        metrics.observe(metrics.llm_request, start, "stream")
+
+def planning_request(user_mission_statement, N, map_objects, BBox):
+    """The mission prompt, the map objects given to the plan functions, and the plan cache key."""
     # Stringify the satellite map as context for the LLM
     satellite_map_string = map_to_string(map_objects)
 
@@ -53,6 +122,45 @@ async def LLM_Planning(user_mission_statement, N, map_objects, BBox):
 
     mission_prompt = f"{MODEL_PROMPT}\n Function Examples:{PROMPT_FUNCTION_EXAMPLES}\n Context Objects:{satellite_map_string}"
 
+    # Repeat missions on the same map reuse the translated plan
+    model_parameters = {
+        "model": OPENAI_MODEL,
+        "max_tokens": MAX_TOKENS,
+        "temperature": TEMPERATURE,
+        "prompt": PROMPT_HASH,
+    }
+    cache_key = plan_cache_key(user_mission_statement, N, BBox, satellite_map_string, model_parameters)
+    return mission_prompt, map_objects_dict, cache_key
+
+async def translate_step(step_details, N, map_objects_dict, BBox):
+    """Verify & evaluate the python function of one plan step and store its output in the step."""
+    code = step_details["python_function"]
+    function_type = step_details["function_type"]
+
+    start = metrics.start()
+    if sandbox is not None:
+        step_eval = await sandbox.translate(code, N, map_objects_dict, BBox)
+    else:
+        step_eval = translate(code, N, map_objects_dict, BBox)
+    metrics.observe(metrics.translation, start, function_type)
+
+    # Store the evaluated code output
+    if function_type == "role":
+        step_details["role"] = step_eval
+    elif function_type == "group":
+        step_details["group"] = step_eval
+    elif function_type == "coordinates":
+        step_details["coordinates"] = coordinates_array(step_eval, N)  # One (N, 2) array, whether the function built a list or an array
+    return step_details
+
+async def LLM_Planning(user_mission_statement, N, map_objects, BBox):
+
+    mission_prompt, map_objects_dict, cache_key = planning_request(user_mission_statement, N, map_objects, BBox)
+    cached_plan = plan_cache.get(cache_key)
+    if cached_plan:
+        print("Using cached mission plan.")
+        return cached_plan
+
     try:
         # Get the LLM plan
         llm_response = await OpenAI_API_CALL(user_mission_statement, mission_prompt)
@@ -63,27 +171,48 @@ async def LLM_Planning(user_mission_statement, N, map_objects, BBox):
     # Parse the YAML string
     parsed_steps = parse_yaml_steps(llm_response)
 
-    # Execute the LLM plan 
-    for step_number, step_details in parsed_steps.items():
-
-        try:
-            code = step_details["python_function"]
-            function_type = step_details["function_type"]
-
-            # Verify & Evaluate the code
-            step_eval = translate(code, N, map_objects_dict, BBox)
-
-            # Store the evaluated code output
-            if function_type == "role":
-                parsed_steps[step_number]["role"] = step_eval
-            elif function_type == "group":
-                parsed_steps[step_number]["group"] = step_eval
-            elif function_type == "coordinates":
-                parsed_steps[step_number]["coordinates"] = step_eval
-        except Exception as e:
-            print(f"Error during step {step_number}: {e}")
+    # Execute the LLM plan, translating the steps in parallel
+    step_results = await asyncio.gather(
+        *[translate_step(step_details, N, map_objects_dict, BBox) for step_details in parsed_steps.values()],
+        return_exceptions=True,
+    )
+    for step_number, step_result in zip(parsed_steps, step_results):
+        if isinstance(step_result, Exception):
+            print(f"Error during step {step_number}: {step_result}")
             return False  # or continue based on the criticality of the step
 
+    if parsed_steps:
+        plan_cache.put(cache_key, parsed_steps)
     return parsed_steps.copy()
 
-
+async def LLM_Planning_stream(user_mission_statement, N, map_objects, BBox):
+    """
+    Streaming LLM_Planning: yields (step_number, step) for each translated step as soon as its
+    YAML block has been generated, so the simulation can start before the LLM has finished.
+    Stops at the first step that fails to translate; only complete plans are cached.
+    """
+    mission_prompt, map_objects_dict, cache_key = planning_request(user_mission_statement, N, map_objects, BBox)
+    cached_plan = plan_cache.get(cache_key)
+    if cached_plan:
+        print("Using cached mission plan.")
+        for step_number, step_details in cached_plan.items():
+            yield step_number, step_details
+        return
+
+    parser = YamlStepStream()
+    plan = {}
+
+    async def translate_steps(steps):
+        for step_details in steps:
+            await translate_step(step_details, N, map_objects_dict, BBox)
+            plan[step_details["step"]] = step_details
+            yield step_details["step"], step_details
+
+    async for text in OpenAI_API_STREAM(user_mission_statement, mission_prompt):
+        async for step in translate_steps(parser.feed(text)):
+            yield step
+    async for step in translate_steps(parser.close()):
+        yield step
+
+    if plan:
+        plan_cache.put(cache_key, plan)
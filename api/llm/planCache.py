@@ -0,0 +1,125 @@
+import hashlib
+import json
+import pickle
+import sqlite3
+import time
+from collections import OrderedDict
+
+from ..config import PLAN_CACHE_SIZE, PLAN_CACHE_TTL, PLAN_CACHE_DB_PATH, PLAN_CACHE_DB_SIZE
+
+def canonical_mission(mission_statement):
+    """Mission statements that only differ in case or whitespace plan the same mission."""
+    return " ".join(mission_statement.split()).casefold()
+
+def plan_cache_key(mission_statement, N, BBox, map_context, model_parameters):
+    """
+    Content hash identifying one planning request.
+
+    Parameters:
+    - mission_statement: The user mission statement.
+    - N: The number of agents.
+    - BBox: The environment bounding box.
+    - map_context: The map_to_string context given to the LLM.
+    - model_parameters: Anything else that changes the LLM output (model, temperature, prompts...).
+
+    Returns:
+    - A hex digest; equal requests give equal keys.
+    """
+    request = {
+        "mission": canonical_mission(mission_statement),
+        "N": N,
+        "BBox": BBox,
+        "map": sorted(map_context.splitlines()),  # Object order doesn't change the context
+        "model": model_parameters,
+    }
+    return hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode()).hexdigest()
+
+class PlanCache:
+    """
+    Two-tier cache of translated LLM plans: an in-memory LRU and an optional SQLite file.
+
+    Plans are stored pickled, so every hit hands out a fresh copy that the simulation may modify.
+    """
+    def __init__(self, max_entries: int = PLAN_CACHE_SIZE, ttl: float = PLAN_CACHE_TTL, db_path=PLAN_CACHE_DB_PATH, max_db_entries: int = PLAN_CACHE_DB_SIZE):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_db_entries = max_db_entries
+        self.entries = OrderedDict()  # key -> (expires_at, pickled plan), least recently used first
+        self.db = None
+        if db_path:
+            self.db = sqlite3.connect(str(db_path), check_same_thread=False)
+            self.db.execute("CREATE TABLE IF NOT EXISTS plans (key TEXT PRIMARY KEY, expires_at REAL, plan BLOB)")
+            self.db.commit()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """A copy of the cached plan for key, or None."""
+        now = time.time()
+        entry = self.entries.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                self.entries.move_to_end(key)
+                self.memory_hits += 1
+                return pickle.loads(entry[1])
+            del self.entries[key]
+            self.expirations += 1
+
+        if self.db is not None:
+            row = self.db.execute("SELECT expires_at, plan FROM plans WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                if row[0] > now:
+                    self._remember(key, row[0], row[1])  # Promote to the memory tier
+                    self.disk_hits += 1
+                    return pickle.loads(row[1])
+                self.db.execute("DELETE FROM plans WHERE key = ?", (key,))
+                self.db.commit()
+                self.expirations += 1
+
+        self.misses += 1
+        return None
+
+    def put(self, key, plan):
+        """Cache a copy of plan under key for ttl seconds."""
+        expires_at = time.time() + self.ttl
+        data = pickle.dumps(plan)
+        self._remember(key, expires_at, data)
+
+        if self.db is not None:
+            self.db.execute("INSERT OR REPLACE INTO plans (key, expires_at, plan) VALUES (?, ?, ?)", (key, expires_at, data))
+            # Drop expired plans, then the plans closest to expiry beyond the size limit
+            self.db.execute("DELETE FROM plans WHERE expires_at <= ?", (time.time(),))
+            self.db.execute("DELETE FROM plans WHERE key NOT IN (SELECT key FROM plans ORDER BY expires_at DESC LIMIT ?)", (self.max_db_entries,))
+            self.db.commit()
+
+    def _remember(self, key, expires_at, data):
+        self.entries[key] = (expires_at, data)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+        if self.db is not None:
+            self.db.execute("DELETE FROM plans")
+            self.db.commit()
+
+    def stats(self):
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "hits": hits,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "memory_entries": len(self.entries),
+            "disk_entries": self.db.execute("SELECT COUNT(*) FROM plans").fetchone()[0] if self.db is not None else 0,
+        }
@@ -32,6 +32,7 @@ Object = {
 
 Make sure each step is a well defined python function with the above specified inputs and outputs. Each Python function should be a self-contained step that the agents can execute.
 Python functions should not should not call other functions, should not import libraries, or rely on external state. Each function should be able to run independently.
+NumPy is available as np without importing it. "coordinates" functions may instead return an (N, 2) NumPy array, built with np.linspace, np.arange, np.cos, np.sin, np.column_stack and similar functions; prefer this for large N.
 
 There are four types of functions you can use:
 1. "role": Assign roles to agents (e.g., scout, leader, follower).
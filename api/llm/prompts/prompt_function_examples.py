@@ -288,4 +288,16 @@ PROMPT_FUNCTION_EXAMPLES = """
             paths.append(path)
 
         return paths
+
+- id: 17
+  function_type: "coordinates"
+  task_type: "Form Circle (NumPy)"
+  objective: "Agents form a circle around the center, computed as one NumPy array so it stays fast for large swarms."
+  python_function: |
+    def form_circle_array(N: int, Objects: list, BBox: list[int]) -> np.ndarray:
+        center_x = (BBox[0] + BBox[2]) / 2
+        center_y = (BBox[1] + BBox[3]) / 2
+        radius = min(BBox[2] - BBox[0], BBox[3] - BBox[1]) / 4
+        angles = np.linspace(0, 2 * np.pi, N, endpoint=False)
+        return np.column_stack((center_x + radius * np.cos(angles), center_y + radius * np.sin(angles)))
 """
\ No newline at end of file
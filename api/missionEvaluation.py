@@ -0,0 +1,169 @@
+"""
+Monte-Carlo mission evaluation: run many seeded headless copies of the same plan and map in a process pool
+and report how reliably the plan completes: step timeouts, ticks to finish each step and the mission,
+and which map objects the agents found.
+
+Usage:
+    python -m api.missionEvaluation plan.json [--map hurricane_map] [--runs 32] [--agents 20] [--max-ticks 10000] [--seed 0]
+
+plan.json holds an llm_plan (see headlessRunner.save_plan). Every run is reproducible from its seed,
+e.g. with Simulation(llm_plan, map_objects, seed=seed).
+"""
+import argparse
+import contextlib
+import copy
+import io
+import json
+import multiprocessing
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .config import NUM_AGENTS, DETECT_FILTER_SIZE, MONTE_CARLO_RUNS, MONTE_CARLO_MAX_TICKS, MONTE_CARLO_WORKERS
+from .headlessRunner import load_plan
+from .simulationManager import Simulation
+from .simulation.maps import maps
+from .simulation.mapIndex import MapIndex
+from .lib.dataProcessing import detected_objects_filter
+
+def evaluate_seed(llm_plan: dict, map_objects: list, num_agents: int, max_ticks: int, seed: int):
+    """
+    Run one seeded simulation of llm_plan until it finishes or max_ticks ticks have run.
+
+    Returns:
+    - A dict with the ticks run, whether the plan finished, and per step the ticks it took and whether it
+      timed out (moved on after MAX_EVALS evaluations without every agent at its target), and the tick at
+      which each map object was first detected.
+    """
+    map_objects = copy.deepcopy(map_objects)
+    with contextlib.redirect_stdout(io.StringIO()):
+        simulation = Simulation(llm_plan, map_objects, map_index=MapIndex(map_objects), num_agents=num_agents, seed=seed)
+        steps = {}  # Step -> {"ticks": ..., "timed_out": ...}
+        step_start = {}
+        detections = {}  # Map object name -> tick of its first detection
+        while simulation.loop_counter < max_ticks and not simulation.finished:
+            step = simulation.current_step
+            simulation.step()
+            if simulation.current_step != step:
+                step_start[simulation.current_step] = simulation.loop_counter
+
+            step = simulation.current_step
+            if step in simulation.llm_plan and step in step_start and step not in steps and simulation.step_completed:
+                steps[step] = {
+                    "ticks": simulation.loop_counter - step_start[step] + 1,
+                    "timed_out": bool(simulation.plan_progress[step]["agents_arrived"] < np.count_nonzero(simulation.swarm.target_id >= 0)),
+                }
+            for detection in simulation.new_detections:
+                detections[detection["name"]] = simulation.loop_counter
+
+    return {
+        "seed": seed,
+        "ticks": simulation.loop_counter,
+        "finished": simulation.finished,
+        "steps": steps,
+        "detections": detections,
+    }
+
+def distribution(values):
+    """Summary of a list of numbers: count, mean and percentiles."""
+    if not values:
+        return {"count": 0}
+    values = np.asarray(values, dtype=float)
+    p10, p50, p90 = np.percentile(values, [10, 50, 90])
+    return {
+        "count": len(values),
+        "mean": round(float(values.mean()), 1),
+        "min": float(values.min()),
+        "p10": round(float(p10), 1),
+        "p50": round(float(p50), 1),
+        "p90": round(float(p90), 1),
+        "max": float(values.max()),
+    }
+
+def aggregate(results: list, llm_plan: dict, map_objects: list):
+    """Combine the results of evaluate_seed over many seeds into one report."""
+    runs = len(results)
+    finished = [result for result in results if result["finished"]]
+    # Objects the satellite already detected can't be found by the agents
+    searchable = [map_object.name for map_object in map_objects if not map_object.detected]
+
+    steps = {}
+    for step in sorted(llm_plan):
+        reached = [result["steps"][step] for result in results if step in result["steps"]]
+        timeouts = sum(step_result["timed_out"] for step_result in reached)
+        steps[step] = {
+            "completed_runs": len(reached),
+            "timeouts": timeouts,
+            "timeout_rate": round(timeouts / runs, 3) if runs else 0.0,
+            "ticks": distribution([step_result["ticks"] for step_result in reached]),
+        }
+
+    objects = {}
+    for name in searchable:
+        ticks = [result["detections"][name] for result in results if name in result["detections"]]
+        objects[name] = {"found_rate": round(len(ticks) / runs, 3) if runs else 0.0, "first_tick": distribution(ticks)}
+    coverage = [len(set(result["detections"]) & set(searchable)) / len(searchable) for result in results] if searchable else []
+
+    return {
+        "runs": runs,
+        "seeds": [result["seed"] for result in results],
+        "finished_runs": len(finished),
+        "completion_rate": round(len(finished) / runs, 3) if runs else 0.0,
+        "mission_ticks": distribution([result["ticks"] for result in finished]),
+        "timeouts": sum(step["timeouts"] for step in steps.values()),
+        "steps": steps,
+        "detection": {
+            "searchable_objects": len(searchable),
+            "coverage": distribution(coverage),
+            "objects": objects,
+        },
+        "unfinished_seeds": [result["seed"] for result in results if not result["finished"]],
+    }
+
+def evaluate_plan(llm_plan: dict, map_objects: list, runs: int = MONTE_CARLO_RUNS, num_agents: int = NUM_AGENTS,
+                  max_ticks: int = MONTE_CARLO_MAX_TICKS, seed: int = None, workers: int = MONTE_CARLO_WORKERS):
+    """
+    Run runs seeded copies of llm_plan on map_objects across a process pool and aggregate them.
+
+    Parameters:
+    - llm_plan: Plan steps keyed by step number, as produced by LLM_Planning.
+    - map_objects: The mapObjects of the mission's map, in the state the mission starts from (never modified).
+    - runs: Number of seeded runs.
+    - num_agents: Swarm size.
+    - max_ticks: Tick limit of each run; runs that hit it count as unfinished.
+    - seed: Seed of the first run (the others follow it); random if not given.
+    - workers: Worker processes (default: one per CPU).
+
+    Returns:
+    - The report of aggregate(), plus the wall time in seconds.
+    """
+    seed = random.randrange(2 ** 32 - runs) if seed is None else seed
+    seeds = [seed + index for index in range(runs)]
+    start = time.perf_counter()
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        futures = [executor.submit(evaluate_seed, llm_plan, map_objects, num_agents, max_ticks, run_seed) for run_seed in seeds]
+        results = [future.result() for future in futures]
+    report = aggregate(results, llm_plan, map_objects)
+    report["seconds"] = round(time.perf_counter() - start, 2)
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate how reliably a recorded mission plan completes over many seeds.")
+    parser.add_argument("plan", help="JSON file with the llm_plan to evaluate")
+    parser.add_argument("--map", default="hurricane_map", choices=sorted(maps), help="Map to run the plan on")
+    parser.add_argument("--runs", type=int, default=MONTE_CARLO_RUNS, help="Number of seeded runs")
+    parser.add_argument("--agents", type=int, default=NUM_AGENTS, help="Swarm size")
+    parser.add_argument("--max-ticks", type=int, default=MONTE_CARLO_MAX_TICKS, help="Tick limit of each run")
+    parser.add_argument("--seed", type=int, default=None, help="Seed of the first run")
+    parser.add_argument("--workers", type=int, default=MONTE_CARLO_WORKERS, help="Worker processes")
+    args = parser.parse_args(argv)
+
+    # The map as a session loads it: objects large enough for the satellite start out detected
+    map_objects = detected_objects_filter(copy.deepcopy(maps[args.map]), min_size=DETECT_FILTER_SIZE)
+    report = evaluate_plan(load_plan(args.plan), map_objects, args.runs, args.agents, args.max_ticks, args.seed, args.workers)
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -4,16 +4,59 @@ from ..lib.utils import get_gradient_at_position
 from ..config import ENV_WIDTH, ENV_HEIGHT, MAX_SPEED, MAX_FORCE, RADIUS
 
 class Agent:
-    def __init__(self, agent_id, position, target_id, z_position=0):
-        x, y = position[0], position[1]
+    """A single agent, stored as a thin view over one row of a SwarmState."""
+    def __init__(self, agent_id, position, target_id, z_position=0, swarm=None, index=None):
         self.id = agent_id  # Unique identifier for the agent
-        self.position = np.array([x, y], dtype=float)
-        self.velocity = np.random.uniform(-2, 2, 2)  # 2D vector for velocity
-        self.acceleration = np.zeros(2, dtype=float)  # Initialize acceleration to zero
-        self.target_id = target_id  # Swarm identifier
-        self.z_position = z_position  # Separated for greater LLM control (similar to air traffic control altitude)
         self.role = None  # Role assigned to the agent
 
+        if swarm is None:
+            # Standalone agent, backed by its own single-agent swarm
+            from .swarm import SwarmState
+            swarm = SwarmState([agent_id], [position[0], position[1]], [target_id], z_positions=[z_position])
+            index = 0
+        self.swarm = swarm
+        self.index = index  # Row of this agent in the swarm arrays
+
+    @property
+    def position(self):
+        return self.swarm.position[self.index]
+
+    @position.setter
+    def position(self, value):
+        self.swarm.position[self.index] = value
+
+    @property
+    def velocity(self):
+        return self.swarm.velocity[self.index]  # 2D vector for velocity
+
+    @velocity.setter
+    def velocity(self, value):
+        self.swarm.velocity[self.index] = value
+
+    @property
+    def acceleration(self):
+        return self.swarm.acceleration[self.index]
+
+    @acceleration.setter
+    def acceleration(self, value):
+        self.swarm.acceleration[self.index] = value
+
+    @property
+    def target_id(self):
+        return int(self.swarm.target_id[self.index])  # Swarm identifier
+
+    @target_id.setter
+    def target_id(self, value):
+        self.swarm.target_id[self.index] = value
+
+    @property
+    def z_position(self):
+        return float(self.swarm.z_position[self.index])  # Separated for greater LLM control (similar to air traffic control altitude)
+
+    @z_position.setter
+    def z_position(self, value):
+        self.swarm.z_position[self.index] = value
+
     def edges(self):
         """Keep the agents inside the environment boundaries."""
         if self.position[0] > ENV_WIDTH:
@@ -0,0 +1,217 @@
+import time
+import numpy as np
+
+try:
+    from scipy.optimize import linear_sum_assignment  # Optional, much faster exact solver
+except ImportError:
+    linear_sum_assignment = None
+
+from ..config import ASSIGNMENT_METHOD, ASSIGNMENT_EXACT_MAX_N, ASSIGNMENT_GREEDY_CANDIDATES
+
+ASSIGNMENT_METHODS = ("min_sum", "min_max", "index")
+
+def distance_matrix(target_positions, agent_positions):
+    """(T, N) distances between every target and every agent."""
+    return np.linalg.norm(target_positions[:, None, :] - agent_positions[None, :, :], axis=2)
+
+def squared_distance_matrix(target_positions, agent_positions):
+    """(T, N) squared distances via one matrix product; cheaper than distance_matrix for large swarms."""
+    squared = (target_positions ** 2).sum(axis=1)[:, None] + (agent_positions ** 2).sum(axis=1)[None, :] - 2 * target_positions @ agent_positions.T
+    return np.maximum(squared, 0)
+
+def hungarian(cost):
+    """
+    Minimum-cost assignment of every row of a (n, m) cost matrix (n <= m) to a distinct column.
+
+    Returns:
+    - (rows, columns) index arrays, like scipy.optimize.linear_sum_assignment.
+    """
+    if linear_sum_assignment is not None:
+        return linear_sum_assignment(cost)
+
+    # Shortest augmenting path Hungarian algorithm with potentials, vectorized over columns.
+    # Index 0 is a virtual column; p[j] is the (1-based) row assigned to column j.
+    n, m = cost.shape
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    p = np.zeros(m + 1, dtype=int)
+    way = np.zeros(m + 1, dtype=int)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            free = np.flatnonzero(~used)
+            reduced = cost[i0 - 1, free - 1] - u[i0] - v[free]
+            better = reduced < minv[free]
+            minv[free[better]] = reduced[better]
+            way[free[better]] = j0
+            j1 = free[np.argmin(minv[free])]
+            delta = minv[j1]
+            u[p[used]] += delta
+            v[used] -= delta
+            minv[free] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        # Flip the augmenting path
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+
+    columns = np.flatnonzero(p[1:])
+    rows = p[columns + 1] - 1
+    order = np.argsort(rows)
+    return rows[order], columns[order]
+
+def min_sum_assignment(cost):
+    """Assignment minimizing the total cost."""
+    return hungarian(cost)
+
+def has_complete_matching(allowed):
+    """Whether every row of a (T, N) boolean matrix can be matched to a distinct allowed column (augmenting paths)."""
+    T, N = allowed.shape
+    row_column = np.full(T, -1)
+    column_row = np.full(N, -1)
+    for row in range(T):
+        # Breadth-first search for an alternating path from row to a free column
+        reached_from = np.full(N, -1)  # Row through which each column was reached
+        visited = np.zeros(N, dtype=bool)
+        queue = [row]
+        free_column = -1
+        while queue and free_column < 0:
+            current = queue.pop()
+            for column in np.flatnonzero(allowed[current] & ~visited).tolist():
+                visited[column] = True
+                reached_from[column] = current
+                if column_row[column] < 0:
+                    free_column = column
+                    break
+                queue.append(column_row[column])
+        if free_column < 0:
+            return False
+
+        # Flip the path
+        column = free_column
+        while True:
+            current = reached_from[column]
+            previous_column = row_column[current]
+            row_column[current] = column
+            column_row[column] = current
+            if current == row:
+                break
+            column = previous_column
+    return True
+
+def min_max_assignment(cost):
+    """Assignment minimizing the largest cost (bottleneck), then the total cost among those."""
+    # Every row needs some column, so the bottleneck is at least the largest row minimum
+    thresholds = np.unique(cost)
+    thresholds = thresholds[thresholds >= cost.min(axis=1).max()]
+    low, high = 0, len(thresholds) - 1
+    # Binary search for the smallest threshold that still allows a complete assignment
+    while low < high:
+        middle = (low + high) // 2
+        if has_complete_matching(cost <= thresholds[middle]):
+            high = middle
+        else:
+            low = middle + 1
+    penalty = cost.sum() + 1.0  # Larger than any assignment using only allowed pairs
+    return hungarian(np.where(cost > thresholds[low], cost + penalty, cost))
+
+def greedy_assignment(target_positions, agent_positions, candidates: int = ASSIGNMENT_GREEDY_CANDIDATES, chunk_size: int = 256):
+    """
+    Fast approximate min-sum assignment for large swarms: pair targets with their nearest free agent,
+    shortest pairs first, considering only each target's nearest candidates. Targets left over when
+    their candidates are taken are matched in further rounds against the remaining agents, until
+    every target or every agent is matched.
+    """
+    T, N = len(target_positions), len(agent_positions)
+    target_agent = np.full(T, -1)
+    agent_taken = np.zeros(N, dtype=bool)
+
+    while True:
+        targets = np.flatnonzero(target_agent < 0)
+        agents = np.flatnonzero(~agent_taken)
+        if len(targets) == 0 or len(agents) == 0:
+            break
+        k = min(candidates, len(agents))
+
+        # Nearest k free agents of every unmatched target, a chunk of targets at a time to bound memory
+        pair_targets, pair_agents, pair_distances = [], [], []
+        for start in range(0, len(targets), chunk_size):
+            chunk = targets[start:start + chunk_size]
+            distances = squared_distance_matrix(target_positions[chunk], agent_positions[agents])  # Same order as distances
+            nearest = np.argpartition(distances, k - 1, axis=1)[:, :k] if k < len(agents) else np.tile(np.arange(len(agents)), (len(chunk), 1))
+            pair_targets.append(np.repeat(chunk, k))
+            pair_agents.append(agents[nearest].ravel())
+            pair_distances.append(np.take_along_axis(distances, nearest, axis=1).ravel())
+        pair_targets = np.concatenate(pair_targets)
+        pair_agents = np.concatenate(pair_agents)
+        order = np.argsort(np.concatenate(pair_distances), kind="stable")
+
+        for target, agent in zip(pair_targets[order].tolist(), pair_agents[order].tolist()):
+            if target_agent[target] < 0 and not agent_taken[agent]:
+                target_agent[target] = agent
+                agent_taken[agent] = True
+
+    matched = np.flatnonzero(target_agent >= 0)
+    return matched, target_agent[matched]
+
+def assign_targets(agent_positions, target_positions, method: str = ASSIGNMENT_METHOD, exact_max_n: int = ASSIGNMENT_EXACT_MAX_N):
+    """
+    Assign each target of a plan step to a distinct agent.
+
+    Parameters:
+    - agent_positions: (N, 2) array of current agent positions.
+    - target_positions: (T, 2) array of the step's coordinates. With more targets than agents (T > N)
+      every agent gets a target and the remaining targets stay unassigned.
+    - method: "min_sum" (minimum total distance), "min_max" (minimum longest distance) or
+      "index" (agent i takes target i). Exact solvers are used up to exact_max_n agents,
+      a greedy nearest-candidate approximation of min_sum beyond that.
+
+    Returns:
+    - (target_ids, report): the (N,) target id of every agent (-1 for agents without a target)
+      and a dict with the solver used, the total and longest distance, the number of unassigned
+      targets and the solve time.
+    """
+    if method not in ASSIGNMENT_METHODS:
+        raise ValueError(f"Unknown assignment method '{method}'. Expected one of {ASSIGNMENT_METHODS}.")
+
+    agent_positions = np.asarray(agent_positions, dtype=float).reshape(-1, 2)
+    target_positions = np.asarray(target_positions, dtype=float).reshape(-1, 2)
+    N, T = len(agent_positions), len(target_positions)
+
+    start = time.perf_counter()
+    if T == 0 or N == 0:
+        solver, targets, agents = method, np.empty(0, dtype=int), np.empty(0, dtype=int)
+    elif method == "index":
+        solver, targets, agents = "index", np.arange(min(T, N)), np.arange(min(T, N))
+    elif N > exact_max_n:
+        solver = "greedy"
+        targets, agents = greedy_assignment(target_positions, agent_positions)
+    else:
+        solver = method
+        solve = min_max_assignment if method == "min_max" else min_sum_assignment
+        cost = distance_matrix(target_positions, agent_positions)
+        if T <= N:
+            targets, agents = solve(cost)
+        else:
+            agents, targets = solve(cost.T)  # The solvers match every row, so give each agent a target instead
+    solve_time = time.perf_counter() - start
+
+    target_ids = np.full(N, -1)
+    target_ids[agents] = targets
+    distances = np.linalg.norm(agent_positions[agents] - target_positions[targets], axis=1)
+    report = {
+        "method": solver,
+        "total_distance": round(float(distances.sum()), 2),
+        "max_distance": round(float(distances.max()), 2) if len(distances) else 0.0,
+        "unassigned_targets": T - len(targets),
+        "solve_ms": round(solve_time * 1000, 3),
+    }
+    return target_ids, report
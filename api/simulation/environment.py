@@ -1,6 +1,6 @@
 from .target import Target
 from .obstacle import Obstacle
-from .agent import Agent
+from .swarm import SwarmState
 import numpy as np
 
 def create_targets_from_dict(target_dict):
@@ -14,6 +14,10 @@ def create_targets_from_dict(target_dict):
         for target_id, target_data in target_dict.items()
     }
 
+def create_target_positions(coordinates):
+    # Create one (N, 2) array of target positions, indexed by target id, without per-target objects
+    return np.asarray(coordinates, dtype=float).reshape(-1, 2)
+
 def create_obstacles_from_dict(obstacles_dict):
     # Create a dict of Target objects by iterating over the dictionary
     return [
@@ -25,13 +29,15 @@ def create_obstacles_from_dict(obstacles_dict):
         for obstacle_id, obstacle_data in obstacles_dict.items()
     ]
 
+def create_swarm_from_dict(agents_dict, rng=None):
+    # Create a SwarmState holding every agent in contiguous arrays (rng draws their random start velocities)
+    return SwarmState(
+        list(agents_dict.keys()),
+        [np.array(data["position"], dtype=float)[:2] for data in agents_dict.values()],  # Convert positions to NumPy arrays of floats
+        [data["target_id"] for data in agents_dict.values()],
+        rng=rng
+    )
+
 def create_agents_from_dict(agents_dict):
-    # Create a list of Agent objects by iterating over the dictionary
-    return [
-        Agent(
-            agent_id,
-            np.array(data["position"], dtype=float),  # Convert position to a NumPy array of floats
-            data["target_id"]
-        )
-        for agent_id, data in agents_dict.items()
-    ]
\ No newline at end of file
+    # Create a list of Agent objects, each a view over a shared SwarmState
+    return create_swarm_from_dict(agents_dict).agents
\ No newline at end of file
@@ -0,0 +1,115 @@
+import math
+import numpy as np
+
+from ..config import RADIUS, MAP_INDEX_NODE_CAPACITY
+
+def str_order(boxes, node_capacity):
+    """
+    Sort-Tile-Recursive ordering of (K, 4) [x_min, y_min, x_max, y_max] boxes.
+
+    Boxes are sorted by centre x into vertical slabs of about sqrt(K / node_capacity) nodes,
+    then by centre y within each slab, so consecutive runs of node_capacity boxes are compact.
+    """
+    count = len(boxes)
+    centers = (boxes[:, :2] + boxes[:, 2:]) / 2
+    node_count = math.ceil(count / node_capacity)
+    slab_size = math.ceil(math.sqrt(node_count)) * node_capacity
+
+    by_x = np.argsort(centers[:, 0], kind="stable")
+    slab = np.arange(count) // slab_size
+    return by_x[np.lexsort((centers[by_x, 1], slab))]
+
+def boxes_intersect(a, b):
+    """Row-wise overlap test between two (K, 4) box arrays."""
+    return (a[:, 0] <= b[:, 2]) & (b[:, 0] <= a[:, 2]) & (a[:, 1] <= b[:, 3]) & (b[:, 1] <= a[:, 3])
+
+def expand_ranges(pair_idx, starts, counts):
+    """Expand (pair, start, count) child ranges into flat (pair, child) index arrays."""
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(pair_idx, counts), np.repeat(starts, counts) + offsets
+
+class MapIndex:
+    """
+    Static STR-packed R-tree over map object bounding boxes and positions.
+
+    Built once when a map is loaded; query() returns every (agent, object) detection for a tick
+    in one batched call instead of testing every agent against every map object.
+    """
+    def __init__(self, map_objects, node_capacity=MAP_INDEX_NODE_CAPACITY):
+        self.map_objects = list(map_objects)
+        self.node_capacity = node_capacity
+
+        count = len(self.map_objects)
+        self.centers = np.array([obj.position for obj in self.map_objects], dtype=float).reshape(count, 2)
+        corners = np.array([obj.boundingBox for obj in self.map_objects], dtype=float).reshape(count, 2, 2)
+        self.boxes = np.concatenate([corners.min(axis=1), corners.max(axis=1)], axis=1)  # [x_min, y_min, x_max, y_max]
+
+        # Index the union of each bounding box and its centre so both detection modes share one tree
+        bounds = np.concatenate([np.minimum(self.boxes[:, :2], self.centers), np.maximum(self.boxes[:, 2:], self.centers)], axis=1)
+
+        # Leaf level: the objects themselves, in STR order
+        order = str_order(bounds, node_capacity) if count else np.empty(0, dtype=int)
+        self.item_ids = order
+        self.levels = [(bounds[order], None, None)]  # (boxes, child_starts, child_counts) per level
+
+        # Pack each level into nodes of node_capacity consecutive entries until one node remains
+        boxes = bounds[order]
+        while len(boxes) > node_capacity:
+            starts = np.arange(0, len(boxes), node_capacity)
+            counts = np.diff(np.append(starts, len(boxes)))
+            parents = np.concatenate([np.minimum.reduceat(boxes[:, :2], starts), np.maximum.reduceat(boxes[:, 2:], starts)], axis=1)
+
+            order = str_order(parents, node_capacity)
+            boxes = parents[order]
+            self.levels.append((boxes, starts[order], counts[order]))
+
+    def __len__(self):
+        return len(self.map_objects)
+
+    def candidates(self, query_boxes):
+        """(query_idx, object_idx) pairs whose indexed bounds overlap each (Q, 4) query box."""
+        root_boxes = self.levels[-1][0]
+        query_idx = np.repeat(np.arange(len(query_boxes)), len(root_boxes))
+        entry_idx = np.tile(np.arange(len(root_boxes)), len(query_boxes))
+        hit = boxes_intersect(query_boxes[query_idx], root_boxes[entry_idx])
+        query_idx, entry_idx = query_idx[hit], entry_idx[hit]
+
+        # Descend one level at a time, keeping only children that overlap their query box
+        for level in range(len(self.levels) - 1, 0, -1):
+            _, starts, counts = self.levels[level]
+            query_idx, entry_idx = expand_ranges(query_idx, starts[entry_idx], counts[entry_idx])
+            hit = boxes_intersect(query_boxes[query_idx], self.levels[level - 1][0][entry_idx])
+            query_idx, entry_idx = query_idx[hit], entry_idx[hit]
+
+        return query_idx, self.item_ids[entry_idx]
+
+    def query(self, positions, radius=RADIUS, use_bounding_box=False):
+        """
+        Find every (agent, object) pair where the agent detects the object.
+
+        Parameters:
+        - positions: (N, 2) array of agent positions.
+        - radius: Detection radius.
+        - use_bounding_box: Also detect objects whose bounding box is within radius, not only their centre.
+
+        Returns:
+        - (agent_idx, object_idx) arrays sorted by agent, then by map order.
+        """
+        positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+        if len(positions) == 0 or len(self.map_objects) == 0:
+            return np.empty(0, dtype=int), np.empty(0, dtype=int)
+
+        query_boxes = np.concatenate([positions - radius, positions + radius], axis=1)
+        agent_idx, object_idx = self.candidates(query_boxes)
+
+        # Exact test on the broad-phase candidates
+        agent_positions = positions[agent_idx]
+        detected = np.linalg.norm(agent_positions - self.centers[object_idx], axis=1) < radius
+        if use_bounding_box:
+            boxes = self.boxes[object_idx]
+            closest = np.clip(agent_positions, boxes[:, :2], boxes[:, 2:])
+            detected |= np.linalg.norm(agent_positions - closest, axis=1) < radius
+
+        agent_idx, object_idx = agent_idx[detected], object_idx[detected]
+        order = np.lexsort((object_idx, agent_idx))
+        return agent_idx[order], object_idx[order]
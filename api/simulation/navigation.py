@@ -0,0 +1,234 @@
+import math
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+try:
+    from scipy.sparse import csr_matrix  # Optional, much faster exact shortest paths
+    from scipy.sparse.csgraph import dijkstra
+except ImportError:
+    dijkstra = None
+
+from .terrain import get_terrain
+from ..config import (ENV_WIDTH, ENV_HEIGHT, OBSTACLE_RADIUS, NAV_CELL_SIZE, NAV_OBJECT_COSTS, NAV_OBSTACLE_COST, NAV_SLOPE_COST, NAV_STEEP_SLOPE,
+                      NAV_FIELD_CACHE_SIZE, NAV_FIELD_DELAY_TICKS)
+
+# The 8 neighbour offsets (row, column) and the length of each step, in cells
+NEIGHBOURS = np.array([(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)])
+STEP_LENGTHS = np.linalg.norm(NEIGHBOURS, axis=1)
+
+field_builder = ThreadPoolExecutor(1, thread_name_prefix="flow-fields")  # Builds flow fields off the simulation tick
+
+def neighbour_slices(row_offset, column_offset, rows, columns):
+    """Slices of the cells that have a neighbour at (row_offset, column_offset), and of those neighbours."""
+    cells = (slice(max(-row_offset, 0), rows - max(row_offset, 0)), slice(max(-column_offset, 0), columns - max(column_offset, 0)))
+    neighbours = (slice(max(row_offset, 0), rows - max(-row_offset, 0)), slice(max(column_offset, 0), columns - max(-column_offset, 0)))
+    return cells, neighbours
+
+def shift(grid, row_offset, column_offset, fill):
+    """grid[..., r + row_offset, c + column_offset] at every (r, c), fill outside the grid."""
+    shifted = np.full_like(grid, fill)
+    cells, neighbours = neighbour_slices(row_offset, column_offset, *grid.shape[-2:])
+    shifted[(...,) + cells] = grid[(...,) + neighbours]
+    return shifted
+
+class NavigationGrid:
+    """
+    Cost grid over the environment and the flow fields that lead agents to their targets around costly areas.
+
+    Cell costs start at 1 and are raised inside map objects of the NAV_OBJECT_COSTS types (floods, water...),
+    around obstacles and on steep terrain. The flow field of a target holds, for every cell, the direction of the
+    next cell on the cheapest path to the target; all agents heading to the same target share it and look their
+    direction up in O(1). Fields are cached per target cell and dropped when the costs change.
+
+    Fields missing from the cache are built on the field_builder thread, so a step change never stalls the tick.
+    They take over steering field_delay ticks after the step started (waiting for the build only if it is not
+    done by then), so a run steers the same way however fast the fields are built.
+    """
+    def __init__(self, map_objects, obstacle_positions=(), terrain=None, cell_size: float = NAV_CELL_SIZE,
+                 width: float = ENV_WIDTH, height: float = ENV_HEIGHT, cache_size: int = NAV_FIELD_CACHE_SIZE,
+                 field_delay: int = NAV_FIELD_DELAY_TICKS):
+        self.cell_size = cell_size
+        self.rows = math.ceil(height / cell_size)
+        self.columns = math.ceil(width / cell_size)
+        self.terrain = terrain or get_terrain()
+        self.cache_size = cache_size
+        self.field_delay = field_delay
+        self.fields = OrderedDict()  # Target cell -> (rows, columns, 2) directions, least recently used first
+        self.pending = []  # (cells, future, edge costs) of fields being built
+        self.ready_tick = 0  # Tick at which the current step's pending fields take over
+        self.costs = None
+        self.obstructed = None  # Cells inside map objects, near obstacles or on steep terrain
+        self.edge_costs = None
+        self.target_cells = []  # Cell of each target of the current step that needs a field, None for the others
+        self.target_field = np.empty(0, dtype=int)  # Field of each target of the current step
+        self.target_directions = np.zeros((0, self.rows, self.columns, 2), dtype=np.float32)
+        self.update(map_objects, obstacle_positions)
+
+    def cell_of(self, positions):
+        """(row, column) cell indices for an (N, 2) array of positions, clamped to the grid."""
+        cells = np.floor(np.asarray(positions, dtype=float).reshape(-1, 2) / self.cell_size).astype(int)
+        return np.clip(cells[:, 1], 0, self.rows - 1), np.clip(cells[:, 0], 0, self.columns - 1)
+
+    def rasterize(self, map_objects, obstacle_positions):
+        """The (rows, columns) cost of crossing each cell, and whether a map object, obstacle or steep slope raised it."""
+        costs = np.ones((self.rows, self.columns))
+
+        # Map object bounding boxes, e.g. flooded areas and lakes
+        for map_object in map_objects:
+            cost = NAV_OBJECT_COSTS.get(map_object.object_type)
+            if cost is None:
+                continue
+            (x1, y1), (x2, y2) = map_object.boundingBox
+            (row1, row2), (column1, column2) = self.cell_of([[min(x1, x2), min(y1, y2)], [max(x1, x2), max(y1, y2)]])
+            area = costs[row1:row2 + 1, column1:column2 + 1]
+            np.maximum(area, cost, out=area)
+
+        # Cell centres for obstacles and terrain
+        centres = (np.stack(np.meshgrid(np.arange(self.columns), np.arange(self.rows)), axis=-1).reshape(-1, 2) + 0.5) * self.cell_size
+
+        obstacle_positions = np.asarray(obstacle_positions, dtype=float).reshape(-1, 2)
+        if len(obstacle_positions):
+            distances = np.linalg.norm(centres[:, None, :] - obstacle_positions[None, :, :], axis=2).min(axis=1)
+            blocked = (distances < OBSTACLE_RADIUS).reshape(self.rows, self.columns)
+            costs[blocked] = np.maximum(costs[blocked], NAV_OBSTACLE_COST)
+
+        obstructed = costs > 1
+        if NAV_SLOPE_COST or NAV_STEEP_SLOPE is not None:
+            slope = np.linalg.norm(self.terrain.gradients_at(centres), axis=1).reshape(self.rows, self.columns)
+            costs += NAV_SLOPE_COST * slope
+            if NAV_STEEP_SLOPE is not None:
+                obstructed |= slope > NAV_STEEP_SLOPE
+        return costs, obstructed
+
+    def update(self, map_objects, obstacle_positions=()):
+        """Rebuild the cost grid, dropping the cached flow fields if it changed. Returns whether it changed."""
+        costs, obstructed = self.rasterize(map_objects, obstacle_positions)
+        if self.costs is not None and np.array_equal(costs, self.costs):
+            return False
+
+        self.costs = costs
+        self.obstructed = obstructed
+        # Cost of stepping from each cell to each neighbour: the step length times the mean cost of both cells
+        self.edge_costs = np.stack([length * (costs + shift(costs, row, column, np.inf)) / 2
+                                    for (row, column), length in zip(NEIGHBOURS, STEP_LENGTHS)])
+        self.fields.clear()  # Fields still being built for the old costs are discarded when they arrive
+        self.target_cells = []
+        self.target_field = np.empty(0, dtype=int)
+        self.target_directions = np.zeros((0, self.rows, self.columns, 2), dtype=np.float32)
+        return True
+
+    def distances(self, target_cells, edge_costs):
+        """(T, rows, columns) cost of the cheapest path from every cell to each target cell, for the given edge costs."""
+        if dijkstra is not None:
+            cells = np.arange(self.rows * self.columns).reshape(self.rows, self.columns)
+            sources, destinations, weights = [], [], []
+            for k, (row, column) in enumerate(NEIGHBOURS):
+                valid = np.isfinite(edge_costs[k])
+                sources.append(cells[valid])
+                destinations.append(shift(cells, row, column, -1)[valid])
+                weights.append(edge_costs[k][valid])
+            graph = csr_matrix((np.concatenate(weights), (np.concatenate(sources), np.concatenate(destinations))), shape=(cells.size, cells.size))
+            # Edge costs are symmetric, so distances from the targets equal distances to them
+            targets = [row * self.columns + column for row, column in target_cells]
+            return dijkstra(graph, indices=targets).reshape(len(targets), self.rows, self.columns)
+
+        # Without scipy: relax every cell against its neighbours, for all targets at once, until nothing improves
+        distances = np.full((len(target_cells), self.rows, self.columns), np.inf)
+        for index, (row, column) in enumerate(target_cells):
+            distances[index, row, column] = 0
+        # Improvements are written in place, so they already spread further within the same sweep
+        regions = []
+        for k, (row, column) in enumerate(NEIGHBOURS):
+            cells, neighbours = neighbour_slices(row, column, self.rows, self.columns)
+            regions.append((cells, neighbours, edge_costs[k][cells]))
+        while True:
+            previous = distances.copy()
+            for cells, neighbours, edge_costs in regions:
+                np.minimum(distances[(...,) + cells], distances[(...,) + neighbours] + edge_costs, out=distances[(...,) + cells])
+            if np.array_equal(previous, distances):
+                return distances
+
+    def directions(self, distances, edge_costs):
+        """(rows, columns, 2) unit direction (x, y) from each cell to the next cell on its cheapest path; zero at the target."""
+        options = np.stack([shift(distances, row, column, np.inf) + edge_costs[k] for k, (row, column) in enumerate(NEIGHBOURS)])
+        best = options.argmin(axis=0)
+        steps = NEIGHBOURS[best][..., ::-1] / STEP_LENGTHS[best][..., None]  # (row, column) offsets to unit (x, y)
+        steps[distances == 0] = 0
+        return steps.astype(np.float32)
+
+    def build_fields(self, target_cells, edge_costs):
+        """Flow field of each target cell, computed together in one pass (runs on the field_builder thread)."""
+        return [self.directions(distances, edge_costs) for distances in self.distances(target_cells, edge_costs)]
+
+    def crosses_obstruction(self, starts, ends):
+        """Whether each straight segment from an (T, 2) start (NaN for none) to its end passes an obstructed cell."""
+        starts = np.asarray(starts, dtype=float).reshape(-1, 2)
+        ends = np.asarray(ends, dtype=float).reshape(-1, 2)
+        crosses = np.zeros(len(starts), dtype=bool)
+        valid = np.flatnonzero(~np.isnan(starts).any(axis=1))
+        if len(valid) == 0 or not self.obstructed.any():
+            return crosses
+
+        # Sample every segment at half-cell intervals
+        offsets = ends[valid] - starts[valid]
+        samples = int(np.ceil(np.linalg.norm(offsets, axis=1).max() / (self.cell_size / 2))) + 1
+        points = starts[valid][:, None, :] + np.linspace(0, 1, samples)[None, :, None] * offsets[:, None, :]
+        rows, columns = self.cell_of(points.reshape(-1, 2))
+        crosses[valid] = self.obstructed[rows, columns].reshape(len(valid), samples).any(axis=1)
+        return crosses
+
+    def set_targets(self, target_positions, start_positions=None, tick: int = 0):
+        """
+        Prepare the flow fields of a plan step's (T, 2) target positions, starting at tick; targets in the same cell share one.
+        Given the (T, 2) position of the agent heading to each target (NaN for none), only targets whose
+        straight path crosses an obstructed cell get a field; the others are steered to directly.
+        Cached fields apply at once, missing ones are built in the background and apply from tick + field_delay.
+        """
+        self.install()  # Fields of earlier steps, normally long finished
+        rows, columns = self.cell_of(target_positions)
+        target_cells = list(zip(rows.tolist(), columns.tolist()))
+        detour = self.crosses_obstruction(start_positions, target_positions) if start_positions is not None else np.ones(len(target_cells), dtype=bool)
+        self.target_cells = [cell if needs_field else None for cell, needs_field in zip(target_cells, detour.tolist())]
+
+        missing = list(dict.fromkeys(cell for cell in self.target_cells if cell is not None and cell not in self.fields))
+        if missing:
+            self.pending.append((missing, field_builder.submit(self.build_fields, missing, self.edge_costs), self.edge_costs))
+        self.ready_tick = tick + self.field_delay
+        self.refresh()
+
+    def install(self):
+        """Wait for the fields being built and add them to the cache."""
+        if not self.pending:
+            return
+        for cells, future, edge_costs in self.pending:
+            fields = future.result()
+            if edge_costs is self.edge_costs:  # Costs unchanged since the build started
+                self.fields.update(zip(cells, fields))
+        self.pending = []
+        self.refresh()
+
+    def refresh(self):
+        """Point the current targets at their cached fields (targets whose field is still being built steer straight)."""
+        field_of_cell = {}
+        self.target_field = np.full(len(self.target_cells), -1)  # -1: no field, steer straight
+        for index, cell in enumerate(self.target_cells):
+            if cell is not None and cell in self.fields:
+                self.target_field[index] = field_of_cell.setdefault(cell, len(field_of_cell))
+        for cell in field_of_cell:
+            self.fields.move_to_end(cell)
+        self.target_directions = np.stack([self.fields[cell] for cell in field_of_cell]) if field_of_cell else np.zeros((0, self.rows, self.columns, 2), dtype=np.float32)
+        while len(self.fields) > max(self.cache_size, len(field_of_cell)):
+            self.fields.popitem(last=False)
+
+    def steering_directions(self, positions, target_ids, tick: int = None):
+        """(N, 2) flow direction of every agent towards its target at tick; zero without a target or in the target's cell."""
+        if self.pending and (tick is None or tick >= self.ready_tick):
+            self.install()
+        directions = np.zeros((len(target_ids), 2))
+        has_target = (target_ids >= 0) & (target_ids < len(self.target_field))
+        has_target[has_target] = self.target_field[target_ids[has_target]] >= 0
+        rows, columns = self.cell_of(positions[has_target])
+        directions[has_target] = self.target_directions[self.target_field[target_ids[has_target]], rows, columns]
+        return directions
@@ -0,0 +1,239 @@
+"""
+Recordings of simulation runs, for replaying a mission without the LLM or the physics.
+
+A recording is one append-only file of records, each a RECORD_HEADER (kind, first tick, tick count,
+payload length; little-endian) followed by a zlib-compressed payload:
+
+- b"HEAD": JSON with the llm_plan, the random seed and the map of the run (first record).
+- b"STEP": JSON {"step": n, "data": {...}} for a plan step that arrived while the run was going (streamed plans).
+- b"TICK": a chunk of consecutive ticks: a length-prefixed JSON part with the agent ids, the array layout
+  and the non-agent state, then the float32/int32 agent arrays of every tick of the chunk.
+  The state holds every field at the chunk's first tick and only the fields that changed after it,
+  so every chunk is a keyframe and decodes on its own.
+- b"INDX": JSON list of [kind, first tick, tick count, offset] of every record, followed by a RECORD_TRAILER
+  (index offset, b"AEND"). Written when the recording is closed; without it (a crashed run, or one still
+  being recorded) the index is rebuilt by walking the record headers.
+
+Reading memory-maps the file, so seeking to any tick only touches the one chunk holding it.
+Agent arrays are stored as float32, the precision of the binary websocket frames.
+"""
+import json
+import mmap
+import struct
+import threading
+import zlib
+from bisect import bisect_right
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+
+from .snapshot import SimulationSnapshot
+from ..config import RECORDING_CHUNK_TICKS, RECORDING_COMPRESSION_LEVEL
+
+RECORDING_MAGIC = b"ARMREC01"
+RECORDING_VERSION = 1
+RECORD_HEADER = struct.Struct("<4sIII")
+RECORD_TRAILER = struct.Struct("<Q4s")
+TRAILER_MAGIC = b"AEND"
+
+# Agent arrays of a snapshot and the dtype they are stored in
+AGENT_ARRAYS = (("target_id", "int32"), ("position", "float32"), ("z_position", "float32"), ("velocity", "float32"), ("acceleration", "float32"))
+# Non-agent snapshot state, stored whenever it changes
+STATE_FIELDS = ("targets_data", "obstacles_data", "agent_detections_data", "plan_progress", "new_detections", "detected_names")
+
+def json_default(value):
+    """JSON encoding of the NumPy values found in plans and plan progress."""
+    return value.tolist() if hasattr(value, "tolist") else str(value)
+
+def integer_keys(data):
+    """Undo JSON's conversion of integer dict keys (target, agent and step ids) to strings."""
+    return {int(key) if key.lstrip("-").isdigit() else key: value for key, value in data.items()}
+
+class Recorder:
+    """
+    Appends the snapshots of one run to a recording file, one compressed chunk per chunk_ticks ticks.
+    record() is called with every published snapshot; close() writes the last chunk and the index.
+    """
+    def __init__(self, path, llm_plan: dict, map_objects=(), seed: int = None,
+                 chunk_ticks: int = RECORDING_CHUNK_TICKS, compression_level: int = RECORDING_COMPRESSION_LEVEL):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.chunk_ticks = chunk_ticks
+        self.compression_level = compression_level
+        self.records = []  # [kind, first tick, tick count, offset] of every record written
+        self.pending = []  # Snapshots of the chunk being filled
+        self.last_tick = 0
+        self.lock = threading.Lock()  # Snapshots may be published on a worker thread while the session stops the run
+
+        self.file = open(self.path, "wb")
+        self.file.write(RECORDING_MAGIC)
+        header = {
+            "version": RECORDING_VERSION,
+            "seed": seed,
+            "llm_plan": llm_plan,
+            "map": [map_object.convert_to_dict() for map_object in map_objects],
+        }
+        self.write_record(b"HEAD", 0, 0, json.dumps(header, default=json_default).encode())
+
+    def write_record(self, kind: bytes, first_tick: int, tick_count: int, payload: bytes):
+        payload = zlib.compress(payload, self.compression_level)
+        self.records.append([kind.decode(), first_tick, tick_count, self.file.tell()])
+        self.file.write(RECORD_HEADER.pack(kind, first_tick, tick_count, len(payload)))
+        self.file.write(payload)
+
+    def record(self, snapshot):
+        """Add one tick's snapshot; a chunk holds consecutive ticks of the same agents."""
+        with self.lock:
+            if self.file is None or snapshot is None or snapshot.tick <= self.last_tick:
+                return
+            if self.pending and (snapshot.tick != self.last_tick + 1 or snapshot.agent_ids != self.pending[0].agent_ids):
+                self.flush()
+            self.pending.append(snapshot)  # Snapshots are immutable, so holding on to them is safe
+            self.last_tick = snapshot.tick
+            if len(self.pending) >= self.chunk_ticks:
+                self.flush()
+
+    def add_plan_step(self, step_number, step_data):
+        """Record a plan step that arrived after the run started."""
+        with self.lock:
+            if self.file is not None:
+                self.write_record(b"STEP", self.last_tick, 0, json.dumps({"step": step_number, "data": step_data}, default=json_default).encode())
+
+    def flush(self):
+        """Write the pending ticks as one chunk."""
+        if not self.pending:
+            return
+        snapshots, self.pending = self.pending, []
+
+        # Full state at the first tick, then only the fields that changed
+        changes = []
+        previous = {}
+        for offset, snapshot in enumerate(snapshots):
+            changed = {field: getattr(snapshot, field) for field in STATE_FIELDS if offset == 0 or getattr(snapshot, field) != previous[field]}
+            if changed:
+                changes.append([offset, changed])
+            previous = {field: getattr(snapshot, field) for field in STATE_FIELDS}
+
+        arrays = [np.stack([getattr(snapshot, name) for snapshot in snapshots]).astype(dtype) for name, dtype in AGENT_ARRAYS]
+        meta = json.dumps({
+            "agent_ids": snapshots[0].agent_ids,
+            "arrays": [[name, dtype, array.shape] for (name, dtype), array in zip(AGENT_ARRAYS, arrays)],
+            "state": changes,
+        }, default=json_default).encode()
+        payload = b"".join([struct.pack("<I", len(meta)), meta] + [array.tobytes() for array in arrays])
+        self.write_record(b"TICK", snapshots[0].tick, len(snapshots), payload)
+
+    def close(self):
+        """Write the last chunk and the index, and close the file."""
+        with self.lock:
+            if self.file is None:
+                return
+            self.flush()
+            index_offset = self.file.tell()
+            index = json.dumps(self.records).encode()
+            self.file.write(RECORD_HEADER.pack(b"INDX", 0, 0, len(index)))
+            self.file.write(index)
+            self.file.write(RECORD_TRAILER.pack(index_offset, TRAILER_MAGIC))
+            self.file.close()
+            self.file = None
+
+class ReplayLog:
+    """Random access to the ticks of a recording, through a memory map of the file."""
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, "rb") as file:
+            self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.buffer[:len(RECORDING_MAGIC)] != RECORDING_MAGIC:
+            self.buffer.close()
+            raise ValueError(f"{self.path} is not a simulation recording.")
+
+        self.records = self.read_index() or self.scan()
+        self.header = json.loads(self.payload(self.records[0][3]))
+        self.seed = self.header["seed"]
+        self.llm_plan = integer_keys(self.header["llm_plan"])
+        for kind, first_tick, tick_count, offset in self.records:
+            if kind == "STEP":
+                step = json.loads(self.payload(offset))
+                self.llm_plan[step["step"]] = step["data"]
+
+        self.chunks = [(first_tick, tick_count, offset) for kind, first_tick, tick_count, offset in self.records if kind == "TICK"]
+        self.first_ticks = [first_tick for first_tick, _, _ in self.chunks]
+        self.cached = None  # (offset, decoded chunk) of the last chunk read; playback reads each chunk once
+
+    def read_index(self):
+        """The records listed in the index of a closed recording, or None."""
+        if len(self.buffer) < len(RECORDING_MAGIC) + RECORD_HEADER.size + RECORD_TRAILER.size:
+            return None
+        index_offset, magic = RECORD_TRAILER.unpack_from(self.buffer, len(self.buffer) - RECORD_TRAILER.size)
+        if magic != TRAILER_MAGIC:
+            return None
+        kind, _, _, length = RECORD_HEADER.unpack_from(self.buffer, index_offset)
+        start = index_offset + RECORD_HEADER.size
+        return json.loads(bytes(self.buffer[start:start + length])) if kind == b"INDX" else None
+
+    def scan(self):
+        """Rebuild the index by walking the record headers, stopping at a truncated record."""
+        records = []
+        offset = len(RECORDING_MAGIC)
+        while offset + RECORD_HEADER.size <= len(self.buffer):
+            kind, first_tick, tick_count, length = RECORD_HEADER.unpack_from(self.buffer, offset)
+            if kind == b"INDX" or offset + RECORD_HEADER.size + length > len(self.buffer):
+                break
+            records.append([kind.decode(), first_tick, tick_count, offset])
+            offset += RECORD_HEADER.size + length
+        return records
+
+    def payload(self, offset):
+        """Decompressed payload of the record at offset."""
+        _, _, _, length = RECORD_HEADER.unpack_from(self.buffer, offset)
+        start = offset + RECORD_HEADER.size
+        return zlib.decompress(self.buffer[start:start + length])
+
+    @property
+    def first_tick(self):
+        return self.chunks[0][0] if self.chunks else 0
+
+    @property
+    def last_tick(self):
+        return self.chunks[-1][0] + self.chunks[-1][1] - 1 if self.chunks else 0
+
+    def chunk(self, offset):
+        """Agent ids, (ticks, ...) agent arrays and state changes of the chunk at offset."""
+        if self.cached is not None and self.cached[0] == offset:
+            return self.cached[1]
+        payload = self.payload(offset)
+        meta_length, = struct.unpack_from("<I", payload)
+        meta = json.loads(payload[4:4 + meta_length])
+        arrays = {}
+        position = 4 + meta_length
+        for name, dtype, shape in meta["arrays"]:
+            array = np.frombuffer(payload, dtype=dtype, count=int(np.prod(shape)), offset=position).reshape(shape)
+            arrays[name] = array
+            position += array.nbytes
+        chunk = SimpleNamespace(agent_ids=tuple(meta["agent_ids"]), arrays=arrays, state=meta["state"])
+        self.cached = (offset, chunk)
+        return chunk
+
+    def snapshot(self, tick: int, stats=None):
+        """The snapshot of tick (clamped to the recorded ticks; the last recorded one before a gap)."""
+        if not self.chunks:
+            return None
+        index = max(bisect_right(self.first_ticks, tick) - 1, 0)
+        first_tick, tick_count, offset = self.chunks[index]
+        row = min(max(tick - first_tick, 0), tick_count - 1)
+        chunk = self.chunk(offset)
+
+        state = {}
+        for change_offset, changed in chunk.state:
+            if change_offset > row:
+                break
+            state.update(changed)
+
+        swarm = SimpleNamespace(ids=chunk.agent_ids, **{name: array[row] for name, array in chunk.arrays.items()})
+        return SimulationSnapshot(first_tick + row, swarm, integer_keys(state["targets_data"]), integer_keys(state["obstacles_data"]),
+                                  integer_keys(state["agent_detections_data"]), integer_keys(state["plan_progress"]),
+                                  state["new_detections"], state["detected_names"], stats)
+
+    def close(self):
+        self.buffer.close()
@@ -0,0 +1,108 @@
+import json
+import numpy as np
+
+def frozen_copy(array):
+    """Read-only copy of an array, so a published snapshot can never change under a reader."""
+    array = np.array(array, copy=True)
+    array.flags.writeable = False
+    return array
+
+class SimulationSnapshot:
+    """Immutable copy of the simulation state after one tick, safe to hand to any thread or process."""
+    def __init__(self, tick, swarm, targets_data, obstacles_data, agent_detections_data, plan_progress, new_detections, detected_names, stats=None):
+        self.tick = tick
+        self.agent_ids = tuple(swarm.ids)
+        self.target_id = frozen_copy(swarm.target_id)
+        self.position = frozen_copy(swarm.position)
+        self.z_position = frozen_copy(swarm.z_position)
+        self.velocity = frozen_copy(swarm.velocity)
+        self.acceleration = frozen_copy(swarm.acceleration)
+
+        self.targets_data = dict(targets_data)
+        self.obstacles_data = dict(obstacles_data)
+        self.agent_detections_data = dict(agent_detections_data)
+        self.plan_progress = {step: dict(progress) for step, progress in plan_progress.items()}
+        self.new_detections = list(new_detections)
+        self.detected_names = tuple(detected_names)  # Every map object detected so far in the run
+        self.stats = dict(stats or {})
+        self._agents_data = None
+        self._json = None
+
+    @property
+    def agents_data(self):
+        """Agent status data keyed by agent id, built once on first use."""
+        if self._agents_data is None:
+            target_ids = self.target_id.tolist()
+            positions = self.position.tolist()
+            z_positions = self.z_position.tolist()
+            velocities = self.velocity.tolist()
+            accelerations = self.acceleration.tolist()
+            self._agents_data = {
+                agent_id: {
+                    "target_id": target_ids[index],          # Swarm identifier
+                    "position": positions[index],
+                    "z_positon": z_positions[index],         # For 3D simulations
+                    "velocity": velocities[index],           # 2D vector for velocity
+                    "acceleration": accelerations[index],
+                }
+                for index, agent_id in enumerate(self.agent_ids)
+            }
+        return self._agents_data
+
+    def to_payload(self):
+        """The websocket message for this tick."""
+        return {
+            "targets": self.targets_data,
+            "obstacles": self.obstacles_data,
+            "agents": self.agents_data,
+            "agent_detections": self.agent_detections_data,
+            "plan_progress": self.plan_progress,
+            "new_detections": self.new_detections
+        }
+
+    def to_json(self):
+        """The websocket message for this tick as JSON text, encoded once and shared by every subscriber."""
+        if self._json is None:
+            self._json = encode_payload(self.to_payload())
+        return self._json
+
+    def __getstate__(self):
+        # Rebuilt lazily on the receiving side instead of being pickled
+        state = self.__dict__.copy()
+        state["_agents_data"] = None
+        state["_json"] = None
+        return state
+
+def encode_payload(payload):
+    """Encode a websocket payload the same way WebSocket.send_json does."""
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+
+EMPTY_PAYLOAD = {
+    "targets": {},
+    "obstacles": {},
+    "agents": {},
+    "agent_detections": {},
+    "plan_progress": {},
+    "new_detections": []
+}
+EMPTY_PAYLOAD_JSON = encode_payload(EMPTY_PAYLOAD)
+
+class SnapshotBuffer:
+    """
+    Lock-free single-producer handoff of the latest snapshot.
+
+    The simulation publishes by rebinding one reference (atomic under the GIL) and readers
+    take whatever snapshot is current; snapshots are never mutated after publishing.
+    on_publish, if given, is called with every published snapshot on the publishing thread.
+    """
+    def __init__(self, on_publish=None):
+        self._latest = None
+        self.on_publish = on_publish
+
+    def publish(self, snapshot):
+        self._latest = snapshot
+        if self.on_publish is not None:
+            self.on_publish(snapshot)
+
+    def latest(self):
+        return self._latest
@@ -0,0 +1,135 @@
+import math
+import numpy as np
+
+from ..config import RADIUS
+
+CELL_KEY_OFFSET = 2**20  # Shift cell coordinates so negative cells still map to positive keys
+
+def cell_keys(cells):
+    """Pack (N, 2) integer cell coordinates into one int64 key per cell."""
+    cells = cells.astype(np.int64) + CELL_KEY_OFFSET
+    return cells[:, 0] * (2 * CELL_KEY_OFFSET) + cells[:, 1]
+
+class SpatialGrid:
+    """
+    Uniform grid (cell list) spatial index for radius queries.
+
+    Points are bucketed into square cells of side cell_size and stored sorted by cell,
+    so a query only looks at the points in the cells around each query position.
+    """
+    def __init__(self, cell_size=RADIUS):
+        self.cell_size = cell_size
+        self.positions = np.empty((0, 2))
+        self.cells = np.empty((0, 2), dtype=np.int64)  # Cell coordinates of each point
+        self.keys = np.empty(0, dtype=np.int64)         # Cell key of each point
+        self.order = np.empty(0, dtype=int)             # Point indices sorted by cell key
+        self.cell_ids = np.empty(0, dtype=np.int64)     # Unique occupied cell keys (sorted)
+        self.cell_starts = np.empty(0, dtype=int)       # Start of each occupied cell in order
+        self.cell_counts = np.empty(0, dtype=int)       # Number of points in each occupied cell
+
+    def __len__(self):
+        return len(self.positions)
+
+    def cell_of(self, positions):
+        """Cell coordinates for an (N, 2) array of positions."""
+        return np.floor(positions / self.cell_size).astype(np.int64)
+
+    def build(self, positions):
+        """Bucket every position into its cell from scratch."""
+        self.positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+        self.cells = self.cell_of(self.positions)
+        self.keys = cell_keys(self.cells)
+        self.order = np.argsort(self.keys, kind="stable")
+        self._index_cells()
+        return self
+
+    def update(self, positions):
+        """
+        Refresh the index for moved positions.
+
+        Only points that crossed into another cell change the bucketing; if none did the cell
+        lists are reused as-is, otherwise the previous order is re-sorted, which is cheap because
+        it is already almost sorted.
+        """
+        positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+        if len(positions) != len(self.positions):
+            return self.build(positions)
+
+        self.positions = positions
+        cells = self.cell_of(positions)
+        moved = np.any(cells != self.cells, axis=1)
+        if not moved.any():
+            return self
+
+        self.cells = cells
+        self.keys[moved] = cell_keys(cells[moved])
+        self.order = self.order[np.argsort(self.keys[self.order], kind="stable")]
+        self._index_cells()
+        return self
+
+    def _index_cells(self):
+        """Compute the start and size of every occupied cell in the sorted order."""
+        sorted_keys = self.keys[self.order]
+        self.cell_ids, self.cell_starts, self.cell_counts = np.unique(sorted_keys, return_index=True, return_counts=True)
+
+    def candidates(self, points, radius):
+        """
+        Candidate (point, item) pairs whose cells are within radius of each query point.
+
+        Parameters:
+        - points: (P, 2) array of query positions.
+        - radius: Query radius.
+
+        Returns:
+        - (point_idx, item_idx) arrays, before any exact distance test.
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        if len(points) == 0 or len(self.cell_ids) == 0:
+            return np.empty(0, dtype=int), np.empty(0, dtype=int)
+
+        reach = max(1, math.ceil(radius / self.cell_size))
+        point_cells = self.cell_of(points)
+        point_ids = np.arange(len(points))
+
+        point_idx, item_idx = [], []
+        for dx in range(-reach, reach + 1):
+            for dy in range(-reach, reach + 1):
+                keys = cell_keys(point_cells + (dx, dy))
+                slots = np.searchsorted(self.cell_ids, keys)
+                slots = np.minimum(slots, len(self.cell_ids) - 1)
+                found = self.cell_ids[slots] == keys
+                if not found.any():
+                    continue
+
+                # Expand each (point, occupied cell) match into one pair per point in the cell
+                counts = self.cell_counts[slots[found]]
+                starts = self.cell_starts[slots[found]]
+                offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(starts, counts)
+                point_idx.append(np.repeat(point_ids[found], counts))
+                item_idx.append(self.order[offsets])
+
+        if not point_idx:
+            return np.empty(0, dtype=int), np.empty(0, dtype=int)
+        return np.concatenate(point_idx), np.concatenate(item_idx)
+
+    def query_radius(self, points, radius):
+        """
+        Find every (point, item) pair closer than radius.
+
+        Parameters:
+        - points: (P, 2) array of query positions.
+        - radius: Query radius.
+
+        Returns:
+        - (point_idx, item_idx, diff, distance) where diff = points[point_idx] - positions[item_idx].
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        point_idx, item_idx = self.candidates(points, radius)
+        diff = points[point_idx] - self.positions[item_idx]
+        distance = np.linalg.norm(diff, axis=1)
+        within = distance < radius
+        return point_idx[within], item_idx[within], diff[within], distance[within]
+
+    def query_pairs(self, radius):
+        """Every ordered pair of indexed points closer than radius, including each point with itself."""
+        return self.query_radius(self.positions, radius)
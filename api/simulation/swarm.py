@@ -0,0 +1,165 @@
+import numpy as np
+
+from .agent import Agent
+from .spatial import SpatialGrid
+from .terrain import get_terrain
+from ..config import ENV_WIDTH, ENV_HEIGHT, MAX_SPEED, MAX_FORCE, RADIUS
+
+def limit_magnitude(vectors, max_magnitude):
+    """Clamp the length of each row vector to max_magnitude (rows are left untouched if shorter)."""
+    norms = np.linalg.norm(vectors, axis=1)
+    too_long = norms > max_magnitude
+    vectors[too_long] *= (max_magnitude / norms[too_long])[:, None]
+    return vectors
+
+class SwarmState:
+    """Structure-of-arrays state for a whole swarm, stepped with batched NumPy operations."""
+    def __init__(self, ids, positions, target_ids, velocities=None, z_positions=None, terrain=None, rng=None):
+        count = len(ids)
+        self.ids = list(ids)  # Agent identifiers, in array order
+        self.position = np.array(positions, dtype=float).reshape(count, 2)
+        if velocities is None:
+            velocities = (rng or np.random).uniform(-2, 2, (count, 2))  # rng: the run's np.random.Generator
+        self.velocity = np.array(velocities, dtype=float).reshape(count, 2)
+        self.acceleration = np.zeros((count, 2), dtype=float)
+        self.target_id = np.array(target_ids, dtype=int).reshape(count)  # Swarm identifiers
+        if z_positions is None:
+            z_positions = np.zeros(count)
+        self.z_position = np.array(z_positions, dtype=float).reshape(count)
+
+        # RADIUS-sized cell lists for neighbor queries, refreshed as agents move
+        self.grid = SpatialGrid(RADIUS)
+        self.obstacle_grid = SpatialGrid(RADIUS)
+        self.terrain = terrain or get_terrain()
+
+        # Thin per-agent views over the arrays above
+        self.agents = [Agent(agent_id, None, None, swarm=self, index=index) for index, agent_id in enumerate(self.ids)]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def edges(self):
+        """Keep the agents inside the environment boundaries, stopping movement along the clamped axis."""
+        for axis, limit in ((0, ENV_WIDTH), (1, ENV_HEIGHT)):
+            outside = (self.position[:, axis] > limit) | (self.position[:, axis] < 0)
+            self.position[:, axis] = np.clip(self.position[:, axis], 0, limit)
+            self.velocity[outside, axis] = 0
+
+    def apply_force(self, force):
+        """Apply force (acceleration) to every agent."""
+        self.acceleration += force
+
+    def update(self):
+        """Update agent positions based on velocity and acceleration."""
+        self.velocity += self.acceleration
+        limit_magnitude(self.velocity, MAX_SPEED)
+
+        self.position += self.velocity
+        self.acceleration[:] = 0  # Reset acceleration after each update
+
+    def _steer(self, desired, active):
+        """Turn per-agent desired directions into steering forces, as Agent.align/cohesion/separation do."""
+        steering = np.zeros_like(desired)
+        norms = np.linalg.norm(desired, axis=1)
+        active = active & (norms > 0)  # Zero desired vectors produce no steering
+        steering[active] = desired[active] / norms[active, None] * MAX_SPEED - self.velocity[active]
+        return limit_magnitude(steering, MAX_FORCE)
+
+    def _mean_over_pairs(self, rows, values):
+        """Average values over each agent's pairs, returning (means, has_pairs)."""
+        count = len(self)
+        totals = np.bincount(rows, minlength=count)
+        sums = np.stack([np.bincount(rows, weights=values[:, axis], minlength=count) for axis in range(2)], axis=1).astype(float)  # Integer zeros without pairs
+        has_pairs = totals > 0
+        sums[has_pairs] /= totals[has_pairs, None]
+        return sums, has_pairs
+
+    def flocking_forces(self):
+        """Calculate the alignment, cohesion and separation forces for every agent."""
+        i, j, diff, distance = self.grid.update(self.position).query_pairs(RADIUS)
+        same_swarm = self.target_id[i] == self.target_id[j]
+        i, j, diff, distance = i[same_swarm], j[same_swarm], diff[same_swarm], distance[same_swarm]
+
+        # Alignment: match the mean velocity of nearby swarm members (including self)
+        mean_velocity, has_neighbors = self._mean_over_pairs(i, self.velocity[j])
+        alignment = self._steer(mean_velocity, has_neighbors)
+
+        # Cohesion: move towards the centre of nearby swarm members (including self)
+        mean_position, has_neighbors = self._mean_over_pairs(i, self.position[j])
+        cohesion = self._steer(mean_position - self.position, has_neighbors)
+
+        # Separation: move away from nearby swarm members, weighted by distance
+        apart = distance > 0
+        away, has_neighbors = self._mean_over_pairs(i[apart], diff[apart] / distance[apart, None])
+        separation = self._steer(away, has_neighbors)
+
+        return alignment, cohesion, separation
+
+    def steer_towards_targets(self, target_positions, directions=None):
+        """
+        Calculate the steering force towards each agent's target, slowing down near the target.
+        Agents given a non-zero direction (their navigation flow field) follow it at full speed instead.
+        """
+        steering = np.zeros_like(self.position)
+        if len(target_positions) == 0:
+            return steering
+
+        has_target = (self.target_id >= 0) & (self.target_id < len(target_positions))
+        desired = target_positions[self.target_id[has_target]] - self.position[has_target]
+        distance = np.linalg.norm(desired, axis=1)
+
+        # Full speed when far away, slowing down proportionally within RADIUS
+        far = distance >= RADIUS
+        desired[far] = desired[far] / distance[far, None] * MAX_SPEED
+        desired[~far] = desired[~far] * (MAX_SPEED / RADIUS)
+        if directions is not None:
+            directions = directions[has_target]
+            follow = directions.any(axis=1)
+            desired[follow] = directions[follow] * MAX_SPEED
+
+        steering[has_target] = desired - self.velocity[has_target]
+        return limit_magnitude(steering, MAX_FORCE)
+
+    def steer_away_from_obstacles(self, obstacle_positions):
+        """Calculate the steering force to avoid obstacles."""
+        if len(obstacle_positions) == 0:
+            return np.zeros_like(self.position)
+
+        i, _, diff, distance = self.obstacle_grid.update(obstacle_positions).query_radius(self.position, RADIUS)
+        apart = distance > 0
+        away, has_obstacles = self._mean_over_pairs(i[apart], diff[apart] / distance[apart, None])
+        return self._steer(away, has_obstacles)
+
+    def terrain_forces(self):
+        """Calculate the terrain slope influence for every agent."""
+        slope_factor = -0.1  # Negative slope for uphill movement
+        self.terrain.prefetch(self.position, self.velocity)
+        return self.terrain.gradients_at(self.position) * slope_factor
+
+    def flock(self, target_positions, obstacle_positions, alignment_weight=1.0, cohesion_weight=1.0, separation_weight=1.25, target_weight=1.25, obstacle_weight=1.25, terrain_weight=0.1, directions=None):
+        """
+        Calculate all forces for the whole swarm and apply them (batched equivalent of Agent.flock).
+
+        Parameters:
+        - target_positions: (T, 2) array of target positions, indexed by each agent's target_id.
+        - obstacle_positions: (M, 2) array of obstacle positions.
+        - *_weight: Weights balancing each behaviour. Forces with a zero weight are skipped.
+        - directions: Optional (N, 2) navigation directions to follow towards the targets (see NavigationGrid).
+        """
+        if len(self) == 0:
+            return
+
+        target_positions = np.asarray(target_positions, dtype=float).reshape(-1, 2)
+        obstacle_positions = np.asarray(obstacle_positions, dtype=float).reshape(-1, 2)
+
+        if alignment_weight or cohesion_weight or separation_weight:
+            alignment, cohesion, separation = self.flocking_forces()
+            self.apply_force(alignment * alignment_weight)
+            self.apply_force(cohesion * cohesion_weight)
+            self.apply_force(separation * separation_weight)
+        if target_weight:
+            self.apply_force(self.steer_towards_targets(target_positions, directions) * target_weight)
+        if obstacle_weight:
+            self.apply_force(self.steer_away_from_obstacles(obstacle_positions) * obstacle_weight)
+        if terrain_weight:
+            self.apply_force(self.terrain_forces() * terrain_weight)
@@ -0,0 +1,284 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from ..config import (ENV_WIDTH, ENV_HEIGHT, TERRAIN_HEIGHT_MAP, TERRAIN_PATH, TERRAIN_RAW_SHAPE, TERRAIN_RAW_DTYPE, TERRAIN_GRADIENT_BLOCK_ROWS,
+                      TERRAIN_TILE_SIZE, TERRAIN_TILE_CACHE_SIZE, TERRAIN_PREFETCH_TICKS, TERRAIN_PREFETCH_WORKERS)
+
+class Terrain:
+    """
+    Height map stretched over the environment, with its gradient field precomputed once.
+
+    Grid node (row, column) sits at screen position (column * width / (columns - 1), row * height / (rows - 1)).
+    Heights may be a read-only memory map, so large DEMs are paged in only where agents actually are.
+    The gradient is the central difference h[i + 1] - h[i - 1] per grid cell (edge cells reuse their
+    inner neighbour), the scale the terrain force weights were tuned for.
+    """
+    def __init__(self, heights, width: float = ENV_WIDTH, height: float = ENV_HEIGHT, block_rows: int = TERRAIN_GRADIENT_BLOCK_ROWS):
+        if heights.ndim != 2 or min(heights.shape) < 3:
+            raise ValueError(f"Height map must be a 2D grid of at least 3x3 values, got shape {heights.shape}.")
+        self.heights = heights
+        self.rows, self.columns = heights.shape
+        self.width = width
+        self.height = height
+        self.scale = np.array([(self.columns - 1) / width, (self.rows - 1) / height])  # Screen to grid coordinates
+        self.gradient = self.compute_gradient(block_rows)
+
+    @classmethod
+    def load(cls, path, shape=None, dtype=TERRAIN_RAW_DTYPE, **kwargs):
+        """
+        Memory map a height map file: a .npy array, or a headerless raw raster of the given (rows, columns) shape and dtype.
+        """
+        path = str(path)
+        if path.endswith(".npy"):
+            heights = np.load(path, mmap_mode="r")
+        else:
+            if shape is None:
+                raise ValueError(f"Raw height map '{path}' needs its (rows, columns) shape.")
+            heights = np.memmap(path, dtype=dtype, mode="r", shape=tuple(shape))
+        return cls(heights, **kwargs)
+
+    def compute_gradient(self, block_rows):
+        """(rows, columns, 2) float32 gradient field, computed a block of rows at a time to bound memory on large maps."""
+        gradient = np.empty((self.rows, self.columns, 2), dtype=np.float32)
+        for start in range(0, self.rows, block_rows):
+            stop = min(start + block_rows, self.rows)
+            # Rows around the block holding every neighbour its (clamped) central differences need
+            above = max(min(start, self.rows - 2) - 1, 0)
+            below = min(max(stop, 2) + 1, self.rows)
+            block = np.asarray(self.heights[above:below], dtype=np.float32)
+            rows = np.clip(np.arange(start, stop), 1, self.rows - 2) - above  # Edge rows reuse their inner neighbour
+
+            gradient[start:stop, 1:-1, 0] = block[rows, 2:] - block[rows, :-2]
+            gradient[start:stop, :, 1] = block[rows + 1] - block[rows - 1]
+        # Edge columns reuse their inner neighbour
+        gradient[:, 0] = gradient[:, 1]
+        gradient[:, -1] = gradient[:, -2]
+        return gradient
+
+    def grid_coordinates(self, positions):
+        """Corner indices and interpolation weights of the grid cells containing an (N, 2) array of screen positions."""
+        grid = np.asarray(positions, dtype=float).reshape(-1, 2) * self.scale
+        grid[:, 0] = np.clip(grid[:, 0], 0, self.columns - 1)
+        grid[:, 1] = np.clip(grid[:, 1], 0, self.rows - 1)
+        x0 = np.minimum(grid[:, 0].astype(int), self.columns - 2)
+        y0 = np.minimum(grid[:, 1].astype(int), self.rows - 2)
+        tx = grid[:, 0] - x0
+        ty = grid[:, 1] - y0
+        return x0, y0, tx, ty
+
+    def bilinear(self, field, positions):
+        """Bilinearly interpolate a (rows, columns, ...) field at an (N, 2) array of screen positions."""
+        return interpolate(field, *self.grid_coordinates(positions))
+
+    def heights_at(self, positions):
+        """(N,) terrain heights at an (N, 2) array of screen positions."""
+        return self.bilinear(self.heights, positions).astype(float)
+
+    def gradients_at(self, positions):
+        """(N, 2) terrain gradients (x, y) at an (N, 2) array of screen positions."""
+        return self.bilinear(self.gradient, positions).astype(float)
+
+    def prefetch(self, positions, velocities):
+        """Nothing to prefetch: the operating system pages memory mapped heights in on demand."""
+
+def interpolate(field, x0, y0, tx, ty):
+    """Bilinear interpolation of a (rows, columns, ...) field inside the cells with lower corners (y0, x0)."""
+    if field.ndim == 3:
+        tx, ty = tx[:, None], ty[:, None]
+    return (field[y0, x0] * (1 - tx) * (1 - ty) +
+            field[y0, x0 + 1] * tx * (1 - ty) +
+            field[y0 + 1, x0] * (1 - tx) * ty +
+            field[y0 + 1, x0 + 1] * tx * ty)
+
+TILE_INDEX_FILE = "terrain.json"
+
+def tile_file(directory, tile_row, tile_column):
+    return os.path.join(directory, f"tile_{tile_row}_{tile_column}.npy")
+
+def write_tiles(heights, directory, tile_size: int = TERRAIN_TILE_SIZE):
+    """
+    Split a (rows, columns) height map, e.g. a memory mapped DEM, into a TiledTerrain directory.
+
+    Each tile holds tile_size x tile_size grid nodes plus a border of one node before and two after,
+    copied from its neighbours (or repeated at the map edge), so a tile alone is enough to interpolate
+    and take central differences anywhere in it. Only one tile is in memory at a time.
+    """
+    rows, columns = heights.shape
+    os.makedirs(directory, exist_ok=True)
+    for tile_row in range(-(-rows // tile_size)):
+        for tile_column in range(-(-columns // tile_size)):
+            tile_rows = np.clip(np.arange(tile_row * tile_size - 1, (tile_row + 1) * tile_size + 2), 0, rows - 1)
+            tile_columns = np.clip(np.arange(tile_column * tile_size - 1, (tile_column + 1) * tile_size + 2), 0, columns - 1)
+            block = np.asarray(heights[tile_rows[0]:tile_rows[-1] + 1, tile_columns[0]:tile_columns[-1] + 1], dtype=np.float32)
+            np.save(tile_file(directory, tile_row, tile_column), block[np.ix_(tile_rows - tile_rows[0], tile_columns - tile_columns[0])])
+
+    with open(os.path.join(directory, TILE_INDEX_FILE), "w") as file:
+        json.dump({"rows": rows, "columns": columns, "tile_size": tile_size}, file)
+
+class TiledTerrain(Terrain):
+    """
+    Terrain stored as a directory of fixed-size tiles (see write_tiles), for height maps larger than memory.
+
+    Tiles are loaded, and their gradient computed, only when agents sample them. At most max_tiles
+    stay cached (least recently used evicted first), so memory is bounded whatever the map size.
+    prefetch() starts loading in the background the tiles agents are heading into.
+    The cache is shared by every simulation using the terrain, so its bookkeeping is guarded by a lock.
+    """
+    def __init__(self, directory, width: float = ENV_WIDTH, height: float = ENV_HEIGHT, max_tiles: int = TERRAIN_TILE_CACHE_SIZE,
+                 prefetch_ticks: float = TERRAIN_PREFETCH_TICKS, prefetch_workers: int = TERRAIN_PREFETCH_WORKERS):
+        with open(os.path.join(directory, TILE_INDEX_FILE)) as file:
+            index = json.load(file)
+        self.directory = directory
+        self.rows, self.columns, self.tile_size = index["rows"], index["columns"], index["tile_size"]
+        if min(self.rows, self.columns) < 3:
+            raise ValueError(f"Height map must be a 2D grid of at least 3x3 values, got shape {(self.rows, self.columns)}.")
+        self.tile_rows = -(-self.rows // self.tile_size)
+        self.tile_columns = -(-self.columns // self.tile_size)
+        self.width = width
+        self.height = height
+        self.scale = np.array([(self.columns - 1) / width, (self.rows - 1) / height])  # Screen to grid coordinates
+
+        self.max_tiles = max_tiles
+        self.prefetch_ticks = prefetch_ticks
+        self.tiles = OrderedDict()  # (tile_row, tile_column) -> (heights, gradient), least recently used first
+        self.loading = {}  # (tile_row, tile_column) -> Future of a background load
+        self.lock = threading.Lock()  # Guards tiles, loading and the counters; tiles are read from disk outside it
+        self.executor = ThreadPoolExecutor(prefetch_workers, thread_name_prefix="terrain") if prefetch_workers else None
+
+        self.hits = 0
+        self.misses = 0
+        self.prefetched = 0
+        self.evictions = 0
+
+    def load_tile(self, key):
+        """Read one tile and compute its gradient, with the same clamped central differences as Terrain."""
+        tile_row, tile_column = key
+        heights = np.load(tile_file(self.directory, tile_row, tile_column))
+
+        # Border node j of a tile is grid node start - 1 + j; edge nodes of the map reuse their inner neighbour
+        rows = np.clip(np.arange(heights.shape[0]) + tile_row * self.tile_size - 1, 1, self.rows - 2) - (tile_row * self.tile_size - 1)
+        columns = np.clip(np.arange(heights.shape[1]) + tile_column * self.tile_size - 1, 1, self.columns - 2) - (tile_column * self.tile_size - 1)
+        rows = np.clip(rows, 1, heights.shape[0] - 2)  # Border nodes are never sampled
+        columns = np.clip(columns, 1, heights.shape[1] - 2)
+
+        gradient = np.empty(heights.shape + (2,), dtype=np.float32)
+        gradient[..., 0] = heights[np.ix_(rows, columns + 1)] - heights[np.ix_(rows, columns - 1)]
+        gradient[..., 1] = heights[np.ix_(rows + 1, columns)] - heights[np.ix_(rows - 1, columns)]
+        return heights, gradient
+
+    def tile(self, key):
+        """A tile from the cache, a finished background load or disk, in that order."""
+        with self.lock:
+            tile = self.tiles.get(key)
+            if tile is not None:
+                self.tiles.move_to_end(key)
+                self.hits += 1
+                return tile
+            future = self.loading.pop(key, None)
+            if future is not None:
+                self.prefetched += 1
+            else:
+                self.misses += 1
+
+        tile = future.result() if future is not None else self.load_tile(key)
+        with self.lock:
+            self.remember(key, tile)
+        return tile
+
+    def remember(self, key, tile):
+        """Cache a tile, evicting the least recently used beyond max_tiles (call with the lock held)."""
+        self.tiles[key] = tile
+        self.tiles.move_to_end(key)
+        while len(self.tiles) > self.max_tiles:
+            self.tiles.popitem(last=False)
+            self.evictions += 1
+
+    def tile_keys(self, x0, y0):
+        """Tile of each grid cell, as one integer key per cell."""
+        return (y0 // self.tile_size) * self.tile_columns + x0 // self.tile_size
+
+    def sample(self, field, positions):
+        """Interpolate the tile field ("heights" or "gradient") at an (N, 2) array of screen positions, one tile at a time."""
+        x0, y0, tx, ty = self.grid_coordinates(positions)
+        keys = self.tile_keys(x0, y0)
+        order = np.argsort(keys, kind="stable")
+        tile_keys, starts = np.unique(keys[order], return_index=True)
+
+        result = np.empty((len(x0), 2) if field == "gradient" else len(x0))
+        for key, group in zip(tile_keys.tolist(), np.split(order, starts[1:])):
+            tile_row, tile_column = divmod(key, self.tile_columns)
+            heights, gradient = self.tile((tile_row, tile_column))
+            # Tile node 0 is the border node before the tile's first grid node
+            local_x = x0[group] - tile_column * self.tile_size + 1
+            local_y = y0[group] - tile_row * self.tile_size + 1
+            result[group] = interpolate(gradient if field == "gradient" else heights, local_x, local_y, tx[group], ty[group])
+        return result
+
+    def heights_at(self, positions):
+        return self.sample("heights", positions)
+
+    def gradients_at(self, positions):
+        return self.sample("gradient", positions)
+
+    def prefetch(self, positions, velocities):
+        """Start loading the tiles agents will reach in prefetch_ticks ticks at their current velocities."""
+        if self.executor is None or len(positions) == 0:
+            return
+        positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+        travel = np.asarray(velocities, dtype=float).reshape(-1, 2) * self.prefetch_ticks
+        # Points along each path no more than a tile apart, so no tile on the way is skipped
+        steps = int(np.ceil(np.abs(travel * self.scale).max() / self.tile_size)) + 1
+        ahead = (positions[None] + np.linspace(0, 1, steps + 1)[1:, None, None] * travel[None]).reshape(-1, 2)
+        keys = [divmod(key, self.tile_columns) for key in np.unique(self.tile_keys(*self.grid_coordinates(ahead)[:2])).tolist()]
+
+        with self.lock:
+            # Drop finished loads of tiles no agent is heading into anymore
+            for key, future in list(self.loading.items()):
+                if future.done() and key not in keys:
+                    del self.loading[key]
+
+            # Leave room in the cache for the tiles in use
+            budget = self.max_tiles // 2 - len(self.loading)
+            for key in keys:
+                if budget <= 0:
+                    break
+                if key not in self.tiles and key not in self.loading:
+                    self.loading[key] = self.executor.submit(self.load_tile, key)
+                    budget -= 1
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses + self.prefetched
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "prefetched": self.prefetched,
+                "hit_rate": (self.hits + self.prefetched) / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "cached_tiles": len(self.tiles),
+                "loading_tiles": len(self.loading),
+            }
+
+terrain = None  # Shared terrain, loaded on first use
+terrain_lock = threading.Lock()  # Simulations in worker threads may ask for it at the same time
+
+def get_terrain():
+    """
+    The terrain of the simulation: the TERRAIN_PATH tile directory or height map file if configured,
+    otherwise TERRAIN_HEIGHT_MAP.
+    """
+    global terrain
+    with terrain_lock:
+        if terrain is None:
+            if TERRAIN_PATH and os.path.isdir(TERRAIN_PATH):
+                terrain = TiledTerrain(TERRAIN_PATH)
+            elif TERRAIN_PATH:
+                terrain = Terrain.load(TERRAIN_PATH, shape=TERRAIN_RAW_SHAPE)
+            else:
+                terrain = Terrain(TERRAIN_HEIGHT_MAP)
+    return terrain
@@ -1,153 +1,270 @@
-import asyncio
+import queue
 import random
+import numpy as np
 
-from .simulation.environment import create_targets_from_dict, create_agents_from_dict, create_obstacles_from_dict
-from .config import ENV_WIDTH, ENV_HEIGHT, NUM_AGENTS, TARGET_RADIUS, ALIGNMENT_WEIGHT, COHESION_WEIGHT, SEPARATION_WEIGHT, TARGET_WEIGHT, OBSTACLE_WEIGHT, TERRAIN_WEIGHT, EVAL_TOLERANCE, MAX_EVALS
-from .lib.utils import evaluate_coordinates
+from .simulation.environment import create_target_positions, create_swarm_from_dict, create_obstacles_from_dict
+from .config import ENV_WIDTH, ENV_HEIGHT, NUM_AGENTS, RADIUS, TARGET_RADIUS, ALIGNMENT_WEIGHT, COHESION_WEIGHT, SEPARATION_WEIGHT, TARGET_WEIGHT, OBSTACLE_WEIGHT, TERRAIN_WEIGHT, NAVIGATION_ENABLED, EVAL_TOLERANCE, MAX_EVALS, DETECT_USE_BOUNDING_BOX
+from .lib.utils import evaluate_coordinates_batch
+from .lib.scheduler import FixedTimestepScheduler
 from .simulation.mapObject import mapObject
-
-# Global variable to hold the state of the simulation
-agents_data = {}
-targets_data = {}
-obstacles_data = {}
-agent_detections_data = {}
-plan_progress = {}
-new_detections = []
-
-async def run_simulation(llm_plan: dict, map: list[mapObject], existing_agent_data: dict):
-
-    # Initialize Environment
-    global agents_data, targets_data, obstacles_data, agent_detections_data, targets, agents, new_detections
-
-    # Uncomment to respawn agents at last location in prev simulation step
-    # # Initialize the agents at random positions
-    # if existing_agent_data:
-    #     agents_dict = existing_agent_data.copy()
-    # else:
-    agents_dict = { agent_id: {"target_id": agent_id, "position": [random.randint(0, ENV_WIDTH), random.randint(0, ENV_HEIGHT)]} for agent_id in range(NUM_AGENTS) }
-    
-    agents = create_agents_from_dict(agents_dict)
-
-    targets = []
-    obstacles = []
-    target_positions = []
-
-    running = True
-    step_completed = True
-    current_step = 0
-
-    loop_counter = 0
-    eval_counter = 0
-    eval_interval = 50  # Number of steps before evaluating the agent positions
-    agent_detection_eval_interval = 10  # Number of steps before evaluating agent detections
-
-    # Get each step and the objective from the LLM plan
-    for step in llm_plan:
-        plan_progress[step] = {
-            "objective": llm_plan[step]["objective"],
-            "completed": False
-        }
-
-    print("PLAN KEYS: ", llm_plan.keys())
-
-    # Main simulation loop
-    while running:
+from .simulation.mapIndex import MapIndex
+from .simulation.assignment import assign_targets
+from .simulation.navigation import NavigationGrid
+from .simulation.snapshot import SimulationSnapshot, SnapshotBuffer
+from .lib.profiling import PhaseTimer
+
+class Simulation:
+    """State of one simulation run, advanced one tick at a time by step()."""
+    def __init__(self, llm_plan: dict, map: list[mapObject], existing_agent_data: dict = None, map_index: MapIndex = None, plan_queue=None, num_agents: int = NUM_AGENTS, seed: int = None):
+        # Random generators of this run for the agents' start positions and velocities; seeded, a recorded run can be repeated
+        self.random = random.Random(seed)
+        self.rng = np.random.default_rng(seed)
+
+        self.llm_plan = dict(llm_plan)
+        self.map = map
+        self.plan_queue = plan_queue  # Steps of a plan still being generated; None once the plan is complete
+
+        # State of the simulation, owned by this run (agent state is published through snapshots)
+        self.targets_data = {}
+        self.obstacles_data = {}
+        self.agent_detections_data = {}
+        self.plan_progress = {}
+        self.new_detections = []
+
+        # Uncomment to respawn agents at last location in prev simulation step
+        # # Initialize the agents at random positions
+        # if existing_agent_data:
+        #     agents_dict = existing_agent_data.copy()
+        # else:
+        agents_dict = { agent_id: {"target_id": agent_id, "position": [self.random.randint(0, ENV_WIDTH), self.random.randint(0, ENV_HEIGHT)]} for agent_id in range(num_agents) }
+
+        self.swarm = create_swarm_from_dict(agents_dict, self.rng)
+        self.agents = self.swarm.agents
+
+        self.obstacles = []
+        self.target_position_array = np.empty((0, 2))  # Target positions of the current step, indexed by target id
+        self.obstacle_position_array = np.array([obstacle.position for obstacle in self.obstacles], dtype=float).reshape(-1, 2)
+
+        # Static index over the map objects for the detection pass (normally built when the map is loaded)
+        self.map_index = map_index if map_index is not None else MapIndex(map)
+
+        # Cost grid and per-target flow fields steering agents around floods, water, obstacles and steep terrain
+        self.navigation = NavigationGrid(map, self.obstacle_position_array) if NAVIGATION_ENABLED else None
+
+        self.running = True
+        self.step_completed = True
+        self.current_step = 0
+
+        self.loop_counter = 0
+        self.eval_counter = 0
+        self.eval_interval = 50  # Number of steps before evaluating the agent positions
+        self.agent_detection_eval_interval = 10  # Number of steps before evaluating agent detections
+        self.detected_names = []  # Map objects detected so far in this run
+        self.phase_timer = None  # PhaseTimer charged with the time of each phase of step(), when profiling
+
+        # Get each step and the objective from the LLM plan
+        for step in llm_plan:
+            self.plan_progress[step] = new_step_progress(llm_plan[step])
+
+        print("PLAN KEYS: ", llm_plan.keys())
+
+    def step(self):
+        """Advance the simulation by one tick."""
+        timer = self.phase_timer
+        if timer:
+            timer.start()
 
         # Increment the loop counter
-        loop_counter += 1
+        self.loop_counter += 1
+
+        # Take in plan steps generated since the last tick
+        if self.plan_queue is not None:
+            self.receive_plan_steps()
 
-        # Check if we should move to the next step
-        if step_completed and llm_plan:
-            current_step += 1
-            step_data = llm_plan.get(current_step)
+        # Check if we should move to the next step (or wait for it while the plan is still being generated)
+        if self.step_completed and self.llm_plan and (self.current_step + 1 in self.llm_plan or self.plan_queue is None):
+            self.current_step += 1
+            step_data = self.llm_plan.get(self.current_step)
 
             if step_data:
                 # Update the targets and agents
-                targets_data, targets = update_targets_from_llm(step_data)
-                target_positions = [target.position for target in targets.values()]
-
-                # future feature: high level obstacles to be set by LLM
-
-                agents = update_agents_from_llm(step_data, agents)
-
-                step_completed = False
-
-                eval_counter = 0 # reset for step
-
-        # Clear agent status data and new detections
-        agents_data.clear()
-        new_detections.clear()
-
-        if agents:
-            for agent in agents:
-                agent.edges()
-                agent.flock(agents, targets[agent.target_id], obstacles, 
-                        ALIGNMENT_WEIGHT,
-                        COHESION_WEIGHT,
-                        SEPARATION_WEIGHT,
-                        TARGET_WEIGHT,
-                        OBSTACLE_WEIGHT,
-                        TERRAIN_WEIGHT,
-                    )
-                
-                # Update agent position based on velocity
-                agent.update()
-
-                # Agent status data
-                agents_data[agent.id] = {
-                    "target_id": agent.target_id,                # Swarm identifier
-                    "position": agent.position.copy().tolist(),  # Convert numpy array to list
-                    "z_positon": agent.z_position,               # For 3D simulations
-                    "velocity": agent.velocity.tolist(),         # 2D vector for velocity
-                    "acceleration": agent.acceleration.tolist(), # Initialize acceleration to zero
-                }
-
-                # Agent detections
-                if loop_counter % agent_detection_eval_interval == 0:
-                    for object in map:
-                        if agent.detect(object):
-                            agent_detections_data[agent.id] = object.name
-
-                            if not object.detected:
-                                object.detected = True  # Set detection flag
-
-                                # Add to newly detected
-                                obj_dict = object.convert_to_dict()
-                                new_detections.append(obj_dict)
+                self.targets_data, self.target_position_array = update_targets_from_llm(step_data)
+
+                # future feature: high level obstacles to be set by LLM (then self.navigation.update(self.map, self.obstacle_position_array))
+
+                assignment_report = update_agents_from_llm(self.swarm, self.target_position_array)
+                self.plan_progress[self.current_step]["assignment"] = assignment_report
+                print(f"Step {self.current_step} assignment: {assignment_report}")
+
+                if self.navigation:
+                    # Flow fields only for targets whose agent can't head straight there
+                    start_positions = np.full_like(self.target_position_array, np.nan)
+                    assigned = self.swarm.target_id >= 0
+                    start_positions[self.swarm.target_id[assigned]] = self.swarm.position[assigned]
+                    self.navigation.set_targets(self.target_position_array, start_positions, self.loop_counter)
+
+                self.step_completed = False
+
+                self.eval_counter = 0 # reset for step
+
+        if timer:
+            timer.lap("plan")
+
+        # Clear new detections
+        self.new_detections.clear()
+
+        if self.agents:
+            # Step the whole swarm with batched array operations
+            self.swarm.edges()
+            directions = self.navigation.steering_directions(self.swarm.position, self.swarm.target_id, self.loop_counter) if self.navigation else None
+            if timer:
+                timer.lap("navigation")
+            self.swarm.flock(self.target_position_array, self.obstacle_position_array,
+                    ALIGNMENT_WEIGHT,
+                    COHESION_WEIGHT,
+                    SEPARATION_WEIGHT,
+                    TARGET_WEIGHT,
+                    OBSTACLE_WEIGHT,
+                    TERRAIN_WEIGHT,
+                    directions,
+                )
+            if timer:
+                timer.lap("forces")
+
+            # Update agent positions based on velocity
+            self.swarm.update()
+            if timer:
+                timer.lap("integrate")
+
+            # Agent detections
+            if self.loop_counter % self.agent_detection_eval_interval == 0:
+                self.detect()
+            if timer:
+                timer.lap("detect")
 
         # Check if all agents have reached their targets
-        if loop_counter % eval_interval == 0 and current_step in llm_plan:
-            agent_positions = [agent.position for agent in agents]
-            step_completed = evaluate_coordinates(agent_positions, target_positions, EVAL_TOLERANCE) or eval_counter > MAX_EVALS
-            plan_progress[current_step]["completed"] = step_completed
-
-            eval_counter += 1
-
-            print(f"Step {current_step} completed: {step_completed}")
-
-        await asyncio.sleep(0.01)  # Control the update frequency
+        if self.loop_counter % self.eval_interval == 0 and self.current_step in self.llm_plan and not self.step_completed:
+            evaluation = evaluate_coordinates_batch(self.swarm.position, self.target_position_array, EVAL_TOLERANCE, self.swarm.target_id)
+            self.step_completed = evaluation.complete or self.eval_counter > MAX_EVALS
+            self.plan_progress[self.current_step].update(
+                completed=self.step_completed,
+                completion=round(evaluation.completion, 1),         # Percentage of agents at their targets
+                agents_arrived=int(evaluation.arrived.sum()),
+                targets_covered=int(np.count_nonzero(evaluation.coverage)),
+                targets=len(self.target_position_array),
+            )
+
+            self.eval_counter += 1
+
+            print(f"Step {self.current_step} completed: {self.step_completed}")
+
+        if timer:
+            timer.lap("evaluate")
+
+    @property
+    def finished(self):
+        """Whether every step of a complete plan has been completed."""
+        return self.plan_queue is None and (not self.llm_plan or self.current_step > max(self.llm_plan))
+
+    def receive_plan_steps(self):
+        """Add the steps waiting in the plan queue; a None entry marks the end of the plan."""
+        while True:
+            try:
+                item = self.plan_queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is None:
+                self.plan_queue = None
+                return
+
+            step_number, step_data = item
+            self.llm_plan[step_number] = step_data
+            self.plan_progress[step_number] = new_step_progress(step_data)
+
+    def detect(self):
+        """Record every map object detected by an agent this tick."""
+        agent_idx, object_idx = self.map_index.query(self.swarm.position, RADIUS, DETECT_USE_BOUNDING_BOX)
+        for agent_i, object_i in zip(agent_idx, object_idx):  # Same order as scanning agents, then map objects
+            agent, object = self.agents[agent_i], self.map_index.map_objects[object_i]
+            self.agent_detections_data[agent.id] = object.name
+
+            if not object.detected:
+                object.detected = True  # Set detection flag
+                self.detected_names.append(object.name)
+
+                # Add to newly detected
+                obj_dict = object.convert_to_dict()
+                self.new_detections.append(obj_dict)
+
+    def snapshot(self, stats=None):
+        """Immutable copy of the state after the last tick, for publishing to the API layer."""
+        return SimulationSnapshot(self.loop_counter, self.swarm, self.targets_data, self.obstacles_data, self.agent_detections_data, self.plan_progress, self.new_detections, self.detected_names, stats)
+
+async def run_simulation(llm_plan: dict, map: list[mapObject], existing_agent_data: dict, map_index: MapIndex = None, snapshots: SnapshotBuffer = None, plan_queue=None, timing_enabled=None, seed: int = None):
+    """Run the simulation on the event loop at a fixed tick rate until the task is cancelled."""
+    simulation = Simulation(llm_plan, map, existing_agent_data, map_index, plan_queue, seed=seed)
+    scheduler = FixedTimestepScheduler()
+    snapshots = snapshots if snapshots is not None else SnapshotBuffer()
+
+    try:
+        await scheduler.run(lambda: step_and_publish(simulation, scheduler, snapshots, timing_enabled))
+    finally:
+        scheduler.stop()
+
+def step_and_publish(simulation: Simulation, scheduler: FixedTimestepScheduler, snapshots: SnapshotBuffer, timing_enabled=None):
+    """
+    Run one simulation tick and publish the resulting snapshot.
+    While timing_enabled() is true, the time of each phase of the tick goes along in the snapshot stats.
+    """
+    if timing_enabled is not None:
+        if not timing_enabled():
+            simulation.phase_timer = None
+        elif simulation.phase_timer is None:
+            simulation.phase_timer = PhaseTimer()
+
+    timer = simulation.phase_timer
+    snapshot_seconds = timer.last_tick.get("snapshot") if timer else None  # Building the previous tick's snapshot
+    simulation.step()
+    if not simulation.running:
+        scheduler.stop()
+
+    stats = scheduler.stats()
+    if timer:
+        stats["phase_seconds"] = dict(timer.last_tick)
+        if snapshot_seconds is not None:
+            stats["phase_seconds"]["snapshot"] = snapshot_seconds  # A snapshot can't hold its own build time, so it goes in the next one
+    snapshot = simulation.snapshot(stats)
+    if timer:
+        timer.lap("snapshot")  # Only the timer's own dict; the published snapshot is never touched again
+    snapshots.publish(snapshot)
+
+def new_step_progress(step_data):
+    """Progress entry of a plan step that hasn't been evaluated yet."""
+    return {
+        "objective": step_data["objective"],
+        "completed": False,
+        "completion": 0.0,
+        "agents_arrived": 0,
+        "targets_covered": 0,
+        "targets": len(step_data.get("coordinates", ())),
+    }
 
 def update_targets_from_llm(step_data):
-    """Update targets based on the current step of the LLM plan."""
-    coords = step_data["coordinates"]
+    """Update targets based on the current step of the LLM plan, returning their data and an (N, 2) position array."""
+    target_positions = create_target_positions(step_data["coordinates"])
 
-    targets_data = {}
-    for i, coord in enumerate(coords):
-        targets_data[i] = {
-            "position": coord,
+    # Target data for the websocket payload, built once per step
+    targets_data = {
+        i: {
+            "position": position,
             "radius": TARGET_RADIUS
         }
-    
-    # Recreate the target objects with new data
-    targets = create_targets_from_dict(targets_data)
-
-    return targets_data, targets
+        for i, position in enumerate(target_positions.tolist())
+    }
 
-def update_agents_from_llm(step_data, agents):
-    """Update agents with new target assignments from the LLM plan."""
-    coords = step_data["coordinates"]
-    
-    for i, coord in enumerate(coords):
-        agents[i].target_id = i
+    return targets_data, target_positions
 
-    return agents
+def update_agents_from_llm(swarm, target_positions):
+    """Assign the step's targets to agents (minimizing distance), returning the assignment report."""
+    swarm.target_id[:], report = assign_targets(swarm.position, target_positions)
+    return report
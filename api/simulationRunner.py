@@ -0,0 +1,224 @@
+import asyncio
+import multiprocessing
+import queue
+import threading
+import time
+
+from .config import SIMULATION_EXECUTION_MODE, SIMULATION_TICK_HZ
+from .lib.scheduler import FixedTimestepScheduler
+from .simulationManager import Simulation, run_simulation, step_and_publish
+from .simulation.snapshot import SnapshotBuffer
+from .simulation.recording import ReplayLog
+from .lib.metrics import metrics
+
+EXECUTION_MODES = ("asyncio", "thread", "process")
+
+def run_simulation_blocking(stop_event, snapshots, llm_plan, map, existing_agent_data, map_index, on_publish=None, plan_queue=None, timing_enabled=None, seed=None):
+    """Step a simulation at a fixed rate on the calling thread until stop_event is set."""
+    simulation = Simulation(llm_plan, map, existing_agent_data, map_index, plan_queue, seed=seed)
+    scheduler = FixedTimestepScheduler()
+
+    def step():
+        if stop_event.is_set():
+            scheduler.stop()
+            return
+        step_and_publish(simulation, scheduler, snapshots, timing_enabled)
+        if on_publish:
+            on_publish(snapshots.latest())
+
+    scheduler.run_blocking(step)
+
+def run_simulation_process(connection, stop_event, llm_plan, map, existing_agent_data, map_index, plan_queue=None, timing_switch=None, seed=None):
+    """Entry point of a simulation subprocess: sends each snapshot to the parent over a pipe."""
+    try:
+        timing_enabled = timing_switch.is_set if timing_switch is not None else None
+        run_simulation_blocking(stop_event, SnapshotBuffer(), llm_plan, map, existing_agent_data, map_index, connection.send, plan_queue, timing_enabled, seed)
+    except (BrokenPipeError, EOFError):
+        pass  # Parent went away
+    finally:
+        connection.close()
+
+class SimulationRunner:
+    """
+    Runs one simulation in the configured execution mode and exposes its latest snapshot.
+
+    - "asyncio": steps on the event loop between awaits (the original behaviour).
+    - "thread": steps in a dedicated worker thread.
+    - "process": steps in a subprocess; snapshots are piped back and handed over by a reader thread.
+
+    In every mode the API layer only ever reads immutable snapshots through latest(), so a slow
+    tick in "thread" or "process" mode never blocks request handlers or websocket sends.
+
+    A streaming runner starts from the first steps of a plan that is still being generated;
+    later steps are handed over with add_step() and the end of the plan with finish_plan().
+
+    Given a seed, the run is repeatable; given a Recorder, every published snapshot is recorded.
+    """
+    def __init__(self, llm_plan: dict, map: list, existing_agent_data: dict = None, map_index=None, mode: str = SIMULATION_EXECUTION_MODE, streaming: bool = False,
+                 seed: int = None, recorder=None):
+        if mode not in EXECUTION_MODES:
+            raise ValueError(f"Unknown simulation execution mode '{mode}'. Expected one of {EXECUTION_MODES}.")
+        self.llm_plan = llm_plan
+        self.map = map
+        self.existing_agent_data = existing_agent_data
+        self.map_index = map_index
+        self.mode = mode
+        self.snapshots = SnapshotBuffer(on_publish=self.published)
+        self.streaming = streaming
+        self.plan_queue = None
+        self.seed = seed
+        self.recorder = recorder
+
+        self._task = None
+        self._thread = None
+        self._process = None
+        self._stop_event = None
+
+    def start(self):
+        """Start stepping the simulation in the background."""
+        if self.mode == "asyncio":
+            self.plan_queue = queue.Queue() if self.streaming else None
+            self._task = asyncio.create_task(run_simulation(self.llm_plan, self.map, self.existing_agent_data, self.map_index, self.snapshots, self.plan_queue, metrics.is_enabled, self.seed))
+        elif self.mode == "thread":
+            self.plan_queue = queue.Queue() if self.streaming else None
+            self._stop_event = threading.Event()
+            self._thread = threading.Thread(
+                target=run_simulation_blocking,
+                args=(self._stop_event, self.snapshots, self.llm_plan, self.map, self.existing_agent_data, self.map_index, None, self.plan_queue, metrics.is_enabled, self.seed),
+                name="simulation",
+                daemon=True,
+            )
+            self._thread.start()
+        else:
+            context = multiprocessing.get_context("spawn")
+            receiver, sender = context.Pipe(duplex=False)
+            self.plan_queue = context.Queue() if self.streaming else None
+            self._stop_event = context.Event()
+            self._process = context.Process(
+                target=run_simulation_process,
+                args=(sender, self._stop_event, self.llm_plan, self.map, self.existing_agent_data, self.map_index, self.plan_queue, metrics.process_switch(context), self.seed),
+                name="simulation",
+                daemon=True,
+            )
+            self._process.start()
+            sender.close()  # Only the child writes
+            self._thread = threading.Thread(target=self._receive_snapshots, args=(receiver,), name="simulation-snapshots", daemon=True)
+            self._thread.start()
+
+    def _receive_snapshots(self, receiver):
+        try:
+            while True:
+                self.snapshots.publish(receiver.recv())
+        except (EOFError, OSError):
+            pass  # Child exited
+        finally:
+            receiver.close()
+
+    def published(self, snapshot):
+        """Called with every snapshot published to the API layer."""
+        metrics.observe_snapshot(snapshot)  # Tick phase times feed the metrics histograms
+        if self.recorder is not None:
+            self.recorder.record(snapshot)
+
+    def add_step(self, step_number, step_data):
+        """Hand a newly generated plan step to a streaming simulation."""
+        self.plan_queue.put((step_number, step_data))
+        if self.recorder is not None:
+            self.recorder.add_plan_step(step_number, step_data)
+
+    def finish_plan(self):
+        """Tell a streaming simulation that no more steps will arrive."""
+        if self.plan_queue is not None:
+            self.plan_queue.put(None)
+
+    def latest(self):
+        """The most recent published snapshot, or None before the first tick."""
+        return self.snapshots.latest()
+
+    def stats(self):
+        """Scheduler statistics from the most recent snapshot."""
+        snapshot = self.latest()
+        return snapshot.stats if snapshot else {}
+
+    async def stop(self):
+        """Stop the simulation and wait for its worker to finish."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._stop_event:
+            self._stop_event.set()
+        if self._process:
+            await asyncio.to_thread(self._process.join, 5)
+            if self._process.is_alive():
+                self._process.terminate()
+        if self._thread:
+            await asyncio.to_thread(self._thread.join, 5)
+        if self.recorder is not None:
+            self.recorder.close()
+
+class ReplayRunner:
+    """
+    Plays a recording back through the same interface as SimulationRunner, without stepping any physics.
+
+    Playback advances speed times the simulation tick rate (ticks skipped at high speeds are never decoded,
+    and their new_detections are not repeated), stops at the last recorded tick and can seek to any tick.
+    """
+    def __init__(self, path, speed: float = 1.0, start_tick: int = None):
+        self.log = ReplayLog(path)
+        self.snapshots = SnapshotBuffer()
+        self.speed = speed
+        self.position = float(start_tick if start_tick is not None else self.log.first_tick)  # Current (fractional) tick
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self.play())
+
+    async def play(self):
+        previous = time.monotonic()
+        while True:
+            now = time.monotonic()
+            self.position = min(self.position + (now - previous) * SIMULATION_TICK_HZ * self.speed, self.log.last_tick)
+            previous = now
+            self.publish()
+            await asyncio.sleep(1.0 / SIMULATION_TICK_HZ)
+
+    def publish(self):
+        """Publish the snapshot of the current tick, unless it already is the latest."""
+        tick = max(int(self.position), self.log.first_tick)
+        latest = self.snapshots.latest()
+        if latest is None or latest.tick != tick:
+            self.snapshots.publish(self.log.snapshot(tick, self.stats(tick)))
+
+    def seek(self, tick: int = None, speed: float = None):
+        """Jump to a tick and/or change the playback speed (0 pauses)."""
+        if speed is not None:
+            self.speed = speed
+        if tick is not None:
+            self.position = float(min(max(tick, self.log.first_tick), self.log.last_tick))
+            self.publish()
+
+    def latest(self):
+        return self.snapshots.latest()
+
+    def stats(self, tick: int = None):
+        """Playback position of the replay."""
+        return {
+            "replay": self.log.path.name,
+            "tick": int(self.position) if tick is None else tick,
+            "first_tick": self.log.first_tick,
+            "last_tick": self.log.last_tick,
+            "speed": self.speed,
+            "seed": self.log.seed,
+        }
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self.log.close()
@@ -0,0 +1,288 @@
+import asyncio
+import copy
+import random
+import time
+import uuid
+
+from .config import DETECT_FILTER_SIZE, MAX_SESSIONS, SIMULATION_EXECUTION_MODE, SIMULATION_TICK_HZ, RECORDING_ENABLED, RECORDING_DIR
+from .connectionManager import ConnectionManager
+from .lib.dataProcessing import detected_objects_filter, mark_detected_objects
+from .simulation.maps import maps
+from .simulation.mapIndex import MapIndex
+from .simulationRunner import SimulationRunner, ReplayRunner
+from .simulation.recording import Recorder
+from .simulation.snapshot import EMPTY_PAYLOAD_JSON
+from .lib.protocol import DeltaEncoder, encode_binary_frame, encode_state_message, encode_subscription_payload
+from .lib.metrics import metrics
+
+DEFAULT_SESSION_ID = "default"
+
+class SimulationSession:
+    """One operator session: its own map, running simulation and websocket subscribers."""
+    def __init__(self, session_id: str, mode: str = SIMULATION_EXECUTION_MODE):
+        self.session_id = session_id
+        self.mode = mode  # Simulation execution mode for this session's runs
+        self.map = None
+        self.map_index = None
+        self.existing_agent_data = None
+        self.llm_plan = None  # Plan of the latest mission, and the map as it was when the mission started (for evaluation)
+        self.mission_map = None
+        self.runner = None
+        self.plan_task = None  # Feeds the steps of a streamed plan to the runner
+        self.manager = ConnectionManager()  # Websocket subscribers of this session
+        self.broadcast_task = None
+        self.delta_encoder = DeltaEncoder()  # Shared by every protocol version 2 subscriber
+        self.frame_cache = {}  # Encoded frames of the current snapshot, keyed by format and subscription
+
+    @property
+    def running(self):
+        return self.runner is not None
+
+    @property
+    def replaying(self):
+        return isinstance(self.runner, ReplayRunner)
+
+    @property
+    def planning(self):
+        """Whether steps of a streamed plan are still being generated."""
+        return self.plan_task is not None and not self.plan_task.done()
+
+    @property
+    def recording(self):
+        """File name of the recording of the running simulation, or None."""
+        recorder = getattr(self.runner, "recorder", None)
+        return recorder.path.name if recorder else None
+
+    def load_map(self, map_name: str):
+        """Load a private copy of a predefined map, so detections never leak between sessions."""
+        if map_name not in maps:
+            return None
+
+        detailed_map = copy.deepcopy(maps[map_name])  # Detailed Exact Map
+        self.map = detected_objects_filter(detailed_map, min_size=DETECT_FILTER_SIZE)  # Detect large objects with satellite
+        self.map_index = MapIndex(self.map)  # Static spatial index for the agent detection pass
+        return self.map
+
+    def new_recorder(self, llm_plan: dict):
+        """A random seed for a new run of llm_plan, and the Recorder that records the run under it."""
+        seed = random.randrange(2 ** 32)
+        path = RECORDING_DIR / f"{self.session_id}-{time.strftime('%Y%m%d-%H%M%S')}-{seed}.armrec"
+        return seed, Recorder(path, llm_plan, self.map or (), seed)
+
+    def start(self, llm_plan: dict, record: bool = RECORDING_ENABLED):
+        """Start a simulation of llm_plan on this session's map, recording it if record is set."""
+        self.llm_plan, self.mission_map = dict(llm_plan), copy.deepcopy(self.map)
+        seed, recorder = self.new_recorder(llm_plan) if record else (None, None)
+        self.runner = SimulationRunner(llm_plan, self.map, self.existing_agent_data, self.map_index, self.mode, seed=seed, recorder=recorder)
+        self.runner.start()
+
+    async def start_stream(self, plan_steps, record: bool = RECORDING_ENABLED):
+        """
+        Start a simulation as soon as the first step of a streamed plan (an async iterator of
+        (step_number, step)) arrives; the remaining steps are fed to it as they are generated.
+        The run is recorded if record is set. Returns whether a first step arrived.
+        """
+        first_step = await anext(plan_steps, None)
+        if first_step is None:
+            return False
+
+        step_number, step_data = first_step
+        self.llm_plan, self.mission_map = {step_number: step_data}, copy.deepcopy(self.map)
+        seed, recorder = self.new_recorder({step_number: step_data}) if record else (None, None)
+        self.runner = SimulationRunner({step_number: step_data}, self.map, self.existing_agent_data, self.map_index, self.mode, streaming=True,
+                                       seed=seed, recorder=recorder)
+        self.runner.start()
+        self.plan_task = asyncio.create_task(self.feed_plan(self.runner, plan_steps))
+        return True
+
+    async def feed_plan(self, runner, plan_steps):
+        try:
+            async for step_number, step_data in plan_steps:
+                runner.add_step(step_number, step_data)
+                self.llm_plan[step_number] = step_data
+        except Exception as e:
+            print(f"Error while streaming the mission plan, continuing with the steps received: {e}")
+        finally:
+            runner.finish_plan()
+
+    def start_replay(self, path, speed: float = 1.0, start_tick: int = None):
+        """Play a recording back to this session's subscribers (the session must not be running)."""
+        self.runner = ReplayRunner(path, speed, start_tick)
+        self.runner.start()
+        return self.runner.stats()
+
+    async def stop(self):
+        """Stop the running simulation or replay, if any. Returns whether one was running."""
+        if self.plan_task:
+            self.plan_task.cancel()
+            self.plan_task = None
+        if not self.runner:
+            return False
+        await self.runner.stop()  # Stop the running simulation and wait for its worker
+        self.runner = None
+        return True
+
+    def latest(self):
+        """The latest snapshot of the running simulation, or None."""
+        snapshot = self.runner.latest() if self.runner else None
+
+        if snapshot and not self.replaying:  # A replay must not change the session's map or agents
+            # Update map for LLM recursive context and sequential user mission statements
+            if snapshot.detected_names and self.map:
+                mark_detected_objects(self.map, snapshot.detected_names)
+
+            # Save agent data for sequential user mission statements
+            if snapshot.agent_ids:
+                self.existing_agent_data = snapshot.agents_data
+
+        return snapshot
+
+    def stats(self):
+        return self.runner.stats() if self.runner else {}
+
+    async def subscribe(self, websocket, protocol: int = 1, frame_format: str = "json", subscription=None):
+        """Connect a websocket and make sure the session is broadcasting to it."""
+        await self.manager.connect(websocket, protocol, frame_format, subscription)
+        if protocol == 1:
+            subscriber = self.manager.subscribers[websocket]
+            self.send_frame(self.latest(), subscriber, time.monotonic(), cache={})
+        if self.broadcast_task is None or self.broadcast_task.done():
+            self.broadcast_task = asyncio.create_task(self.broadcast_loop())
+
+    def unsubscribe(self, websocket):
+        self.manager.disconnect(websocket)
+
+    async def broadcast_loop(self):
+        """
+        Single producer for all subscribers: each new snapshot is encoded once per protocol and
+        the same message is fanned out to every client's queue. Runs while anyone is subscribed.
+        """
+        last_snapshot = object()  # Sentinel, so the first pass always broadcasts
+        frame = None
+        while self.manager.active_connections:
+            snapshot = self.latest()
+            delta_subscribers = [subscriber for subscriber in self.manager.subscribers.values() if subscriber.protocol == 2]
+
+            if snapshot is not last_snapshot:
+                last_snapshot = snapshot
+                self.frame_cache = {}
+                if delta_subscribers:
+                    start = metrics.start()
+                    frame = self.delta_encoder.encode(snapshot)
+                    metrics.observe(metrics.frame_encode, start, "delta")
+                else:
+                    frame = None
+                    self.delta_encoder.reset()
+                self.broadcast_frame(snapshot, frame)
+            else:
+                # Nothing new, but bring delta subscribers that joined or fell behind back in sync
+                if delta_subscribers and frame is None:
+                    start = metrics.start()
+                    frame = self.delta_encoder.encode(snapshot)
+                    metrics.observe(metrics.frame_encode, start, "delta")
+                for subscriber in delta_subscribers:
+                    if subscriber.needs_keyframe:
+                        self.send_delta_frame(frame, subscriber)
+                # and send fps-capped subscribers the latest frame they skipped once they are due
+                now = time.monotonic()
+                for subscriber in list(self.manager.subscribers.values()):
+                    if subscriber.pending and now >= subscriber.next_send_time:
+                        self.send_frame(snapshot, subscriber, now, self.frame_cache)
+
+            await asyncio.sleep(1.0 / SIMULATION_TICK_HZ)
+
+    def broadcast_frame(self, snapshot, frame):
+        """Queue the current frame for every subscriber in the encoding it subscribed to."""
+        now = time.monotonic()
+        for subscriber in list(self.manager.subscribers.values()):
+            if subscriber.protocol == 2:
+                self.send_delta_frame(frame, subscriber)
+            elif now < subscriber.next_send_time:
+                subscriber.pending = True  # Decimated by the subscriber's fps cap
+            else:
+                self.send_frame(snapshot, subscriber, now, self.frame_cache)
+
+    def send_frame(self, snapshot, subscriber, now, cache):
+        """
+        Send a version 1 subscriber the frame for snapshot, in its format and narrowed to its subscription.
+        Frames are encoded once per snapshot for all subscribers with the same format and subscription.
+        """
+        subscription = subscriber.subscription
+        if subscriber.frame_format == "binary":
+            key = ("binary", subscription.bbox)
+            if key not in cache:
+                start = metrics.start()
+                indices = subscription.select(snapshot) if snapshot is not None and subscription.bbox else None
+                cache[key] = encode_binary_frame(snapshot, indices)
+                metrics.observe(metrics.frame_encode, start, "binary")
+            if "state" not in cache:
+                start = metrics.start()
+                cache["state"] = encode_state_message(snapshot)
+                metrics.observe(metrics.frame_encode, start, "state")
+            if subscriber.state_sent != cache["state"]:
+                self.manager.enqueue(cache["state"], subscriber.websocket)
+                subscriber.state_sent = cache["state"]
+            if self.manager.enqueue(cache[key], subscriber.websocket):
+                subscriber.state_sent = None  # A dropped message may have been the state, resend it
+        elif subscription.full:
+            start = metrics.start()
+            message = snapshot.to_json() if snapshot else EMPTY_PAYLOAD_JSON
+            metrics.observe(metrics.frame_encode, start, "json")
+            self.manager.enqueue(message, subscriber.websocket)
+        else:
+            key = ("json",) + subscription.key
+            if key not in cache:
+                start = metrics.start()
+                cache[key] = encode_subscription_payload(snapshot, subscription)
+                metrics.observe(metrics.frame_encode, start, "json_subscription")
+            self.manager.enqueue(cache[key], subscriber.websocket)
+
+        subscriber.pending = False
+        if subscription.fps:
+            subscriber.next_send_time = now + 1.0 / subscription.fps
+
+    def send_delta_frame(self, frame, subscriber):
+        """Send a delta, or a keyframe if the subscriber is out of sync; losing a frame forces a keyframe."""
+        if frame.delta is None or subscriber.needs_keyframe:
+            message = frame.keyframe()
+            subscriber.needs_keyframe = False
+        else:
+            message = frame.delta
+        if self.manager.enqueue(message, subscriber.websocket):
+            subscriber.needs_keyframe = True
+
+class SessionRegistry:
+    """Sessions keyed by session id. Each session runs its simulation in its own runner."""
+    def __init__(self, max_sessions: int = MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self.sessions = {}
+
+    def __contains__(self, session_id):
+        return session_id in self.sessions
+
+    def get(self, session_id: str = DEFAULT_SESSION_ID):
+        """Get a session by id, creating it on first use."""
+        session = self.sessions.get(session_id)
+        if session is None:
+            if len(self.sessions) >= self.max_sessions:
+                raise ValueError(f"Session limit of {self.max_sessions} reached.")
+            session = self.sessions[session_id] = SimulationSession(session_id)
+        return session
+
+    def create(self):
+        """Create a session with a fresh random id."""
+        return self.get(uuid.uuid4().hex)
+
+    async def remove(self, session_id: str):
+        """Stop and forget a session. Returns whether it existed."""
+        session = self.sessions.pop(session_id, None)
+        if session is None:
+            return False
+        await session.stop()
+        if session.broadcast_task:
+            session.broadcast_task.cancel()
+        return True
+
+    async def stop_all(self):
+        for session_id in list(self.sessions):
+            await self.remove(session_id)
@@ -1,19 +1,23 @@
 import math
+import numpy as np
 
 class SimplePythonInterpreter:
     def __init__(self):
-        # Create a global scope dictionary and import necessary modules
-        self.global_scope = {
-            'math': math  # Ensure math is available globally
+        # Globals every execution starts from (each gets its own copy) and the modules they provide
+        self.base_globals = {
+            'math': math,  # Ensure math is available globally
+            'np': np,      # NumPy for array-returning coordinate functions
         }
 
-    def execute(self, code: str) -> dict:
+    def execute(self, code) -> dict:
         """
         Executes the given Python code in a controlled environment.
-        Ensures that required imports like `math` are available during execution.
+        Ensures that required imports like `math` and `np` are available during execution.
+        Each call runs in a fresh copy of the base globals, so the functions it defines can't change
+        the globals of any other plan function.
         
         Parameters:
-        - code: A string containing the Python code to execute.
+        - code: A string containing the Python code to execute, or a code object compiled from it.
         
         Returns:
         - A dictionary containing the local scope after execution.
@@ -21,7 +25,7 @@ class SimplePythonInterpreter:
         # Prepare a local scope where the code will be executed
         local_scope = {}
 
-        # Execute the code within the provided global and local scope
-        exec(code, self.global_scope, local_scope)
+        # Execute the code within a private global scope and the local scope
+        exec(code, dict(self.base_globals), local_scope)
 
         return local_scope
@@ -1,5 +1,4 @@
 import ast
-import re
 
 class SimplePythonValidator:
     def __init__(self):
@@ -21,29 +20,73 @@ class SimplePythonValidator:
             'choice',       # Allow random.choice function
             'tuple',        # Allow tuple function
         }
+        # Functions callable as <module>.<name>, only on these module names
+        self.module_functions = {
+            'math': {'cos', 'sin', 'tan', 'sqrt', 'hypot', 'atan2', 'radians', 'floor', 'ceil'},
+            'random': {'random', 'uniform', 'choice'},
+            # Safe subset of NumPy for array-returning coordinate functions
+            'np': {
+                'array', 'asarray', 'zeros', 'ones', 'full', 'linspace', 'arange',
+                'column_stack', 'stack', 'concatenate', 'tile', 'repeat', 'reshape',
+                'cos', 'sin', 'tan', 'sqrt', 'arctan2', 'hypot', 'radians', 'deg2rad', 'floor', 'ceil', 'round',
+                'abs', 'sum', 'min', 'max', 'clip', 'minimum', 'maximum', 'mean',
+            },
+        }
+        # Methods callable on values (lists and arrays), e.g. coordinates.append(...)
+        self.whitelisted_methods = {'append', 'reshape', 'astype', 'round', 'clip', 'repeat', 'sum', 'min', 'max', 'mean'}
         
     def validate(self, code):
+        return self.compile(code)[0] is not None
+
+    def compile(self, code):
+        """
+        Validate code and compile it in a single AST pass.
+
+        Parameters:
+        - code: A string containing Python code.
+
+        Returns:
+        - (code object, names of the defined functions in source order), or (None, []) if validation fails.
+        """
         try:
             # Parse the code into an AST
             tree = ast.parse(code)
+            functions = []
             # Validate the AST for functions, loops, if statements, and disallowed operations
             for node in ast.walk(tree):
                 if isinstance(node, ast.FunctionDef):
                     print(f"Validating function: {node.name}")
+                    functions.append(node)
                 elif isinstance(node, (ast.For, ast.While)):
                     print(f"Found loop: {'For loop' if isinstance(node, ast.For) else 'While loop'}")
                 elif isinstance(node, ast.If):
                     print("Found if statement")
+                elif isinstance(node, ast.Attribute) and node.attr.startswith('__'):
+                    raise ValueError(f"Attribute '{node.attr}' is not allowed.")
+                elif isinstance(node, ast.Name) and node.id.startswith('__'):
+                    raise ValueError(f"Name '{node.id}' is not allowed.")
+                elif isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store) and node.id in self.module_functions:
+                    raise ValueError(f"Module name '{node.id}' can't be reassigned.")
+                elif isinstance(node, (ast.Global, ast.Nonlocal)):
+                    raise ValueError(f"'{'global' if isinstance(node, ast.Global) else 'nonlocal'}' statements are not allowed.")
                 elif isinstance(node, ast.Call):
                     # Check if the called function is whitelisted
                     if isinstance(node.func, ast.Name):
                         if node.func.id not in self.whitelisted_functions:
                             raise ValueError(f"Function '{node.func.id}' is not allowed.")
                     elif isinstance(node.func, ast.Attribute):
-                        # Check for method calls on lists
-                        if node.func.attr not in self.whitelisted_functions:
+                        receiver = node.func.value
+                        if isinstance(receiver, ast.Name) and receiver.id in self.module_functions:
+                            # Module functions: only whitelisted names of that module
+                            if node.func.attr not in self.module_functions[receiver.id]:
+                                raise ValueError(f"Function '{receiver.id}.{node.func.attr}' is not allowed.")
+                        elif node.func.attr not in self.whitelisted_methods:
+                            # Check for method calls on lists and arrays
                             raise ValueError(f"Method '{node.func.attr}' is not allowed.")
-            return True
+                    else:
+                        raise ValueError("Only named functions and methods can be called.")
+            functions.sort(key=lambda node: (node.lineno, node.col_offset))
+            return compile(tree, "<plan>", "exec"), [node.name for node in functions]
         except (SyntaxError, ValueError) as e:
             print(f"Validation Error: {e}")
-            return False
\ No newline at end of file
+            return None, []
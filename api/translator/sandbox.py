@@ -0,0 +1,137 @@
+import asyncio
+import multiprocessing
+
+try:
+    import resource  # Unix only; without it workers run without CPU and memory limits
+except ImportError:
+    resource = None
+
+from .translator import translate
+from ..config import SANDBOX_WORKERS, SANDBOX_TIMEOUT, SANDBOX_CPU_SECONDS, SANDBOX_MEMORY_BYTES, SANDBOX_MAX_TASKS_PER_WORKER
+
+class SandboxError(Exception):
+    """A plan function failed, timed out or exceeded its limits in the sandbox."""
+
+def limit_cpu(cpu_seconds):
+    """Let the calling process use cpu_seconds more CPU time before the kernel kills it (SIGXCPU)."""
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    soft = int(usage.ru_utime + usage.ru_stime + cpu_seconds) + 1
+    hard = resource.getrlimit(resource.RLIMIT_CPU)[1]
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+def sandbox_worker(connection, memory_bytes):
+    """Worker process: translate plan functions received over connection until it closes."""
+    if resource and memory_bytes:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+    connection.send("ready")  # Startup time doesn't count towards the first call's timeout
+
+    while True:
+        try:
+            code, N, Objects, BBox, cpu_seconds = connection.recv()
+        except (EOFError, OSError):
+            return  # Pool closed
+        if resource and cpu_seconds:
+            limit_cpu(cpu_seconds)
+
+        try:
+            reply = ("ok", translate(code, N, Objects, BBox))
+        except Exception as e:
+            reply = ("error", f"{type(e).__name__}: {e}")
+        connection.send(reply)
+
+class SandboxWorker:
+    """One sandbox process and the parent end of its pipe."""
+    def __init__(self, context, memory_bytes):
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(target=sandbox_worker, args=(child_connection, memory_bytes), name="sandbox", daemon=True)
+        self.process.start()
+        child_connection.close()
+        self.tasks = 0
+        self.ready = False
+
+    def call(self, task, timeout):
+        """Run one task; raises TimeoutError, or EOFError if the worker was killed by a limit."""
+        if not self.ready:
+            self.connection.recv()  # Wait for the worker to finish starting up
+            self.ready = True
+        self.connection.send(task)
+        self.tasks += 1
+        if not self.connection.poll(timeout):
+            raise TimeoutError
+        return self.connection.recv()
+
+    def close(self):
+        self.connection.close()
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(1)
+
+class SandboxPool:
+    """
+    Pre-started worker processes that run LLM generated plan functions away from the server process.
+
+    Each call has a wall-clock timeout and a CPU time limit, each worker an address space limit.
+    A worker that times out, hits a limit or has served max_tasks_per_worker calls is replaced.
+    """
+    def __init__(self, workers: int = SANDBOX_WORKERS, timeout: float = SANDBOX_TIMEOUT, cpu_seconds: float = SANDBOX_CPU_SECONDS,
+                 memory_bytes: int = SANDBOX_MEMORY_BYTES, max_tasks_per_worker: int = SANDBOX_MAX_TASKS_PER_WORKER):
+        self.workers = workers
+        self.timeout = timeout
+        self.cpu_seconds = cpu_seconds
+        self.memory_bytes = memory_bytes
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.context = multiprocessing.get_context("spawn")
+        self.idle = None  # Queue of idle workers, created by start()
+        self.all_workers = set()
+
+    def spawn(self):
+        worker = SandboxWorker(self.context, self.memory_bytes)
+        self.all_workers.add(worker)
+        return worker
+
+    def retire(self, worker):
+        self.all_workers.discard(worker)
+        worker.close()
+
+    def start(self):
+        """Start the worker processes (done on first use if not called)."""
+        if self.idle is None:
+            self.idle = asyncio.Queue()
+            for _ in range(self.workers):
+                self.idle.put_nowait(self.spawn())
+
+    async def translate(self, code: str, N: int, Objects: list, BBox: list[int]):
+        """translate() in a sandbox worker, raising SandboxError if the function fails or exceeds a limit."""
+        self.start()
+        worker = await self.idle.get()
+        try:
+            status, value = await asyncio.to_thread(worker.call, (code, N, Objects, BBox, self.cpu_seconds), self.timeout)
+        except TimeoutError:
+            self.retire(worker)
+            worker = self.spawn()
+            raise SandboxError(f"Plan function timed out after {self.timeout}s.")
+        except (EOFError, OSError):
+            self.retire(worker)
+            worker = self.spawn()
+            raise SandboxError("Plan function exceeded the sandbox CPU or memory limit.")
+        except BaseException:
+            # Cancelled while the worker may still be running: don't hand it out again
+            self.retire(worker)
+            worker = self.spawn()
+            raise
+        finally:
+            if worker.tasks >= self.max_tasks_per_worker:
+                self.retire(worker)
+                worker = self.spawn()
+            self.idle.put_nowait(worker)
+
+        if status == "error":
+            raise SandboxError(value)
+        return value
+
+    async def close(self):
+        for worker in list(self.all_workers):
+            await asyncio.to_thread(self.retire, worker)
+        self.idle = None
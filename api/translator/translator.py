@@ -1,39 +1,51 @@
-import re
+import hashlib
+from collections import OrderedDict
+import numpy as np
 from .SimplePythonInterpreter import SimplePythonInterpreter
 from .SimplePythonValidator import SimplePythonValidator
+from ..config import TRANSLATION_CACHE_SIZE
 
-def extract_function_names(code: str) -> list:
+# Long-lived validator and interpreter, shared by every translation (each execution gets its own globals)
+validator = SimplePythonValidator()
+interpreter = SimplePythonInterpreter()
+
+translation_cache = OrderedDict()  # Source hash -> entry function (None if the code is invalid), least recently used first
+
+def load_function(code: str):
     """
-    Extracts function names from the given code string.
-    
+    Validates, compiles and executes code once, returning the function a plan step calls.
+    Results are cached by source hash, so repeated functions skip all of it.
+
     Parameters:
     - code: A string containing Python code.
-    
-    Returns:
-    - A list of function names found in the code.
-    """
-    pattern = r"def (\w+)\s*\("
-    return re.findall(pattern, code)
 
-def execute_function(function_name: str, local_scope: dict, N: int, Objects: list, BBox: list[int]):
-    """
-    Executes the specified function with the provided parameters.
-    
-    Parameters:
-    - function_name: The name of the function to execute.
-    - local_scope: A dictionary containing the function definitions.
-    - N: The number of agents or objects.
-    - Objects: The list of objects to be passed to the function.
-    - BBox: The bounding box to be passed to the function.
-    
     Returns:
-    - The result of the function execution, or None if the function does not exist.
+    - The first function defined in the code, or None if validation fails or no function is defined.
     """
-    if function_name in local_scope:
-        return local_scope[function_name](N, Objects, BBox)
+    key = hashlib.sha256(code.encode()).hexdigest()
+    if key in translation_cache:
+        translation_cache.move_to_end(key)
+        return translation_cache[key]
+
+    function = None
+    compiled, function_names = validator.compile(code)
+    if compiled is None:
+        print("Code validation failed.")
+    elif not function_names:
+        print("No functions found in the provided code.")
     else:
-        print(f"Function '{function_name}' not found in local scope.")
-        return None
+        print("Code is valid. Executing...")
+        local_scope = interpreter.execute(compiled)
+        if len(function_names) > 1:
+            print(f"Warning: Multiple functions found. Executing the first one: {function_names[0]}")
+        function = local_scope.get(function_names[0])
+        if function is None:
+            print(f"Function '{function_names[0]}' not found in local scope.")
+
+    translation_cache[key] = function
+    if len(translation_cache) > TRANSLATION_CACHE_SIZE:
+        translation_cache.popitem(last=False)
+    return function
 
 def translate(code: str, N: int, Objects: list, BBox: list[int]):
     """
@@ -48,26 +60,35 @@ def translate(code: str, N: int, Objects: list, BBox: list[int]):
     Returns:
     - The result of the executed function, or None if validation fails or no function is defined.
     """
-    validator = SimplePythonValidator()
-    
-    if not validator.validate(code):
-        print("Code validation failed.")
+    function = load_function(code)
+    if function is None:
         return None
 
-    print("Code is valid. Executing...")
-    interpreter = SimplePythonInterpreter()
-    local_scope = interpreter.execute(code)
-
-    function_names = extract_function_names(code)
+    return function(N, Objects, BBox)
 
-    if not function_names:
-        print("No functions found in the provided code.")
-        return None
+def coordinates_array(coordinates, N: int):
+    """
+    Validates the output of a "coordinates" function, a list of (x, y) tuples or an (N, 2) array.
 
-    if len(function_names) > 1:
-        print(f"Warning: Multiple functions found. Executing the first one: {function_names[0]}")
+    Parameters:
+    - coordinates: The value returned by the function.
+    - N: The number of agents.
 
-    return execute_function(function_names[0], local_scope, N, Objects, BBox)
+    Returns:
+    - The coordinates as a float (M, 2) array with M <= N.
+    """
+    if coordinates is None:
+        raise ValueError("Coordinate function returned no coordinates.")
+    array = np.asarray(coordinates, dtype=float)
+    if array.size == 0:
+        array = array.reshape(0, 2)
+    if array.ndim != 2 or array.shape[1] != 2:
+        raise ValueError(f"Coordinate function must return (x, y) pairs, got shape {array.shape}.")
+    if len(array) > N:
+        raise ValueError(f"Coordinate function returned {len(array)} coordinates for {N} agents.")
+    if not np.isfinite(array).all():
+        raise ValueError("Coordinate function returned non-finite coordinates.")
+    return array
 
 def main():
     # Sample input: a simple function with if statements and logical operators
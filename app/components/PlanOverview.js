@@ -31,7 +31,7 @@ export const PlanOverview = () => {
               className={`px-2 py-1 rounded-full font-semibold text-xs 
                 ${data.completed ? 'bg-green-600 text-white' : 'bg-blue-600 text-white'}`}
             >
-              {data.completed ? 'Completed' : 'Pending'}
+              {data.completed ? 'Completed' : data.completion ? `${Math.round(data.completion)}%` : 'Pending'}
             </span>
           </div>
         ))}